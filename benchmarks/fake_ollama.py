@@ -0,0 +1,158 @@
+"""
+Deterministic local stand-in for the Ollama API.
+
+Serves POST /api/chat (non-streaming) the way the rule extractor calls it:
+the reply is a JSON array of rules chosen from the policy sentences found in
+the prompt, so the same chunk always yields the same rules. An optional fixed
+delay per call stands in for model latency without making runs noisy.
+
+Run standalone with `python benchmarks/fake_ollama.py --port 11435` and point
+OLLAMA_HOST at it, or use FakeOllama from the benchmark runner.
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from synthetic import SCHEMA
+
+# Ages in extracted rules are turned into birth-date cut-offs against a fixed year
+REFERENCE_YEAR = 2026
+
+# Phrase in the policy text -> rule the "model" extracts for it
+RULES = [
+    (r"at least (\d+) years of age", lambda m: {
+        "rule_name": f"Minimum employee age {m.group(1)}", "rule_type": "threshold",
+        "description": f"Employees must be at least {m.group(1)} years old",
+        "parameters": {"table": f"{SCHEMA}.employees", "column": "date_of_birth", "operator": "<=",
+                       "value": f"{REFERENCE_YEAR - int(m.group(1))}-01-01"}}),
+    (r"within (\d+) days of joining", lambda m: {
+        "rule_name": f"Training within {m.group(1)} days", "rule_type": "date_difference",
+        "description": f"Security training must be completed within {m.group(1)} days of joining",
+        "parameters": {"table": f"{SCHEMA}.employees", "date_col_1": "joining_date",
+                       "date_col_2": "training_completed_date", "max_days": int(m.group(1))}}),
+    (r"valid corporate email", lambda m: {
+        "rule_name": "Employee email required", "rule_type": "not_null",
+        "description": "Every employee record must include an email address",
+        "parameters": {"table": f"{SCHEMA}.employees", "column": "email"}}),
+    (r"stored encrypted", lambda m: {
+        "rule_name": "Customer email encrypted", "rule_type": "pattern",
+        "description": "Customer email addresses must be stored encrypted",
+        "parameters": {"table": f"{SCHEMA}.customer_data", "column": "email_raw", "regex_pattern": "^enc:"}}),
+    (r"reference an existing employee", lambda m: {
+        "rule_name": "Audit log user exists", "rule_type": "cross_table",
+        "description": "Audit log entries must reference an existing employee",
+        "parameters": {"table": f"{SCHEMA}.system_audit_logs", "column": "user_id",
+                       "ref_table": f"{SCHEMA}.employees", "ref_column": "id"}}),
+]
+
+TEXT_PATTERN = re.compile(r'Text: "(.*?)"\s*\n', re.DOTALL)
+
+
+def fake_rules(prompt: str) -> List[Dict[str, Any]]:
+    """Rules for the policy text quoted in an extraction prompt, in a stable order."""
+    match = TEXT_PATTERN.search(prompt)
+    text = match.group(1) if match else prompt
+    digest = int(hashlib.sha256(text.encode()).hexdigest(), 16)
+
+    rules, seen = [], set()
+    for pattern, build in RULES:
+        for found in re.finditer(pattern, text):
+            rule = build(found)
+            if rule["rule_name"] in seen:
+                continue
+            seen.add(rule["rule_name"])
+            # Stable, text-dependent confidence so review thresholds see a spread
+            rule["confidence_score"] = round(0.6 + (digest % 40) / 100, 2)
+            rules.append(rule)
+    return rules
+
+
+class FakeOllama:
+    """Threaded HTTP server answering /api/chat; usable as a context manager."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body: Dict[str, Any]):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._reply(200, {"models": [{"name": "fake"}]})
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                if self.path != "/api/chat":
+                    self._reply(404, {"error": "not found"})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+                with fake._lock:
+                    fake.calls += 1
+                if fake.latency_ms:
+                    time.sleep(fake.latency_ms / 1000)
+                self._reply(200, {
+                    "model": request.get("model", "fake"),
+                    "created_at": "1970-01-01T00:00:00Z",
+                    "message": {"role": "assistant", "content": json.dumps(fake_rules(prompt))},
+                    "done": True,
+                })
+
+        return Handler
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed delay per call")
+    args = parser.parse_args()
+    fake = FakeOllama(args.host, args.port, args.latency_ms)
+    print(f"Fake Ollama listening on {fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.server.server_close()
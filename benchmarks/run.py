@@ -0,0 +1,311 @@
+"""
+End-to-end offline benchmark for the ingestion -> extraction -> scan pipeline.
+
+Generates synthetic policy PDFs (text and scanned), synthetic target tables and
+a deterministic stand-in for the Ollama API, runs each pipeline stage against
+them in-process and prints per-stage throughput and latency percentiles as
+JSON. Nothing leaves the machine; the scan stage needs a Postgres with the
+platform schema (DATABASE_URL or DB_*) and is skipped without one.
+
+Usage (from the repository root):
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --rows 1000000 --stages scan
+    python benchmarks/run.py --baseline bench.json   # exit 1 on a throughput regression
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+for service in ("common", "document-processor", "rule-extractor", "scanner"):
+    sys.path.insert(0, str(ROOT / "services" / service))
+
+from fake_ollama import FakeOllama  # noqa: E402
+from synthetic import SCHEMA, bench_rules, policy_text, table_sql, write_pdfs  # noqa: E402
+
+logger = logging.getLogger("benchmark")
+
+STAGES = ("pdf_text", "pdf_scanned", "chunk", "extract", "scan")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+class Stage:
+    """Times one pipeline stage: per-operation latencies and the units of work done."""
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.units = 0
+        self.latencies: List[float] = []
+        self.seconds = 0.0
+        self.extra: Dict[str, Any] = {}
+
+    @contextmanager
+    def op(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.latencies.append(elapsed)
+            self.seconds += elapsed
+
+    def result(self) -> Dict[str, Any]:
+        ms = [latency * 1000 for latency in self.latencies]
+        return {
+            "unit": self.unit,
+            "units": self.units,
+            "operations": len(self.latencies),
+            "seconds": round(self.seconds, 4),
+            "throughput": round(self.units / self.seconds, 2) if self.seconds else None,
+            "latency_ms": {
+                "p50": _round(percentile(ms, 50)),
+                "p90": _round(percentile(ms, 90)),
+                "p99": _round(percentile(ms, 99)),
+                "max": _round(max(ms) if ms else None),
+            },
+            **self.extra,
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
+
+
+def bench_pdf(paths: List[Path], name: str, state: Dict[str, Any]) -> Stage:
+    from processor import DocumentProcessor
+
+    processor = DocumentProcessor(documents_dir=str(state["workdir"]))
+    stage = Stage(name, "pages")
+    documents = []
+    for path in paths:
+        with stage.op():
+            result = processor.process_pdf(path)
+        if result["status"] != "success":
+            raise RuntimeError(result.get("error", "processing failed"))
+        stage.units += len(result["pages"])
+        documents.append(result["pages"])
+    stage.extra["documents"] = len(paths)
+    stage.extra["chars"] = sum(page["char_count"] for pages in documents for page in pages)
+    state.setdefault("documents", []).extend(documents)
+    return stage
+
+
+def bench_chunk(state: Dict[str, Any], args) -> Stage:
+    from processor import DocumentProcessor
+
+    processor = DocumentProcessor(documents_dir=str(state["workdir"]))
+    # Chunk each document's pages as the upload path does; without the PDF stages
+    # (or fitz), chunk generated pages directly
+    documents = state.get("documents") or [
+        [{"page_number": number + 1, "text": policy_text(rng, 30)} for number in range(args.pages)]
+        for rng in (random.Random(args.seed + n) for n in range(args.documents))
+    ]
+    stage = Stage("chunk", "chunks")
+    chunks = []
+    for pages in documents:
+        with stage.op():
+            document_chunks = processor.chunk_pages(pages, chunk_size=args.chunk_size)
+        stage.units += len(document_chunks)
+        chunks.extend(chunk["content"] for chunk in document_chunks)
+    state["chunks"] = chunks
+    return stage
+
+
+def bench_extract(state: Dict[str, Any], args) -> Stage:
+    chunks = state.get("chunks", [])[:args.max_chunks]
+    stage = Stage("extract", "rules")
+    with FakeOllama(latency_ms=args.llm_latency_ms) as fake:
+        # The ollama client reads OLLAMA_HOST when it is first imported
+        os.environ["OLLAMA_HOST"] = fake.url
+        from extractor import RuleExtractor
+
+        extractor = RuleExtractor(cascade_model=args.cascade_model)
+        warm_started = time.perf_counter()
+        extractor.warm_up()
+        stage.extra["warm_up_seconds"] = round(time.perf_counter() - warm_started, 4)
+        for chunk in chunks:
+            with stage.op():
+                rules = extractor.extract_rule(chunk, "benchmark")
+            stage.units += len(rules or [])
+        stage.extra["chunks"] = len(chunks)
+        stage.extra["llm_calls"] = fake.calls
+        stage.extra["llm_latency_ms"] = args.llm_latency_ms
+        if extractor.cascade_model:
+            stage.extra["cascade"] = extractor.cascade_stats()
+    return stage
+
+
+def bench_scan(args) -> Stage:
+    from scanner import ComplianceScanner
+
+    scanner = ComplianceScanner()
+    conn = scanner.get_connection()
+    stage = Stage("scan", "rows")
+    rule_ids = []
+    try:
+        with conn.cursor() as cur:
+            started = time.perf_counter()
+            cur.execute(table_sql(args.rows, args.violation_rate, seed=args.seed / 1000))
+            stage.extra["setup_seconds"] = round(time.perf_counter() - started, 4)
+            for name, rule_type, params in bench_rules():
+                cur.execute("""
+                    INSERT INTO compliance_rules (rule_name, rule_type, description, parameters,
+                                                  source_document, confidence_score, status)
+                    VALUES (%s, %s, %s, %s, 'benchmark', 1.0, 'active')
+                    RETURNING rule_id
+                """, (name, rule_type, name, json.dumps(params)))
+                rule_ids.append(str(cur.fetchone()[0]))
+        conn.commit()
+
+        # Each pass scans every rule over its table; the first pass also prepares statements
+        passes = []
+        for _ in range(args.scan_passes):
+            with stage.op():
+                new_violations = scanner.scan_all_tables(rule_ids=rule_ids)
+            stage.units += args.rows * len(rule_ids)
+            passes.append({"seconds": round(stage.latencies[-1], 4), "new_violations": len(new_violations)})
+
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT execution_duration_ms FROM rule_executions
+                WHERE rule_id = ANY(%s::uuid[]) AND status = 'success'
+            """, (rule_ids,))
+            rule_ms = [row[0] for row in cur.fetchall()]
+        stage.extra.update({
+            "rows_per_table": args.rows,
+            "rules": len(rule_ids),
+            "passes": passes,
+            "rule_latency_ms": {"p50": percentile(rule_ms, 50), "p90": percentile(rule_ms, 90),
+                                "p99": percentile(rule_ms, 99), "max": max(rule_ms) if rule_ms else None},
+        })
+        return stage
+    finally:
+        conn.rollback()
+        if not args.keep_tables:
+            with conn.cursor() as cur:
+                if rule_ids:
+                    cur.execute("DELETE FROM compliance_rules WHERE rule_id = ANY(%s::uuid[])", (rule_ids,))
+                cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        conn.close()
+
+
+def run_stage(results: Dict[str, Any], name: str, fn: Callable[[], Stage]):
+    """Run one stage, recording why it was skipped or failed instead of aborting the run."""
+    try:
+        results[name] = fn().result()
+    except ImportError as e:
+        results[name] = {"skipped": f"missing dependency: {e.name or e}"}
+    except Exception as e:
+        logger.exception(f"Stage {name} failed")
+        results[name] = {"error": str(e)}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Stages whose throughput fell more than `tolerance` (a fraction) below the baseline."""
+    regressions = []
+    for name, stage in results["stages"].items():
+        before = baseline.get("stages", {}).get(name, {}).get("throughput")
+        after = stage.get("throughput")
+        if before and after is not None:
+            stage["baseline_throughput"] = before
+            stage["change"] = round(after / before - 1, 4)
+            if after < before * (1 - tolerance):
+                regressions.append(name)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {', '.join(STAGES)}")
+    parser.add_argument("--documents", type=int, default=5, help="PDFs of each kind")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per PDF")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--max-chunks", type=int, default=200, help="Chunks sent through extraction")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated model latency per call")
+    parser.add_argument("--cascade-model", help="Escalation model for the extract stage (cascade mode)")
+    parser.add_argument("--rows", type=int, default=100000, help="Rows per synthetic target table")
+    parser.add_argument("--violation-rate", type=float, default=0.01)
+    parser.add_argument("--scan-passes", type=int, default=2, help="Full scans to time (first is cold)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-tables", action="store_true", help="Leave the bench schema and rules in place")
+    parser.add_argument("--output", help="Write JSON here as well as to stdout")
+    parser.add_argument("--baseline", help="Earlier JSON result to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed throughput drop vs baseline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"), stream=sys.stderr, force=True)
+    selected = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(selected) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    stages: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="compliance-bench-") as workdir:
+        state = {"workdir": Path(workdir)}
+        for kind, scanned in (("pdf_text", False), ("pdf_scanned", True)):
+            if kind in selected:
+                run_stage(stages, kind, lambda scanned=scanned, kind=kind: bench_pdf(
+                    write_pdfs(Path(workdir) / kind, args.documents, args.pages, scanned, seed=args.seed),
+                    kind, state))
+        if "chunk" in selected or "extract" in selected:
+            run_stage(stages, "chunk", lambda: bench_chunk(state, args))
+        if "extract" in selected:
+            run_stage(stages, "extract", lambda: bench_extract(state, args))
+        if "scan" in selected:
+            run_stage(stages, "scan", lambda: bench_scan(args))
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": vars(args),
+        },
+        "stages": stages,
+    }
+
+    regressions = []
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        results["regressions"] = regressions
+
+    output = json.dumps(results, indent=2, default=str)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
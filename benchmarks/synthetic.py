@@ -0,0 +1,168 @@
+"""
+Deterministic synthetic inputs for the benchmark harness.
+
+Everything here is seeded, so two runs with the same parameters produce the
+same policy text, the same PDFs and the same target tables.
+"""
+
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Sentences in the register of real policy documents, each one matching a rule
+# the fake model can return (see fake_ollama.py)
+POLICY_SENTENCES = [
+    "Employees must be at least {age} years of age on their joining date.",
+    "Security awareness training must be completed within {days} days of joining.",
+    "Every employee record must include a valid corporate email address.",
+    "Customer email addresses must be stored encrypted and never in plain text.",
+    "Customer records inactive for more than {years} years must be deleted.",
+    "Audit log entries must reference an existing employee account.",
+    "System audit logs must be retained for no longer than {years} years.",
+    "Access to customer data is restricted to the {role} and compliance roles.",
+    "Marketing emails may only be sent to customers who have opted in.",
+]
+
+FILLER_SENTENCES = [
+    "This section applies to all business units and subsidiaries.",
+    "Managers are responsible for ensuring that their teams follow this policy.",
+    "Exceptions must be approved in writing by the Data Protection Officer.",
+    "The policy is reviewed annually and after any significant incident.",
+    "Non-compliance may result in disciplinary action.",
+]
+
+SCHEMA = "bench"
+
+
+def policy_text(rng: random.Random, sentences: int) -> str:
+    """A page of policy prose, roughly a third of it rule-bearing."""
+    out = []
+    for _ in range(sentences):
+        if rng.random() < 0.35:
+            template = rng.choice(POLICY_SENTENCES)
+            out.append(template.format(age=rng.choice((16, 18, 21)), days=rng.choice((14, 30, 60)),
+                                       years=rng.choice((3, 5, 7)), role=rng.choice(("support", "billing"))))
+        else:
+            out.append(rng.choice(FILLER_SENTENCES))
+    return " ".join(out)
+
+
+def write_pdfs(out_dir: Path, documents: int, pages: int, scanned: bool, seed: int = 0,
+               sentences_per_page: int = 30) -> List[Path]:
+    """
+    Write `documents` PDFs of `pages` pages each. Text PDFs carry a text layer;
+    scanned PDFs are each page rendered to an image with no text layer, so the
+    processor falls back to OCR.
+    """
+    import fitz
+
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for number in range(documents):
+        doc = fitz.open()
+        for _ in range(pages):
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (50, 50, -50, -50), policy_text(rng, sentences_per_page), fontsize=10)
+        if scanned:
+            image_doc = fitz.open()
+            for page in doc:
+                pixmap = page.get_pixmap(dpi=150)
+                image_doc.new_page(width=page.rect.width, height=page.rect.height).insert_image(
+                    page.rect, pixmap=pixmap
+                )
+            doc.close()
+            doc = image_doc
+        doc.set_metadata({"title": f"Synthetic policy {number}", "author": "benchmark"})
+        path = out_dir / f"{'scanned' if scanned else 'text'}_policy_{number:03d}.pdf"
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def table_sql(rows: int, violation_rate: float, seed: float = 0.42) -> str:
+    """
+    SQL creating the `bench` copies of the seed tables (employees, customer_data,
+    system_audit_logs) with `rows` rows each, about `violation_rate` of them
+    breaking each benchmark rule.
+    """
+    rate = float(violation_rate)
+    return f"""
+        DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+        CREATE SCHEMA {SCHEMA};
+        SELECT setseed({seed});
+
+        CREATE TABLE {SCHEMA}.employees (
+            id SERIAL PRIMARY KEY,
+            full_name VARCHAR(100),
+            email VARCHAR(100),
+            department VARCHAR(50),
+            date_of_birth DATE,
+            joining_date DATE,
+            training_completed_date DATE,
+            security_training_completed BOOLEAN
+        );
+        INSERT INTO {SCHEMA}.employees (full_name, email, department, date_of_birth, joining_date,
+                                        training_completed_date, security_training_completed)
+        SELECT 'Employee ' || g,
+               CASE WHEN random() < {rate} THEN NULL ELSE 'employee' || g || '@corp.com' END,
+               (ARRAY['Engineering', 'Sales', 'Finance', 'Support', 'Interns'])[1 + g % 5],
+               CASE WHEN random() < {rate} THEN DATE '2010-01-01' ELSE DATE '1960-01-01' + (g % 12000) END,
+               DATE '2015-01-01' + (g % 3000),
+               DATE '2015-01-01' + (g % 3000) + CASE WHEN random() < {rate} THEN 90 ELSE 10 END,
+               true
+        FROM generate_series(1, {rows}) g;
+
+        CREATE TABLE {SCHEMA}.customer_data (
+            customer_id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
+            name VARCHAR(100),
+            email_raw VARCHAR(100),
+            phone_number VARCHAR(20),
+            marketing_opt_in BOOLEAN,
+            last_login_date DATE,
+            region VARCHAR(10)
+        );
+        INSERT INTO {SCHEMA}.customer_data (name, email_raw, phone_number, marketing_opt_in, last_login_date, region)
+        SELECT 'Customer ' || g,
+               CASE WHEN random() < {rate} THEN 'customer' || g || '@mail.com' ELSE 'enc:AES256:' || md5(g::text) END,
+               '+1-555-' || lpad((g % 10000)::text, 4, '0'),
+               g % 2 = 0,
+               DATE '2018-01-01' + (g % 2500),
+               (ARRAY['US', 'EU', 'APAC'])[1 + g % 3]
+        FROM generate_series(1, {rows}) g;
+
+        CREATE TABLE {SCHEMA}.system_audit_logs (
+            log_id SERIAL PRIMARY KEY,
+            action VARCHAR(50),
+            timestamp TIMESTAMP,
+            user_id INTEGER
+        );
+        INSERT INTO {SCHEMA}.system_audit_logs (action, timestamp, user_id)
+        SELECT (ARRAY['LOGIN', 'LOGOUT', 'EXPORT', 'UPDATE'])[1 + g % 4],
+               TIMESTAMP '2020-01-01' + (g % 100000) * INTERVAL '1 minute',
+               CASE WHEN random() < {rate} THEN {rows} + g ELSE 1 + g % {rows} END
+        FROM generate_series(1, {rows}) g;
+
+        ANALYZE {SCHEMA}.employees;
+        ANALYZE {SCHEMA}.customer_data;
+        ANALYZE {SCHEMA}.system_audit_logs;
+    """
+
+
+def bench_rules() -> List[Tuple[str, str, Dict]]:
+    """(rule_name, rule_type, parameters) for one rule of each kind over the bench tables."""
+    return [
+        ("[bench] Minimum employee age", "threshold",
+         {"table": f"{SCHEMA}.employees", "column": "date_of_birth", "operator": "<=", "value": "2008-01-01"}),
+        ("[bench] Employee email required", "not_null",
+         {"table": f"{SCHEMA}.employees", "column": "email"}),
+        ("[bench] Training within 30 days", "date_difference",
+         {"table": f"{SCHEMA}.employees", "date_col_1": "joining_date",
+          "date_col_2": "training_completed_date", "max_days": 30}),
+        ("[bench] Customer email encrypted", "pattern",
+         {"table": f"{SCHEMA}.customer_data", "column": "email_raw", "regex_pattern": "^enc:"}),
+        ("[bench] Audit log user exists", "cross_table",
+         {"table": f"{SCHEMA}.system_audit_logs", "column": "user_id",
+          "ref_table": f"{SCHEMA}.employees", "ref_column": "id"}),
+    ]
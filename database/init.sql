@@ -25,10 +25,13 @@ CREATE TABLE IF NOT EXISTS compliance_rules (
     confidence_score DECIMAL(3,2) CHECK (confidence_score >= 0 AND confidence_score <= 1),
     status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'active', 'archived', 'rejected')),
     requires_review BOOLEAN DEFAULT false,
+    severity VARCHAR(20) DEFAULT 'high' CHECK (severity IN ('critical', 'high', 'medium', 'low')),
+    scan_schedule VARCHAR(100), -- Cron expression (e.g. '*/15 * * * *'); NULL uses the scanner default
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW(),
     created_by VARCHAR(100),
-    version INTEGER DEFAULT 1
+    version INTEGER DEFAULT 1,
+    trace_id VARCHAR(32) -- Trace of the extraction that created the rule (see service_core.tracing)
 );
 
 -- Rule Execution History
@@ -40,23 +43,68 @@ CREATE TABLE IF NOT EXISTS rule_executions (
     violations_found INTEGER DEFAULT 0,
     execution_duration_ms INTEGER,
     status VARCHAR(20) CHECK (status IN ('success', 'failed', 'partial')),
-    error_message TEXT
+    error_message TEXT,
+    plan_summary JSONB, -- Optional EXPLAIN (ANALYZE, BUFFERS) summary
+    trace_id VARCHAR(32)
 );
 
--- Violations Table
+-- Violations Table (monthly partitions on detected_at, see maintain_partitions)
 CREATE TABLE IF NOT EXISTS violations (
-    violation_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    violation_id UUID NOT NULL DEFAULT uuid_generate_v4(),
     rule_id UUID REFERENCES compliance_rules(rule_id) ON DELETE CASCADE,
     record_id VARCHAR(255) NOT NULL,
     table_name VARCHAR(100) NOT NULL,
-    detected_at TIMESTAMP DEFAULT NOW(),
+    detected_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    last_seen TIMESTAMP DEFAULT NOW(),
     severity VARCHAR(20) DEFAULT 'medium' CHECK (severity IN ('critical', 'high', 'medium', 'low')),
     status VARCHAR(20) DEFAULT 'open' CHECK (status IN ('open', 'acknowledged', 'resolved', 'false_positive')),
     explanation TEXT,
     evidence JSONB,
     resolved_at TIMESTAMP,
     resolved_by VARCHAR(100),
-    resolution_notes TEXT
+    resolution_notes TEXT,
+    PRIMARY KEY (violation_id, detected_at)
+) PARTITION BY RANGE (detected_at);
+
+-- Catches rows outside the pre-created months so inserts never fail
+CREATE TABLE IF NOT EXISTS violations_default PARTITION OF violations DEFAULT;
+
+-- Violation counts per (rule, table, severity, status), maintained by trigger
+-- so dashboards read a few rows instead of aggregating every violation
+CREATE TABLE IF NOT EXISTS violation_summary (
+    rule_id UUID NOT NULL REFERENCES compliance_rules(rule_id) ON DELETE CASCADE,
+    table_name VARCHAR(100) NOT NULL,
+    severity VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    violation_count BIGINT NOT NULL DEFAULT 0,
+    last_detected TIMESTAMP,
+    PRIMARY KEY (rule_id, table_name, severity, status)
+);
+
+-- Range-partitioned scans of large target tables (resumable, claimable by many workers)
+CREATE TABLE IF NOT EXISTS range_scans (
+    scan_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    rule_id UUID REFERENCES compliance_rules(rule_id) ON DELETE CASCADE,
+    rule_version INTEGER,
+    table_name VARCHAR(100) NOT NULL,
+    range_key VARCHAR(100) NOT NULL, -- Integer primary key column, or 'ctid'
+    status VARCHAR(20) DEFAULT 'running' CHECK (status IN ('running', 'completed', 'failed')),
+    started_at TIMESTAMP DEFAULT NOW(),
+    completed_at TIMESTAMP
+);
+
+-- Units of work of a range scan; 'done' ranges are checkpoints
+CREATE TABLE IF NOT EXISTS scan_ranges (
+    range_id BIGSERIAL PRIMARY KEY,
+    scan_id UUID REFERENCES range_scans(scan_id) ON DELETE CASCADE,
+    lower_bound TEXT NOT NULL,
+    upper_bound TEXT NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'claimed', 'done', 'failed')),
+    claimed_by VARCHAR(255),
+    claimed_at TIMESTAMP,
+    attempts INTEGER DEFAULT 0,
+    violations_found INTEGER,
+    completed_at TIMESTAMP
 );
 
 -- Documents Table
@@ -70,7 +118,10 @@ CREATE TABLE IF NOT EXISTS documents (
     processed_at TIMESTAMP,
     status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'completed', 'failed')),
     metadata JSONB,
-    error_message TEXT
+    error_message TEXT,
+    trace_id VARCHAR(32), -- Trace of the upload; extraction and scans of its rules continue it
+    rules_extracted_at TIMESTAMP, -- Set once rule extraction (manual or on document_completed) has stored its rules
+    extraction_claimed_at TIMESTAMP -- Lease of the extraction in progress; renewed per model call, cleared when it ends
 );
 
 -- Document Chunks (for RAG)
@@ -81,20 +132,47 @@ CREATE TABLE IF NOT EXISTS document_chunks (
     content TEXT NOT NULL,
     embedding vector(384), -- Dimension for sentence-transformers/all-MiniLM-L6-v2
     metadata JSONB,
+    source_page INTEGER, -- Page the chunk starts on
+    -- Lexical search (GET /search): maintained by Postgres on every insert/update
+    content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english'::regconfig, content)) STORED,
+    -- Near-duplicate detection (see near_duplicates.py): MinHash LSH band hashes, and the
+    -- earlier chunk of another document this one nearly repeats, whose rules it reuses
+    minhash_bands BIGINT[],
+    duplicate_of UUID REFERENCES document_chunks(chunk_id) ON DELETE SET NULL,
+    duplicate_similarity REAL,
+    extracted_rules JSONB, -- The chunk's raw extraction, reused by its near-duplicates
     created_at TIMESTAMP DEFAULT NOW()
 );
 
--- Audit Log
+-- Extracted page text, kept so documents can be re-chunked without the PDF
+CREATE TABLE IF NOT EXISTS document_pages (
+    document_id UUID NOT NULL REFERENCES documents(document_id) ON DELETE CASCADE,
+    page_number INTEGER NOT NULL,
+    ocr BOOLEAN NOT NULL DEFAULT FALSE,
+    char_count INTEGER NOT NULL,
+    content BYTEA NOT NULL, -- zlib-compressed JSON {text, blocks}, see page_store.py
+    PRIMARY KEY (document_id, page_number)
+);
+-- Already compressed: skip TOAST's own compression attempt
+ALTER TABLE document_pages ALTER COLUMN content SET STORAGE EXTERNAL;
+
+-- Audit Log (monthly partitions on timestamp, see maintain_partitions)
 CREATE TABLE IF NOT EXISTS audit_log (
-    log_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    log_id UUID NOT NULL DEFAULT uuid_generate_v4(),
     event_type VARCHAR(50) NOT NULL,
     entity_type VARCHAR(50),
     entity_id UUID,
     user_id VARCHAR(100),
-    timestamp TIMESTAMP DEFAULT NOW(),
+    timestamp TIMESTAMP NOT NULL DEFAULT NOW(),
     details JSONB,
-    ip_address INET
-);
+    ip_address INET,
+    PRIMARY KEY (log_id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE IF NOT EXISTS audit_log_default PARTITION OF audit_log DEFAULT;
+
+-- Retired partitions are moved here when retention archives instead of dropping
+CREATE SCHEMA IF NOT EXISTS archive;
 
 -- ============================================================================
 -- INDEXES FOR PERFORMANCE
@@ -106,12 +184,26 @@ CREATE INDEX IF NOT EXISTS idx_rules_type ON compliance_rules(rule_type);
 CREATE INDEX IF NOT EXISTS idx_rules_confidence ON compliance_rules(confidence_score);
 CREATE INDEX IF NOT EXISTS idx_rules_created ON compliance_rules(created_at DESC);
 
+-- Rule execution indexes
+CREATE INDEX IF NOT EXISTS idx_rule_executions_rule_time ON rule_executions(rule_id, execution_time DESC);
+CREATE INDEX IF NOT EXISTS idx_rule_executions_time ON rule_executions(execution_time DESC);
+
+-- Range scan indexes
+CREATE UNIQUE INDEX IF NOT EXISTS idx_range_scans_running ON range_scans(rule_id) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_scan_ranges_claim ON scan_ranges(scan_id, status, range_id);
+
 -- Violations indexes
 CREATE INDEX IF NOT EXISTS idx_violations_rule ON violations(rule_id);
 CREATE INDEX IF NOT EXISTS idx_violations_status ON violations(status);
 CREATE INDEX IF NOT EXISTS idx_violations_severity ON violations(severity);
 CREATE INDEX IF NOT EXISTS idx_violations_detected ON violations(detected_at DESC);
+-- Keyset pagination order for GET /violations
+CREATE INDEX IF NOT EXISTS idx_violations_page ON violations(detected_at DESC, violation_id DESC);
 CREATE INDEX IF NOT EXISTS idx_violations_table ON violations(table_name);
+-- One violation per (rule, record): rescans refresh last_seen instead of inserting duplicates.
+-- Not UNIQUE: a unique index on a partitioned table must include detected_at, so the
+-- scanner enforces identity itself (see ComplianceScanner.record_violations)
+CREATE INDEX IF NOT EXISTS idx_violations_identity ON violations(rule_id, table_name, record_id);
 
 -- Documents indexes
 CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status);
@@ -126,11 +218,16 @@ CREATE INDEX IF NOT EXISTS idx_audit_user ON audit_log(user_id);
 CREATE INDEX IF NOT EXISTS idx_chunks_embedding ON document_chunks 
 USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
 
+-- Chunk lookups by document, full-text search, and near-duplicate candidates (band overlap)
+CREATE INDEX IF NOT EXISTS idx_chunks_document ON document_chunks(document_id, chunk_index);
+CREATE INDEX IF NOT EXISTS idx_chunks_content_tsv ON document_chunks USING GIN (content_tsv);
+CREATE INDEX IF NOT EXISTS idx_chunks_minhash_bands ON document_chunks USING GIN (minhash_bands);
+
 -- ============================================================================
 -- SAMPLE DATA FOR TESTING
 -- ============================================================================
 
--- Insert a sample rule
+-- Insert a sample rule (once, so init.sql can be re-run after database/migrate.sql)
 INSERT INTO compliance_rules (
     rule_name, 
     rule_type, 
@@ -139,7 +236,8 @@ INSERT INTO compliance_rules (
     source_document,
     confidence_score,
     status
-) VALUES (
+)
+SELECT
     'Employee Training Deadline',
     'date_difference',
     'Employees must complete cybersecurity training within 30 days of joining',
@@ -147,7 +245,10 @@ INSERT INTO compliance_rules (
     'Employee Handbook v2.3',
     0.95,
     'active'
-) ON CONFLICT DO NOTHING;
+WHERE NOT EXISTS (
+    SELECT 1 FROM compliance_rules
+    WHERE rule_name = 'Employee Training Deadline' AND source_document = 'Employee Handbook v2.3'
+);
 
 -- ============================================================================
 -- FUNCTIONS AND TRIGGERS
@@ -169,32 +270,340 @@ CREATE TRIGGER update_rules_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
--- Function to log rule changes to audit log
+-- Function to bump rule version when its executable definition changes
+-- (the scanner caches generated violation queries per rule_id + version)
+CREATE OR REPLACE FUNCTION bump_rule_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.parameters IS DISTINCT FROM OLD.parameters
+       OR NEW.rule_type IS DISTINCT FROM OLD.rule_type THEN
+        NEW.version = COALESCE(OLD.version, 1) + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS bump_rules_version ON compliance_rules;
+CREATE TRIGGER bump_rules_version
+    BEFORE UPDATE ON compliance_rules
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_rule_version();
+
+-- Function to log rule changes to audit log.
+-- Statement-level with transition tables: a bulk insert of N rules writes its
+-- N audit rows in one INSERT ... SELECT instead of N trigger invocations.
 CREATE OR REPLACE FUNCTION log_rule_changes()
 RETURNS TRIGGER AS $$
 BEGIN
     IF TG_OP = 'INSERT' THEN
         INSERT INTO audit_log (event_type, entity_type, entity_id, details)
-        VALUES ('rule_created', 'compliance_rule', NEW.rule_id, row_to_json(NEW)::jsonb);
+        SELECT 'rule_created', 'compliance_rule', n.rule_id, to_jsonb(n)
+        FROM new_rows n;
     ELSIF TG_OP = 'UPDATE' THEN
         INSERT INTO audit_log (event_type, entity_type, entity_id, details)
-        VALUES ('rule_updated', 'compliance_rule', NEW.rule_id, 
-                jsonb_build_object('old', row_to_json(OLD), 'new', row_to_json(NEW)));
+        SELECT 'rule_updated', 'compliance_rule', n.rule_id,
+               jsonb_build_object('old', to_jsonb(o), 'new', to_jsonb(n))
+        FROM new_rows n
+        JOIN old_rows o ON o.rule_id = n.rule_id;
     ELSIF TG_OP = 'DELETE' THEN
         INSERT INTO audit_log (event_type, entity_type, entity_id, details)
-        VALUES ('rule_deleted', 'compliance_rule', OLD.rule_id, row_to_json(OLD)::jsonb);
+        SELECT 'rule_deleted', 'compliance_rule', o.rule_id, to_jsonb(o)
+        FROM old_rows o;
     END IF;
     RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Trigger for audit logging
+-- Triggers for audit logging (transition tables allow only one event per trigger)
 DROP TRIGGER IF EXISTS audit_rule_changes ON compliance_rules;
-CREATE TRIGGER audit_rule_changes
-    AFTER INSERT OR UPDATE OR DELETE ON compliance_rules
-    FOR EACH ROW
+DROP TRIGGER IF EXISTS audit_rule_inserts ON compliance_rules;
+CREATE TRIGGER audit_rule_inserts
+    AFTER INSERT ON compliance_rules
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
     EXECUTE FUNCTION log_rule_changes();
 
+DROP TRIGGER IF EXISTS audit_rule_updates ON compliance_rules;
+CREATE TRIGGER audit_rule_updates
+    AFTER UPDATE ON compliance_rules
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_rule_changes();
+
+DROP TRIGGER IF EXISTS audit_rule_deletes ON compliance_rules;
+CREATE TRIGGER audit_rule_deletes
+    AFTER DELETE ON compliance_rules
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_rule_changes();
+
+-- Function to keep violation_summary in step with violations.
+-- Statement-level with transition tables, so a bulk upsert of N violations
+-- applies one grouped delta per summary row instead of N row-level updates.
+-- Updates only count rows whose summary key (rule, table, severity, status)
+-- changed: a rescan refreshing last_seen on every failing row leaves the
+-- summary untouched, so it neither churns nor locks summary rows that
+-- parallel range workers of the same rule also need.
+CREATE OR REPLACE FUNCTION apply_violation_summary_delta()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO violation_summary AS s (rule_id, table_name, severity, status, violation_count)
+        SELECT rule_id, table_name, severity, status, -COUNT(*)
+        FROM old_rows
+        WHERE rule_id IS NOT NULL
+        GROUP BY rule_id, table_name, severity, status
+        ORDER BY rule_id, table_name, severity, status
+        ON CONFLICT (rule_id, table_name, severity, status)
+        DO UPDATE SET violation_count = s.violation_count + EXCLUDED.violation_count;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO violation_summary AS s (rule_id, table_name, severity, status, violation_count, last_detected)
+        SELECT rule_id, table_name, severity, status, COUNT(*), MAX(detected_at)
+        FROM new_rows
+        WHERE rule_id IS NOT NULL
+        GROUP BY rule_id, table_name, severity, status
+        ORDER BY rule_id, table_name, severity, status
+        ON CONFLICT (rule_id, table_name, severity, status)
+        DO UPDATE SET violation_count = s.violation_count + EXCLUDED.violation_count,
+                      last_detected = GREATEST(s.last_detected, EXCLUDED.last_detected);
+    ELSE
+        WITH changed AS (
+            SELECT o.rule_id AS old_rule_id, o.table_name AS old_table_name,
+                   o.severity AS old_severity, o.status AS old_status,
+                   n.rule_id, n.table_name, n.severity, n.status, n.detected_at
+            FROM old_rows o
+            JOIN new_rows n ON n.violation_id = o.violation_id
+            WHERE (o.rule_id, o.table_name, o.severity, o.status)
+                  IS DISTINCT FROM (n.rule_id, n.table_name, n.severity, n.status)
+        ), deltas AS (
+            SELECT old_rule_id AS rule_id, old_table_name AS table_name, old_severity AS severity,
+                   old_status AS status, -1 AS delta, NULL::TIMESTAMP AS detected_at
+            FROM changed
+            UNION ALL
+            SELECT rule_id, table_name, severity, status, 1, detected_at
+            FROM changed
+        )
+        INSERT INTO violation_summary AS s (rule_id, table_name, severity, status, violation_count, last_detected)
+        SELECT rule_id, table_name, severity, status, SUM(delta), MAX(detected_at)
+        FROM deltas
+        WHERE rule_id IS NOT NULL
+        GROUP BY rule_id, table_name, severity, status
+        HAVING SUM(delta) <> 0
+        ORDER BY rule_id, table_name, severity, status
+        ON CONFLICT (rule_id, table_name, severity, status)
+        DO UPDATE SET violation_count = s.violation_count + EXCLUDED.violation_count,
+                      last_detected = GREATEST(s.last_detected, EXCLUDED.last_detected);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow only one event per trigger
+DROP TRIGGER IF EXISTS violation_summary_insert ON violations;
+CREATE TRIGGER violation_summary_insert
+    AFTER INSERT ON violations
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_violation_summary_delta();
+
+DROP TRIGGER IF EXISTS violation_summary_update ON violations;
+CREATE TRIGGER violation_summary_update
+    AFTER UPDATE ON violations
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_violation_summary_delta();
+
+DROP TRIGGER IF EXISTS violation_summary_delete ON violations;
+CREATE TRIGGER violation_summary_delete
+    AFTER DELETE ON violations
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_violation_summary_delta();
+
+-- Rebuild the summary from scratch (after manual edits or restoring violations)
+CREATE OR REPLACE FUNCTION rebuild_violation_summary()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE violations IN SHARE MODE;
+    DELETE FROM violation_summary;
+    INSERT INTO violation_summary (rule_id, table_name, severity, status, violation_count, last_detected)
+    SELECT rule_id, table_name, severity, status, COUNT(*), MAX(detected_at)
+    FROM violations
+    WHERE rule_id IS NOT NULL
+    GROUP BY rule_id, table_name, severity, status;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_violation_summary();
+
+-- ============================================================================
+-- PIPELINE EVENTS (LISTEN/NOTIFY, see service_core.events)
+-- ============================================================================
+
+-- A document finishing processing queues its rule extraction
+CREATE OR REPLACE FUNCTION notify_document_completed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('document_completed',
+                      json_build_object('document_id', NEW.document_id, 'trace_id', NEW.trace_id)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS document_completed_event ON documents;
+CREATE TRIGGER document_completed_event
+    AFTER UPDATE OF status ON documents
+    FOR EACH ROW
+    WHEN (NEW.status = 'completed' AND OLD.status IS DISTINCT FROM 'completed')
+    EXECUTE FUNCTION notify_document_completed();
+
+-- New rules, newly activated rules and changed active definitions queue a scan of
+-- just those rules. Statement-level; ids are sent 100 per notification to stay
+-- well under the 8000-byte payload limit.
+CREATE OR REPLACE FUNCTION notify_rules_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    ids UUID[];
+    i INTEGER;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(rule_id) INTO ids
+        FROM new_rows
+        WHERE status IN ('active', 'pending');
+    ELSE
+        SELECT array_agg(n.rule_id) INTO ids
+        FROM new_rows n
+        JOIN old_rows o ON o.rule_id = n.rule_id
+        WHERE n.status = 'active'
+          AND (o.status IS DISTINCT FROM 'active' OR n.version IS DISTINCT FROM o.version);
+    END IF;
+    FOR i IN 1 .. COALESCE(array_length(ids, 1), 0) BY 100 LOOP
+        PERFORM pg_notify('rules_changed', json_build_object('rule_ids', ids[i:i + 99])::text);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rules_changed_insert ON compliance_rules;
+CREATE TRIGGER rules_changed_insert
+    AFTER INSERT ON compliance_rules
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_rules_changed();
+
+DROP TRIGGER IF EXISTS rules_changed_update ON compliance_rules;
+CREATE TRIGGER rules_changed_update
+    AFTER UPDATE ON compliance_rules
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_rules_changed();
+
+-- ============================================================================
+-- PARTITION MAINTENANCE
+-- ============================================================================
+
+-- Create monthly partitions (<parent>_YYYY_MM) from the current month through months_ahead
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(parent_table TEXT, months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        month_start := (date_trunc('month', NOW()) + make_interval(months => i))::date;
+        partition_name := format('%s_%s', parent_table, to_char(month_start, 'YYYY_MM'));
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+        BEGIN
+            EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, parent_table, month_start, (month_start + INTERVAL '1 month')::date);
+            created := created + 1;
+        EXCEPTION WHEN check_violation THEN
+            -- The default partition already holds rows for this month
+            RAISE WARNING 'Cannot create %: default partition has rows in range', partition_name;
+        END;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Monthly partitions of parent_table entirely older than retain_months
+CREATE OR REPLACE FUNCTION expired_partitions(parent_table TEXT, retain_months INTEGER)
+RETURNS SETOF TEXT AS $$
+    SELECT c.relname::text
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = parent_table::regclass
+      AND c.relname ~ '_[0-9]{4}_[0-9]{2}$'
+      AND to_date(right(c.relname, 7), 'YYYY_MM') < date_trunc('month', NOW()) - make_interval(months => retain_months)
+    ORDER BY c.relname;
+$$ LANGUAGE sql;
+
+-- Detach a partition, then drop it or move it to the archive schema
+CREATE OR REPLACE FUNCTION retire_partition(parent_table TEXT, partition_name TEXT, archive BOOLEAN DEFAULT false)
+RETURNS VOID AS $$
+BEGIN
+    EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', parent_table, partition_name);
+    IF archive THEN
+        EXECUTE format('ALTER TABLE %I SET SCHEMA archive', partition_name);
+    ELSE
+        EXECUTE format('DROP TABLE %I', partition_name);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create upcoming partitions and retire expired ones instead of bulk DELETEs.
+-- Violation partitions that still hold open or acknowledged violations are kept.
+CREATE OR REPLACE FUNCTION maintain_partitions(
+    violation_retention_months INTEGER DEFAULT 24,
+    audit_retention_months INTEGER DEFAULT 12,
+    months_ahead INTEGER DEFAULT 3,
+    archive BOOLEAN DEFAULT false
+)
+RETURNS JSONB AS $$
+DECLARE
+    part TEXT;
+    has_open BOOLEAN;
+    created INTEGER;
+    retired TEXT[] := '{}';
+    kept TEXT[] := '{}';
+BEGIN
+    created := ensure_monthly_partitions('violations', months_ahead)
+             + ensure_monthly_partitions('audit_log', months_ahead);
+
+    FOR part IN SELECT expired_partitions('audit_log', audit_retention_months) LOOP
+        PERFORM retire_partition('audit_log', part, archive);
+        retired := retired || part;
+    END LOOP;
+
+    FOR part IN SELECT expired_partitions('violations', violation_retention_months) LOOP
+        -- Block rescans from reopening rows between the check and the detach
+        EXECUTE format('LOCK TABLE %I IN SHARE ROW EXCLUSIVE MODE', part);
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE status IN (''open'', ''acknowledged''))', part)
+            INTO has_open;
+        IF has_open THEN
+            kept := kept || part;
+            CONTINUE;
+        END IF;
+        -- Detaching fires no DELETE triggers, so take the rows out of the summary here
+        EXECUTE format('
+            INSERT INTO violation_summary AS s (rule_id, table_name, severity, status, violation_count)
+            SELECT rule_id, table_name, severity, status, -COUNT(*)
+            FROM %I
+            WHERE rule_id IS NOT NULL
+            GROUP BY rule_id, table_name, severity, status
+            ON CONFLICT (rule_id, table_name, severity, status)
+            DO UPDATE SET violation_count = s.violation_count + EXCLUDED.violation_count', part);
+        PERFORM retire_partition('violations', part, archive);
+        retired := retired || part;
+    END LOOP;
+
+    RETURN jsonb_build_object('created', created, 'retired', to_jsonb(retired), 'kept_open', to_jsonb(kept));
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT maintain_partitions();
+
 -- ============================================================================
 -- VIEWS FOR COMMON QUERIES
 -- ============================================================================
@@ -245,7 +654,9 @@ GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public TO admin;
 DO $$
 BEGIN
     RAISE NOTICE 'Database initialized successfully!';
-    RAISE NOTICE 'Created tables: compliance_rules, rule_executions, violations, documents, document_chunks, audit_log';
+    RAISE NOTICE 'Created tables: compliance_rules, rule_executions, violations, violation_summary, range_scans, scan_ranges, documents, document_chunks, document_pages, audit_log';
     RAISE NOTICE 'Created indexes for performance optimization';
+    RAISE NOTICE 'Partitioned violations and audit_log by month (see maintain_partitions)';
     RAISE NOTICE 'Created views: active_violations_summary, rule_performance';
+    RAISE NOTICE 'Pipeline events: document_completed, rules_changed (LISTEN/NOTIFY)';
 END $$;
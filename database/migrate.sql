@@ -0,0 +1,159 @@
+-- Upgrade a database created by an earlier init.sql to the current schema.
+-- init.sql only runs on an empty data directory and its CREATE TABLE IF NOT EXISTS
+-- statements leave existing tables untouched, so on an existing database this script
+-- adds the new columns and moves violations and audit_log into monthly partitions.
+-- It runs in one transaction; afterwards re-run init.sql for the new tables, indexes,
+-- functions and triggers:
+--
+--   psql -v ON_ERROR_STOP=1 -f database/migrate.sql
+--   psql -v ON_ERROR_STOP=1 -f database/init.sql
+--
+-- The unpartitioned tables are kept as violations_unpartitioned and
+-- audit_log_unpartitioned; drop them once the copies are checked. init.sql ends with
+-- maintain_partitions(), which retires copied months past the default retention
+-- (24 months of violations without open ones, 12 of audit log); those rows remain
+-- only in the unpartitioned tables.
+-- Safe to re-run: every step is skipped when already applied.
+
+BEGIN;
+
+-- ============================================================================
+-- NEW COLUMNS
+-- ============================================================================
+
+ALTER TABLE compliance_rules
+    ADD COLUMN IF NOT EXISTS severity VARCHAR(20) DEFAULT 'high' CHECK (severity IN ('critical', 'high', 'medium', 'low')),
+    ADD COLUMN IF NOT EXISTS scan_schedule VARCHAR(100),
+    ADD COLUMN IF NOT EXISTS trace_id VARCHAR(32);
+
+ALTER TABLE rule_executions
+    ADD COLUMN IF NOT EXISTS plan_summary JSONB,
+    ADD COLUMN IF NOT EXISTS trace_id VARCHAR(32);
+
+ALTER TABLE documents
+    ADD COLUMN IF NOT EXISTS trace_id VARCHAR(32),
+    ADD COLUMN IF NOT EXISTS rules_extracted_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS extraction_claimed_at TIMESTAMP;
+
+-- Documents whose rules are already stored must not be extracted again
+UPDATE documents d SET rules_extracted_at = COALESCE(d.processed_at, NOW())
+WHERE d.rules_extracted_at IS NULL
+  AND EXISTS (SELECT 1 FROM compliance_rules r WHERE r.source_document = d.document_id::text);
+
+-- Existing chunks get no source_page or minhash_bands: they are not near-duplicate
+-- candidates until their document is processed again
+ALTER TABLE document_chunks
+    ADD COLUMN IF NOT EXISTS source_page INTEGER,
+    ADD COLUMN IF NOT EXISTS content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english'::regconfig, content)) STORED,
+    ADD COLUMN IF NOT EXISTS minhash_bands BIGINT[],
+    ADD COLUMN IF NOT EXISTS duplicate_of UUID REFERENCES document_chunks(chunk_id) ON DELETE SET NULL,
+    ADD COLUMN IF NOT EXISTS duplicate_similarity REAL,
+    ADD COLUMN IF NOT EXISTS extracted_rules JSONB;
+
+-- ============================================================================
+-- PARTITIONED VIOLATIONS AND AUDIT LOG
+-- ============================================================================
+
+-- Monthly partitions (<parent>_YYYY_MM, as ensure_monthly_partitions names them) for
+-- every month of source_table's rows up to the current one, so copied rows do not
+-- land in the default partition (which would then block creating those months)
+CREATE OR REPLACE FUNCTION pg_temp.create_partitions_for(parent_table TEXT, source_table TEXT, column_name TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    first_month DATE;
+    month_start DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    EXECUTE format('SELECT date_trunc(''month'', MIN(%I))::date FROM %I', column_name, source_table)
+        INTO first_month;
+    month_start := COALESCE(first_month, date_trunc('month', NOW())::date);
+    WHILE month_start <= date_trunc('month', NOW())::date LOOP
+        partition_name := format('%s_%s', parent_table, to_char(month_start, 'YYYY_MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, parent_table, month_start, (month_start + INTERVAL '1 month')::date);
+            created := created + 1;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('violations')) IS DISTINCT FROM 'r' THEN
+        RAISE NOTICE 'violations is already partitioned';
+        RETURN;
+    END IF;
+
+    -- The view is recreated on the new table by init.sql
+    DROP VIEW IF EXISTS active_violations_summary;
+    ALTER TABLE violations RENAME TO violations_unpartitioned;
+    ALTER INDEX violations_pkey RENAME TO violations_unpartitioned_pkey;
+    DROP INDEX IF EXISTS idx_violations_rule, idx_violations_status, idx_violations_severity,
+                         idx_violations_detected, idx_violations_page, idx_violations_table,
+                         idx_violations_identity;
+    ALTER TABLE violations_unpartitioned ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP;
+
+    CREATE TABLE violations (
+        violation_id UUID NOT NULL DEFAULT uuid_generate_v4(),
+        rule_id UUID REFERENCES compliance_rules(rule_id) ON DELETE CASCADE,
+        record_id VARCHAR(255) NOT NULL,
+        table_name VARCHAR(100) NOT NULL,
+        detected_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        last_seen TIMESTAMP DEFAULT NOW(),
+        severity VARCHAR(20) DEFAULT 'medium' CHECK (severity IN ('critical', 'high', 'medium', 'low')),
+        status VARCHAR(20) DEFAULT 'open' CHECK (status IN ('open', 'acknowledged', 'resolved', 'false_positive')),
+        explanation TEXT,
+        evidence JSONB,
+        resolved_at TIMESTAMP,
+        resolved_by VARCHAR(100),
+        resolution_notes TEXT,
+        PRIMARY KEY (violation_id, detected_at)
+    ) PARTITION BY RANGE (detected_at);
+    CREATE TABLE violations_default PARTITION OF violations DEFAULT;
+    PERFORM pg_temp.create_partitions_for('violations', 'violations_unpartitioned', 'detected_at');
+
+    INSERT INTO violations (violation_id, rule_id, record_id, table_name, detected_at, last_seen,
+                            severity, status, explanation, evidence, resolved_at, resolved_by, resolution_notes)
+    SELECT violation_id, rule_id, record_id, table_name, COALESCE(detected_at, NOW()),
+           COALESCE(last_seen, detected_at, NOW()), severity, status, explanation, evidence,
+           resolved_at, resolved_by, resolution_notes
+    FROM violations_unpartitioned;
+    RAISE NOTICE 'Copied violations into the partitioned table';
+END $$;
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('audit_log')) IS DISTINCT FROM 'r' THEN
+        RAISE NOTICE 'audit_log is already partitioned';
+        RETURN;
+    END IF;
+
+    ALTER TABLE audit_log RENAME TO audit_log_unpartitioned;
+    ALTER INDEX audit_log_pkey RENAME TO audit_log_unpartitioned_pkey;
+    DROP INDEX IF EXISTS idx_audit_timestamp, idx_audit_event_type, idx_audit_user;
+
+    CREATE TABLE audit_log (
+        log_id UUID NOT NULL DEFAULT uuid_generate_v4(),
+        event_type VARCHAR(50) NOT NULL,
+        entity_type VARCHAR(50),
+        entity_id UUID,
+        user_id VARCHAR(100),
+        timestamp TIMESTAMP NOT NULL DEFAULT NOW(),
+        details JSONB,
+        ip_address INET,
+        PRIMARY KEY (log_id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+    CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT;
+    PERFORM pg_temp.create_partitions_for('audit_log', 'audit_log_unpartitioned', 'timestamp');
+
+    INSERT INTO audit_log (log_id, event_type, entity_type, entity_id, user_id, timestamp, details, ip_address)
+    SELECT log_id, event_type, entity_type, entity_id, user_id, COALESCE(timestamp, NOW()), details, ip_address
+    FROM audit_log_unpartitioned;
+    RAISE NOTICE 'Copied audit_log into the partitioned table';
+END $$;
+
+COMMIT;
@@ -23,15 +23,16 @@ export const Dashboard: React.FC = () => {
     const fetchData = async () => {
       try {
         // Parallel requests
-        const [docsRes, rulesRes, violationsRes] = await Promise.all([
+        const [docsRes, rulesRes, summaryRes, violationsRes] = await Promise.all([
           axios.get(`${DOC_URL}/documents`),
           axios.get(`${RULE_URL}/rules`),
-          axios.get(`${SCANNER_URL}/violations`)
+          axios.get(`${SCANNER_URL}/violations/summary`),
+          axios.get(`${SCANNER_URL}/violations`, { params: { limit: 5 } })
         ]);
 
         const totalDocs = docsRes.data.count || 0;
         const totalRules = rulesRes.data.count || 0;
-        const totalViolations = violationsRes.data.count || 0;
+        const totalViolations = summaryRes.data.open || 0;
 
         // Simple heuristic for compliance score
         // Start at 100, deduct 5 for each violation
@@ -45,7 +46,7 @@ export const Dashboard: React.FC = () => {
         });
 
         // Set recent 5 violations
-        setRecentViolations(violationsRes.data.violations.slice(0, 5));
+        setRecentViolations(violationsRes.data.violations);
 
       } catch (err) {
         console.error("Dashboard fetch error:", err);
@@ -1,10 +1,11 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { AlertCircle, CheckCircle2, XCircle, Search, Filter, AlertTriangle, ShieldAlert, ChevronDown, ChevronRight, Package } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
 import axios from 'axios';
 
 // API URL
 const SCANNER_URL = 'http://localhost:8083';
+const PAGE_SIZE = 200;
 
 interface Violation {
   violation_id: string;
@@ -13,14 +14,24 @@ interface Violation {
   evidence: any;
   explanation: string;
   created_at: string;
+  rule_id: string;
   rule_name: string;
   rule_type: string;
 }
 
+interface RuleSummary {
+  rule_id: string;
+  rule_name: string;
+  total: number;
+  open: number;
+}
+
 interface ViolationGroup {
+  rule_id: string;
   rule_name: string;
   rule_type: string;
   violations: Violation[];
+  totalCount: number;
   openCount: number;
   severity: string;
 }
@@ -31,11 +42,30 @@ export const Violations: React.FC = () => {
   const [scanning, setScanning] = useState(false);
   const [processingId, setProcessingId] = useState<string | null>(null);
   const [expandedGroups, setExpandedGroups] = useState<Set<string>>(new Set());
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const pagesLoaded = useRef(0);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [totalOpen, setTotalOpen] = useState(0);
+  const [ruleSummaries, setRuleSummaries] = useState<RuleSummary[]>([]);
 
+  // Counts come from the server-side summary; rows are loaded a page at a time
   const fetchViolations = async () => {
     try {
-      const res = await axios.get(`${SCANNER_URL}/violations`);
-      setViolations(res.data.violations);
+      const [summaryRes, pageRes] = await Promise.all([
+        axios.get(`${SCANNER_URL}/violations/summary`),
+        axios.get(`${SCANNER_URL}/violations`, { params: { limit: PAGE_SIZE } })
+      ]);
+      setTotalOpen(summaryRes.data.open);
+      setRuleSummaries(summaryRes.data.by_rule);
+
+      // Refresh the newest page without dropping pages loaded further down
+      const firstPage: Violation[] = pageRes.data.violations;
+      const refreshed = new Set(firstPage.map(v => v.violation_id));
+      setViolations(prev => [...firstPage, ...prev.filter(v => !refreshed.has(v.violation_id))]);
+      if (pagesLoaded.current <= 1) {
+        setNextCursor(pageRes.data.next_cursor);
+        pagesLoaded.current = 1;
+      }
     } catch (err) {
       console.error("Failed to fetch violations", err);
     } finally {
@@ -43,6 +73,21 @@ export const Violations: React.FC = () => {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const res = await axios.get(`${SCANNER_URL}/violations`, { params: { limit: PAGE_SIZE, cursor: nextCursor } });
+      setViolations(prev => [...prev, ...res.data.violations]);
+      setNextCursor(res.data.next_cursor);
+      pagesLoaded.current += 1;
+    } catch (err) {
+      console.error("Failed to load more violations", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const triggerScan = async () => {
     setScanning(true);
     try {
@@ -58,11 +103,19 @@ export const Violations: React.FC = () => {
 
   const handleResolve = async (violationId: string, status: 'resolved' | 'ignored') => {
     setProcessingId(violationId);
+    const violation = violations.find(v => v.violation_id === violationId);
     try {
       await axios.post(`${SCANNER_URL}/violations/${violationId}/resolve?status=${status}`);
       setViolations(prev => prev.map(v =>
         v.violation_id === violationId ? { ...v, status } : v
       ));
+      // Only an open violation leaving 'open' changes the open counts
+      if (violation?.status === 'open') {
+        setRuleSummaries(prev => prev.map(r =>
+          r.rule_id === violation.rule_id ? { ...r, open: Math.max(0, r.open - 1) } : r
+        ));
+        setTotalOpen(prev => Math.max(0, prev - 1));
+      }
     } catch (err) {
       console.error("Failed to resolve violation", err);
       alert("Failed to update status.");
@@ -71,8 +124,8 @@ export const Violations: React.FC = () => {
     }
   };
 
-  const handleBulkResolve = async (ruleName: string, status: 'resolved' | 'ignored') => {
-    const ruleViolations = violations.filter(v => v.rule_name === ruleName && v.status === 'open');
+  const handleBulkResolve = async (ruleId: string, status: 'resolved' | 'ignored') => {
+    const ruleViolations = violations.filter(v => v.rule_id === ruleId && v.status === 'open');
     for (const v of ruleViolations) {
       await handleResolve(v.violation_id, status);
     }
@@ -84,35 +137,37 @@ export const Violations: React.FC = () => {
     return () => clearInterval(interval);
   }, []);
 
-  // Group violations by rule
+  // Group loaded violations by rule (by id: rule names are not unique); counts cover
+  // all violations, not just loaded pages
   const groupedViolations: ViolationGroup[] = React.useMemo(() => {
     const groups = new Map<string, ViolationGroup>();
+    const summaries = new Map(ruleSummaries.map(r => [r.rule_id, r]));
 
     violations.forEach(v => {
-      if (!groups.has(v.rule_name)) {
-        groups.set(v.rule_name, {
+      if (!groups.has(v.rule_id)) {
+        groups.set(v.rule_id, {
+          rule_id: v.rule_id,
           rule_name: v.rule_name,
           rule_type: v.rule_type,
           violations: [],
-          openCount: 0,
+          totalCount: summaries.get(v.rule_id)?.total ?? 0,
+          openCount: summaries.get(v.rule_id)?.open ?? 0,
           severity: v.severity
         });
       }
-      const group = groups.get(v.rule_name)!;
-      group.violations.push(v);
-      if (v.status === 'open') group.openCount++;
+      groups.get(v.rule_id)!.violations.push(v);
     });
 
     return Array.from(groups.values()).sort((a, b) => b.openCount - a.openCount);
-  }, [violations]);
+  }, [violations, ruleSummaries]);
 
-  const toggleGroup = (ruleName: string) => {
+  const toggleGroup = (ruleId: string) => {
     setExpandedGroups(prev => {
       const next = new Set(prev);
-      if (next.has(ruleName)) {
-        next.delete(ruleName);
+      if (next.has(ruleId)) {
+        next.delete(ruleId);
       } else {
-        next.add(ruleName);
+        next.add(ruleId);
       }
       return next;
     });
@@ -127,14 +182,12 @@ export const Violations: React.FC = () => {
     }
   };
 
-  const totalOpen = violations.filter(v => v.status === 'open').length;
-
   return (
     <div className="space-y-6 animate-in fade-in duration-500">
       <div className="flex flex-col md:flex-row md:items-center justify-between gap-4">
         <div>
           <h2 className="text-xl font-bold text-slate-900 dark:text-white">Compliance Violations</h2>
-          <p className="text-sm text-slate-500">{totalOpen} open issues across {groupedViolations.length} rules</p>
+          <p className="text-sm text-slate-500">{totalOpen} open issues across {ruleSummaries.filter(r => r.open > 0).length} rules</p>
         </div>
         <div className="flex items-center gap-3">
           <button
@@ -159,17 +212,17 @@ export const Violations: React.FC = () => {
       ) : (
         <div className="space-y-4">
           {groupedViolations.map((group) => {
-            const isExpanded = expandedGroups.has(group.rule_name);
+            const isExpanded = expandedGroups.has(group.rule_id);
             return (
               <motion.div
-                key={group.rule_name}
+                key={group.rule_id}
                 initial={{ opacity: 0, y: 20 }}
                 animate={{ opacity: 1, y: 0 }}
                 className="bg-white dark:bg-slate-900 rounded-xl border border-slate-200 dark:border-slate-800 shadow-sm overflow-hidden"
               >
                 {/* Group Header */}
                 <div
-                  onClick={() => toggleGroup(group.rule_name)}
+                  onClick={() => toggleGroup(group.rule_id)}
                   className="p-4 cursor-pointer hover:bg-slate-50 dark:hover:bg-slate-800/50 transition-colors flex items-center justify-between"
                 >
                   <div className="flex items-center gap-4 flex-1">
@@ -179,7 +232,7 @@ export const Violations: React.FC = () => {
                     </div>
                     <div className="flex-1">
                       <h3 className="font-bold text-slate-900 dark:text-white">{group.rule_name}</h3>
-                      <p className="text-xs text-slate-500 mt-0.5">{group.rule_type} • {group.violations.length} total violations</p>
+                      <p className="text-xs text-slate-500 mt-0.5">{group.rule_type} • {group.totalCount} total violations</p>
                     </div>
                     <div className="flex items-center gap-3">
                       <span className={`inline-flex items-center gap-1.5 px-3 py-1.5 rounded-full text-xs font-bold uppercase tracking-wide border ${getSeverityColor(group.severity)}`}>
@@ -206,18 +259,18 @@ export const Violations: React.FC = () => {
                     >
                       <div className="p-4 bg-slate-50 dark:bg-slate-800/30 flex items-center justify-between">
                         <p className="text-xs text-slate-600 dark:text-slate-400">
-                          Showing {group.violations.length} violation{group.violations.length !== 1 ? 's' : ''}
+                          Showing {group.violations.length} of {group.totalCount} violation{group.totalCount !== 1 ? 's' : ''}
                         </p>
                         {group.openCount > 0 && (
                           <div className="flex gap-2">
                             <button
-                              onClick={(e) => { e.stopPropagation(); handleBulkResolve(group.rule_name, 'resolved'); }}
+                              onClick={(e) => { e.stopPropagation(); handleBulkResolve(group.rule_id, 'resolved'); }}
                               className="text-xs px-3 py-1.5 bg-emerald-600 text-white rounded-lg hover:bg-emerald-700 transition-all font-medium"
                             >
-                              Resolve All ({group.openCount})
+                              Resolve All ({group.violations.filter(v => v.status === 'open').length})
                             </button>
                             <button
-                              onClick={(e) => { e.stopPropagation(); handleBulkResolve(group.rule_name, 'ignored'); }}
+                              onClick={(e) => { e.stopPropagation(); handleBulkResolve(group.rule_id, 'ignored'); }}
                               className="text-xs px-3 py-1.5 bg-slate-600 text-white rounded-lg hover:bg-slate-700 transition-all font-medium"
                             >
                               Ignore All
@@ -269,6 +322,17 @@ export const Violations: React.FC = () => {
               </motion.div>
             );
           })}
+          {nextCursor && (
+            <div className="text-center">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="text-sm px-4 py-2 border border-slate-200 dark:border-slate-700 rounded-lg text-slate-600 dark:text-slate-300 hover:bg-slate-50 dark:hover:bg-slate-800 transition-all disabled:opacity-50"
+              >
+                {loadingMore ? 'Loading...' : `Load more (page ${pagesLoaded.current + 1})`}
+              </button>
+            </div>
+          )}
         </div>
       )}
     </div>
@@ -0,0 +1,7 @@
+"""
+Shared core for the platform's services: configuration, pooled async
+database access, logging/telemetry and warm-up of heavy dependencies.
+
+Kept free of heavy imports so that importing it costs next to nothing at
+service start.
+"""
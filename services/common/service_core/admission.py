@@ -0,0 +1,162 @@
+"""
+Admission control for work a service accepts.
+
+An AdmissionController bounds the work a service has in flight (queued or
+running) in total and per client. A request that would exceed either bound
+is refused with 429 Too Many Requests, a Retry-After estimated from how long
+recent work took, and the current load, so a burst of uploads or extractions
+is pushed back to the callers instead of starving the process.
+
+Controllers are used from the event loop only: admit() when work is accepted,
+release() when it finishes (for background tasks, in the task's `finally`),
+or `async with controller.slot(client)` around work done within the request.
+FastAPI reads and parses a request's body before the endpoint runs, so
+uploads are also refused by AdmissionMiddleware, before the body is received.
+"""
+
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Collection, Dict, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from prometheus_client import Counter, Gauge
+
+from .config import env_bool, env_int
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_IN_FLIGHT = env_int("ADMISSION_MAX_IN_FLIGHT", 64)
+ADMISSION_CLIENT_LIMIT = env_int("ADMISSION_CLIENT_LIMIT", 16)
+# Retry-After before any work has finished, and its upper bound
+ADMISSION_RETRY_AFTER = env_int("ADMISSION_RETRY_AFTER", 5)
+ADMISSION_MAX_RETRY_AFTER = env_int("ADMISSION_MAX_RETRY_AFTER", 300)
+# Set only when every request arrives through a proxy that sets (or strips) X-Client-Id;
+# otherwise callers could pick a fresh id per request and never reach their client limit
+ADMISSION_TRUST_CLIENT_ID = env_bool("ADMISSION_TRUST_CLIENT_ID")
+
+IN_FLIGHT = Gauge("admission_in_flight", "Admitted work queued or running", ["controller"])
+ADMITTED = Counter("admission_admitted_total", "Work admitted", ["controller"])
+REJECTED = Counter("admission_rejected_total", "Work refused with 429, by bound hit", ["controller", "reason"])
+
+
+def client_id(request: Request) -> str:
+    """The quota key: the peer address, or an X-Client-Id header behind a trusted proxy."""
+    if ADMISSION_TRUST_CLIENT_ID and request.headers.get("x-client-id"):
+        return request.headers["x-client-id"]
+    return request.client.host if request.client else "unknown"
+
+
+class AdmissionController:
+    """Bounds in-flight work overall (`max_in_flight`) and per client (`client_limit`)"""
+
+    def __init__(self, name: str, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+                 client_limit: int = ADMISSION_CLIENT_LIMIT):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.client_limit = min(client_limit, max_in_flight)
+        self.in_flight = 0
+        self._clients: Dict[str, int] = {}
+        # Moving average of how long one unit of work stays in flight
+        self._average_seconds: Optional[float] = None
+
+    def available(self, client: str) -> int:
+        """Units `client` could have admitted right now"""
+        return max(0, min(self.max_in_flight - self.in_flight,
+                          self.client_limit - self._clients.get(client, 0)))
+
+    def admit(self, client: str, units: int = 1):
+        """Take `units` of capacity for `client`, or raise a 429 HTTPException."""
+        if self.in_flight + units > self.max_in_flight:
+            self._reject(client, "service")
+        if self._clients.get(client, 0) + units > self.client_limit:
+            self._reject(client, "client")
+        self.in_flight += units
+        self._clients[client] = self._clients.get(client, 0) + units
+        IN_FLIGHT.labels(self.name).set(self.in_flight)
+        ADMITTED.labels(self.name).inc(units)
+
+    def release(self, client: str, units: int = 1, started: Optional[float] = None):
+        """Return capacity; `started` (a time.monotonic() value) feeds the Retry-After estimate."""
+        self.in_flight = max(0, self.in_flight - units)
+        remaining = self._clients.get(client, 0) - units
+        if remaining > 0:
+            self._clients[client] = remaining
+        else:
+            self._clients.pop(client, None)
+        IN_FLIGHT.labels(self.name).set(self.in_flight)
+        if started is not None:
+            seconds = (time.monotonic() - started) / units
+            average = self._average_seconds
+            self._average_seconds = seconds if average is None else 0.8 * average + 0.2 * seconds
+
+    @asynccontextmanager
+    async def slot(self, client: str) -> AsyncIterator[None]:
+        """Hold one unit for the duration of the block (work done within the request)."""
+        self.admit(client)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(client, started=started)
+
+    def retry_after(self) -> int:
+        """Seconds until capacity is likely to free up"""
+        if self._average_seconds is None:
+            return ADMISSION_RETRY_AFTER
+        return max(1, min(ADMISSION_MAX_RETRY_AFTER, math.ceil(self._average_seconds)))
+
+    def load(self, client: Optional[str] = None) -> Dict[str, Any]:
+        load = {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "utilization": round(self.in_flight / self.max_in_flight, 3) if self.max_in_flight else 1.0,
+            "clients": len(self._clients),
+            "client_limit": self.client_limit,
+        }
+        if client is not None:
+            load["client_in_flight"] = self._clients.get(client, 0)
+        return load
+
+    def refuse(self, client: str):
+        """Raise the 429 for whichever bound `client` is currently up against."""
+        self._reject(client, "service" if self.in_flight >= self.max_in_flight else "client")
+
+    def _reject(self, client: str, reason: str):
+        REJECTED.labels(self.name, reason).inc()
+        retry_after = self.retry_after()
+        message = ("Service is at capacity" if reason == "service"
+                   else "Too much work in flight for this client")
+        logger.warning(f"{self.name}: refused work from {client} ({reason} limit), retry after {retry_after}s")
+        raise HTTPException(
+            status_code=429,
+            detail={"error": message, "limit": reason, "retry_after": retry_after, "load": self.load(client)},
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware answering POST requests to `paths` with the controller's 429
+    while their client has no capacity left, before the request body is received.
+    The endpoint still admits the work itself; this only refuses it early.
+    """
+
+    def __init__(self, app, controller: AdmissionController, paths: Collection[str]):
+        self.app = app
+        self.controller = controller
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.paths:
+            client = client_id(Request(scope))
+            if not self.controller.available(client):
+                try:
+                    self.controller.refuse(client)
+                except HTTPException as e:
+                    response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
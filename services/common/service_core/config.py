@@ -0,0 +1,32 @@
+"""
+Service configuration from the environment.
+"""
+
+import os
+
+
+def env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    return os.getenv(name, "true" if default else "false").lower() == "true"
+
+
+def database_url() -> str:
+    """DATABASE_URL if set, otherwise a conninfo string from DB_HOST/DB_NAME/DB_USER/DB_PASS/DB_PORT."""
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    from psycopg.conninfo import make_conninfo
+    return make_conninfo(
+        host=os.getenv("DB_HOST", "postgres"),
+        dbname=os.getenv("DB_NAME", "compliance"),
+        user=os.getenv("DB_USER", "admin"),
+        password=os.getenv("DB_PASS", "admin123"),
+        port=os.getenv("DB_PORT", "5432")
+    )
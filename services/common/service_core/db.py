@@ -0,0 +1,66 @@
+"""
+Async, pooled database access for request handlers.
+
+Queries no longer block the event loop, and requests reuse pooled
+connections instead of connecting per request. Engines that run on their own
+threads (the scanner's scans) open blocking connections with connect_blocking().
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from .config import database_url, env_int
+
+logger = logging.getLogger(__name__)
+
+# Connection pool bounds (per process)
+DB_POOL_MIN_SIZE = env_int("DB_POOL_MIN_SIZE", 1)
+DB_POOL_MAX_SIZE = env_int("DB_POOL_MAX_SIZE", 10)
+
+
+class Database:
+    """Async connection pool with dict rows; each call runs in its own transaction"""
+
+    def __init__(self, conninfo: Optional[str] = None):
+        self.conninfo = conninfo or database_url()
+        self.pool: Optional[AsyncConnectionPool] = None
+
+    async def connect(self):
+        """Open the pool; connections are established in the background, so startup does not wait on them."""
+        self.pool = AsyncConnectionPool(
+            self.conninfo,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            kwargs={"row_factory": dict_row},
+            open=False
+        )
+        await self.pool.open(wait=False)
+        logger.info(f"Database pool opening ({DB_POOL_MIN_SIZE}-{DB_POOL_MAX_SIZE} connections)")
+
+    async def disconnect(self):
+        if self.pool:
+            await self.pool.close()
+            logger.info("Database pool closed")
+
+    def connection(self):
+        """Pooled connection as an async context manager (commits on success, rolls back on error)"""
+        return self.pool.connection()
+
+    async def fetch(self, query, params: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(query, params)
+            return await cur.fetchall()
+
+    async def fetchone(self, query, params: Optional[Sequence[Any]] = None) -> Optional[Dict[str, Any]]:
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(query, params)
+            return await cur.fetchone()
+
+
+def connect_blocking(conninfo: Optional[str] = None):
+    """Blocking psycopg2 connection, for work on background threads rather than the event loop"""
+    import psycopg2
+    return psycopg2.connect(conninfo or database_url())
@@ -0,0 +1,103 @@
+"""
+Pipeline events over Postgres LISTEN/NOTIFY.
+
+Triggers in init.sql notify `document_completed` when a document finishes
+processing and `rules_changed` when rules are inserted or activated. An
+EventListener holds one dedicated connection LISTENing on a channel and hands
+the JSON payloads to an async handler in batches: a burst of notifications is
+coalesced until the channel has been quiet for `debounce` seconds (or
+`max_delay` has passed since the first one), so one bulk insert of rules
+becomes one scan instead of hundreds.
+
+Notifications are not queued while no one is listening, so consumers should
+also catch up on start-up (e.g. documents completed while they were down).
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .config import database_url, env_bool, env_int
+
+logger = logging.getLogger(__name__)
+
+# Chain pipeline stages on database events (disable to trigger stages only by hand)
+PIPELINE_EVENTS = env_bool("PIPELINE_EVENTS", True)
+EVENT_DEBOUNCE_MS = env_int("EVENT_DEBOUNCE_MS", 2000)
+EVENT_MAX_DELAY_MS = env_int("EVENT_MAX_DELAY_MS", 10000)
+
+Handler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+
+class EventListener:
+    """LISTENs on one channel and delivers debounced batches of payloads to `handler`"""
+
+    def __init__(self, channel: str, handler: Handler, debounce: float = EVENT_DEBOUNCE_MS / 1000,
+                 max_delay: float = EVENT_MAX_DELAY_MS / 1000, conninfo: Optional[str] = None):
+        self.channel = channel
+        self.handler = handler
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.conninfo = conninfo or database_url()
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._listen(), name=f"listen-{self.channel}"),
+            asyncio.create_task(self._deliver(), name=f"deliver-{self.channel}"),
+        ]
+        logger.info(f"Listening for {self.channel} events")
+
+    def put(self, payload: Dict[str, Any]):
+        """Queue an event locally, as if it had been notified"""
+        self._queue.put_nowait(payload)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _listen(self):
+        """Queue every notification; reconnect with backoff if the connection drops."""
+        from psycopg import AsyncConnection
+
+        backoff = 1
+        while True:
+            try:
+                async with await AsyncConnection.connect(self.conninfo, autocommit=True) as conn:
+                    await conn.execute(f'LISTEN "{self.channel}"')
+                    backoff = 1
+                    async for notify in conn.notifies():
+                        try:
+                            payload = json.loads(notify.payload) if notify.payload else {}
+                        except ValueError:
+                            logger.warning(f"Ignoring malformed {self.channel} payload: {notify.payload[:200]}")
+                            continue
+                        self._queue.put_nowait(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.channel} listener lost its connection: {e}; retrying in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    async def _deliver(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            # Keep collecting until the burst goes quiet or the first event has waited long enough
+            while True:
+                timeout = min(self.debounce, deadline - loop.time())
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self.handler(batch)
+            except Exception as e:
+                logger.error(f"Handling {len(batch)} {self.channel} events failed: {e}")
@@ -0,0 +1,70 @@
+"""
+Prometheus metrics shared by the services.
+
+Each service defines its own counters and histograms next to the code that
+updates them; this module serves them on /metrics and adds the collectors
+every service has in common, such as database pool saturation.
+"""
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.responses import Response
+
+# Cumulative psycopg_pool statistics exported as counters: (stat, metric suffix, help)
+POOL_COUNTERS = [
+    ("requests_num", "requests", "Connections requested from the pool"),
+    ("requests_queued", "requests_queued", "Connection requests that had to wait for a free connection"),
+    ("requests_wait_ms", "requests_wait_milliseconds", "Total time spent waiting for a connection"),
+    ("requests_errors", "requests_errors", "Connection requests that failed or timed out"),
+    ("connections_errors", "connection_errors", "Failed attempts to open a connection"),
+]
+
+
+class PoolCollector:
+    """Reads a Database's psycopg_pool statistics at scrape time."""
+
+    def __init__(self, db, name: str):
+        self.db = db
+        self.name = name
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        pool = self.db.pool
+        if pool is None:
+            return
+        stats = pool.get_stats()
+        size = stats.get("pool_size", 0)
+        available = stats.get("pool_available", 0)
+        maximum = stats.get("pool_max", 0)
+
+        gauges = [
+            ("db_pool_size", "Connections currently open", size),
+            ("db_pool_max_size", "Upper bound on open connections", maximum),
+            ("db_pool_available", "Open connections idle in the pool", available),
+            ("db_pool_in_use", "Connections checked out by requests", size - available),
+            ("db_pool_requests_waiting", "Requests currently waiting for a connection",
+             stats.get("requests_waiting", 0)),
+            ("db_pool_saturation", "Connections in use as a fraction of the pool's maximum size",
+             (size - available) / maximum if maximum else 0.0),
+        ]
+        for metric, documentation, value in gauges:
+            family = GaugeMetricFamily(metric, documentation, labels=["pool"])
+            family.add_metric([self.name], value)
+            yield family
+
+        for stat, suffix, documentation in POOL_COUNTERS:
+            family = CounterMetricFamily(f"db_pool_{suffix}", documentation, labels=["pool"])
+            family.add_metric([self.name], stats.get(stat, 0))
+            yield family
+
+
+def register_pool(db, name: str = "default"):
+    """Export a service_core.db.Database's pool statistics (read on each scrape)."""
+    REGISTRY.register(PoolCollector(db, name))
+
+
+def metrics_response() -> Response:
+    """The /metrics payload in the Prometheus text format."""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
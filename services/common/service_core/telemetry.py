@@ -0,0 +1,17 @@
+"""
+Logging setup shared by the services.
+"""
+
+import logging
+import os
+from typing import Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def setup_logging(level: Optional[str] = None):
+    """
+    Configure root logging (LOG_LEVEL, default INFO). Replaces any handler a
+    module-level basicConfig installed at import time.
+    """
+    logging.basicConfig(level=(level or os.getenv("LOG_LEVEL", "INFO")).upper(), format=LOG_FORMAT, force=True)
@@ -0,0 +1,251 @@
+"""
+Span tracing shared by the services.
+
+Spans use W3C Trace Context ids (32-hex trace id, 16-hex span id), so one
+trace can follow a document from upload through rule extraction to the scans
+of its rules: over HTTP via the `traceparent` header, and across services via
+the trace_id stored on documents, compliance_rules and rule_executions.
+
+Finished spans are exported as Zipkin v2 JSON, appended to TRACE_FILE (one
+span per line) and/or POSTed in batches to TRACE_ENDPOINT (a local Zipkin,
+Jaeger or OpenTelemetry collector zipkin receiver, e.g.
+http://localhost:9411/api/v2/spans). With neither set, ids still propagate
+but nothing is exported.
+"""
+
+import functools
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .config import env_int
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_ENDPOINT = os.getenv("TRACE_ENDPOINT")
+TRACE_BATCH_SIZE = env_int("TRACE_BATCH_SIZE", 100)
+TRACE_FLUSH_SECONDS = env_int("TRACE_FLUSH_SECONDS", 5)
+# Probe and scrape endpoints are not traced
+TRACE_EXCLUDE_PATHS = {p.strip() for p in os.getenv("TRACE_EXCLUDE_PATHS", "/health,/ready,/metrics").split(",")}
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_service_name = os.getenv("SERVICE_NAME", "unknown")
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "duration", "attributes")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, kind: Optional[str] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.attributes: Dict[str, str] = {}
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = str(value)
+
+    def end(self):
+        if self.duration is None:
+            self.duration = time.time() - self.start
+            _exporter.export(self)
+
+    def to_zipkin(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": int(self.start * 1_000_000),
+            "duration": max(1, int((self.duration or 0) * 1_000_000)),
+            "localEndpoint": {"serviceName": _service_name},
+            "tags": self.attributes,
+        }
+        if self.parent_id:
+            span["parentId"] = self.parent_id
+        if self.kind:
+            span["kind"] = self.kind
+        return span
+
+
+class _Exporter:
+    """Writes finished spans to TRACE_FILE and batches them to TRACE_ENDPOINT from a daemon thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=10_000)
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, span: Span):
+        if not (TRACE_FILE or TRACE_ENDPOINT):
+            return
+        record = span.to_zipkin()
+        if TRACE_FILE:
+            with self._lock, open(TRACE_FILE, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        if TRACE_ENDPOINT:
+            if self._thread is None:
+                self._start()
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                pass  # Drop spans rather than block the traced work
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch: List[Dict[str, Any]] = []
+            deadline = time.monotonic() + TRACE_FLUSH_SECONDS
+            while len(batch) < TRACE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch:
+                self._post(batch)
+
+    def _post(self, batch: List[Dict[str, Any]]):
+        request = urllib.request.Request(TRACE_ENDPOINT, data=json.dumps(batch).encode(), method="POST",
+                                         headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            logger.warning(f"Could not export {len(batch)} spans to {TRACE_ENDPOINT}: {e}")
+
+
+_exporter = _Exporter()
+
+
+def setup_tracing(service_name: str):
+    """Name the service its spans are reported under."""
+    global _service_name
+    _service_name = os.getenv("SERVICE_NAME", service_name)
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current.get()
+    return current.trace_id if current else None
+
+
+@contextmanager
+def span(name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+         kind: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    """
+    Time the enclosed block as a child of the current span, or as a new trace.
+    Passing `trace_id` (e.g. one read from a database record) continues that
+    trace instead; the trace it was started from is kept as `link.trace_id`.
+    """
+    parent = _current.get()
+    if trace_id is None:
+        trace_id = parent.trace_id if parent else new_trace_id()
+        if parent_id is None and parent:
+            parent_id = parent.span_id
+    current = Span(name, trace_id, parent_id, kind)
+    if parent and parent.trace_id != trace_id:
+        current.set_attribute("link.trace_id", parent.trace_id)
+    for key, value in attributes.items():
+        if value is not None:
+            current.set_attribute(key, value)
+
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_attribute("error", type(e).__name__)
+        current.set_attribute("error.message", str(e)[:500])
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def traced(name: Optional[str] = None):
+    """Decorator: run the function inside a span (named after it by default)."""
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def traceparent(current: Optional[Span] = None) -> Optional[str]:
+    """`traceparent` header value for the current (or given) span."""
+    current = current or _current.get()
+    return f"00-{current.trace_id}-{current.span_id}-01" if current else None
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace_id, parent span_id) from a `traceparent` header, or None if absent or malformed."""
+    match = TRACEPARENT.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32:
+        return None
+    return match.group(1), match.group(2)
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware running each HTTP request in a server span, continuing the
+    caller's trace from `traceparent` and returning the span's own `traceparent`.
+    The span ends when the response is sent; background tasks run after it as
+    children in the same trace.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in TRACE_EXCLUDE_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        incoming = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        trace_id, parent_id = incoming if incoming else (None, None)
+        name = f"{scope['method']} {scope['path']}"
+
+        with span(name, trace_id=trace_id, parent_id=parent_id, kind="SERVER",
+                  **{"http.method": scope["method"], "http.target": scope["path"]}) as request_span:
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    request_span.set_attribute("http.status_code", message["status"])
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"traceparent", traceparent(request_span).encode())
+                    ]
+                elif message["type"] == "http.response.body" and not message.get("more_body"):
+                    request_span.end()
+                await send(message)
+
+            await self.app(scope, receive, send_traced)
@@ -0,0 +1,53 @@
+"""
+Background warm-up of heavy dependencies.
+
+Services register loaders (model loads, heavy imports, cache priming) and
+start them after the app is up, so /health answers immediately and /ready
+reports when the service can do real work.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class WarmUp:
+    """Runs registered loaders once, in order, on a daemon thread"""
+
+    def __init__(self):
+        self._loaders: List[Tuple[str, Callable[[], Any]]] = []
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._done = threading.Event()
+        self._thread = None
+
+    def add(self, name: str, loader: Callable[[], Any]):
+        self._loaders.append((name, loader))
+        self._status[name] = {"status": "pending"}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        for name, loader in self._loaders:
+            started = time.perf_counter()
+            try:
+                loader()
+                self._status[name] = {"status": "ready"}
+            except Exception as e:
+                logger.error(f"Warm-up step {name} failed: {e}")
+                self._status[name] = {"status": "failed", "error": str(e)}
+            self._status[name]["seconds"] = round(time.perf_counter() - started, 3)
+        self._done.set()
+        logger.info(f"Warm-up finished: {self._status}")
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "steps": dict(self._status)}
@@ -3,61 +3,40 @@ Database operations for Document Processor Service
 """
 
 import logging
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor, Json
+from typing import Any, List, Dict, Optional, Tuple
 import uuid
+from psycopg.types.json import Json
+from service_core.db import Database as PooledDatabase
 
 logger = logging.getLogger(__name__)
 
 
-class Database:
-    """Database connection and operations"""
-    
-    def __init__(self, connection_string: str):
-        self.connection_string = connection_string
-        self.conn = None
-    
-    def connect(self):
-        """Establish database connection"""
-        try:
-            self.conn = psycopg2.connect(self.connection_string)
-            logger.info("✅ Connected to database")
-        except Exception as e:
-            logger.error(f"❌ Database connection failed: {str(e)}")
-            raise
-    
-    def disconnect(self):
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
-            logger.info("Database connection closed")
-    
-    def create_document(self, filename: str, file_path: str, file_size: int) -> str:
+class Database(PooledDatabase):
+    """Async, pooled database connection and operations"""
+
+    async def create_document(self, filename: str, file_path: str, file_size: int,
+                              trace_id: Optional[str] = None) -> str:
         """
-        Create a new document record
-        
+        Create a new document record. `trace_id` ties the document's later
+        processing, rule extraction and scans to the trace of its upload.
+
         Returns:
             Document UUID
         """
         try:
-            with self.conn.cursor() as cur:
+            async with self.pool.connection() as conn:
                 document_id = str(uuid.uuid4())
-                cur.execute("""
-                    INSERT INTO documents (document_id, filename, file_path, file_size, status)
-                    VALUES (%s, %s, %s, %s, 'pending')
-                    RETURNING document_id
-                """, (document_id, filename, file_path, file_size))
-                self.conn.commit()
+                await conn.execute("""
+                    INSERT INTO documents (document_id, filename, file_path, file_size, status, trace_id)
+                    VALUES (%s, %s, %s, %s, 'pending', %s)
+                """, (document_id, filename, file_path, file_size, trace_id))
                 logger.info(f"Created document record: {document_id}")
                 return document_id
         except Exception as e:
-            self.conn.rollback()
             logger.error(f"Error creating document: {str(e)}")
             raise
-    
-    def update_document_status(
+
+    async def update_document_status(
         self,
         document_id: str,
         status: str,
@@ -66,118 +45,285 @@ class Database:
     ):
         """Update document status and metadata"""
         try:
-            with self.conn.cursor() as cur:
+            async with self.pool.connection() as conn:
                 if status == "completed":
-                    cur.execute("""
+                    await conn.execute("""
                         UPDATE documents
                         SET status = %s, processed_at = NOW(), metadata = %s
                         WHERE document_id = %s
                     """, (status, Json(metadata) if metadata else None, document_id))
                 elif status == "failed":
-                    cur.execute("""
+                    await conn.execute("""
                         UPDATE documents
                         SET status = %s, error_message = %s
                         WHERE document_id = %s
                     """, (status, error_message, document_id))
                 else:
-                    cur.execute("""
+                    await conn.execute("""
                         UPDATE documents
                         SET status = %s
                         WHERE document_id = %s
                     """, (status, document_id))
-                
-                self.conn.commit()
+
                 logger.info(f"Updated document {document_id} status to {status}")
         except Exception as e:
-            self.conn.rollback()
             logger.error(f"Error updating document status: {str(e)}")
             raise
-    
-    def create_chunk(self, document_id: str, chunk_index: int, content: str):
-        """Create a document chunk record"""
+
+    async def create_chunks(self, document_id: str, chunks: List[Tuple[int, str, Optional[int], List[int]]]):
+        """
+        Create a document's chunk records, as (chunk_index, content, source_page,
+        minhash_bands), in one transaction
+        """
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.executemany("""
+                        INSERT INTO document_chunks (document_id, chunk_index, content, source_page, minhash_bands)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, [(document_id, *chunk) for chunk in chunks])
+        except Exception as e:
+            logger.error(f"Error creating chunks: {str(e)}")
+            raise
+
+    async def replace_chunks(self, document_id: str,
+                             chunks: List[Tuple[int, str, Optional[int], List[int]]]) -> Tuple[int, int]:
+        """
+        Swap a document's chunks for new ones in one transaction. An old chunk whose
+        content reappears is kept (re-indexed) rather than recreated, so its
+        extracted_rules and the duplicate_of links other documents hold to it survive.
+        Returns how many old chunks were removed and how many were kept.
+        """
         try:
-            with self.conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO document_chunks (document_id, chunk_index, content)
-                    VALUES (%s, %s, %s)
-                """, (document_id, chunk_index, content))
-                self.conn.commit()
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("""
+                        SELECT chunk_id, content FROM document_chunks
+                        WHERE document_id = %s ORDER BY chunk_index
+                    """, (document_id,))
+                    old_chunks = {}
+                    for chunk_id, content in await cur.fetchall():
+                        old_chunks.setdefault(content, []).append(chunk_id)
+                    kept, created = [], []
+                    for chunk_index, content, source_page, minhash_bands in chunks:
+                        if old_chunks.get(content):
+                            kept.append((chunk_index, source_page, minhash_bands, old_chunks[content].pop(0)))
+                        else:
+                            created.append((document_id, chunk_index, content, source_page, minhash_bands))
+                    await cur.execute("""
+                        DELETE FROM document_chunks WHERE document_id = %s AND chunk_id <> ALL(%s::uuid[])
+                    """, (document_id, [chunk_id for *_, chunk_id in kept]))
+                    removed = cur.rowcount
+                    await cur.executemany("""
+                        UPDATE document_chunks SET chunk_index = %s, source_page = %s, minhash_bands = %s
+                        WHERE chunk_id = %s
+                    """, kept)
+                    await cur.executemany("""
+                        INSERT INTO document_chunks (document_id, chunk_index, content, source_page, minhash_bands)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, created)
+                    return removed, len(kept)
         except Exception as e:
-            self.conn.rollback()
-            logger.error(f"Error creating chunk: {str(e)}")
+            logger.error(f"Error replacing chunks: {str(e)}")
             raise
-    
-    def get_documents(self, status: Optional[str] = None) -> List[Dict]:
+
+    async def get_duplicate_candidates(self, document_id: str, per_chunk: int = 3) -> List[Dict]:
+        """
+        For each of a document's chunks, up to `per_chunk` chunks of other documents
+        sharing an LSH band with it: already-extracted chunks first, then most bands shared.
+        Rows carry the previous and next chunk of both sides, to check shifted boundaries.
+        """
+        try:
+            async with self.pool.connection() as conn:
+                cur = await conn.execute("""
+                    SELECT c.chunk_id, c.content, o.chunk_id AS candidate_id, o.content AS candidate_content,
+                           o.extracted AS candidate_extracted,
+                           cp.content AS previous_content, cn.content AS next_content,
+                           op.content AS candidate_previous_content, onx.content AS candidate_next_content
+                    FROM document_chunks c
+                    CROSS JOIN LATERAL (
+                        SELECT o.chunk_id, o.document_id, o.chunk_index, o.content,
+                               o.extracted_rules IS NOT NULL AS extracted
+                        FROM document_chunks o
+                        WHERE o.minhash_bands && c.minhash_bands
+                          AND o.document_id <> c.document_id
+                        ORDER BY o.extracted_rules IS NOT NULL DESC,
+                                 cardinality(ARRAY(SELECT unnest(o.minhash_bands)
+                                                   INTERSECT SELECT unnest(c.minhash_bands))) DESC,
+                                 o.created_at
+                        LIMIT %s
+                    ) o
+                    LEFT JOIN document_chunks cp ON cp.document_id = c.document_id AND cp.chunk_index = c.chunk_index - 1
+                    LEFT JOIN document_chunks cn ON cn.document_id = c.document_id AND cn.chunk_index = c.chunk_index + 1
+                    LEFT JOIN document_chunks op ON op.document_id = o.document_id AND op.chunk_index = o.chunk_index - 1
+                    LEFT JOIN document_chunks onx ON onx.document_id = o.document_id AND onx.chunk_index = o.chunk_index + 1
+                    WHERE c.document_id = %s AND cardinality(c.minhash_bands) > 0
+                """, (per_chunk, document_id))
+
+                return await cur.fetchall()
+        except Exception as e:
+            logger.error(f"Error finding duplicate candidates: {str(e)}")
+            return []
+
+    async def set_duplicates(self, document_id: str, duplicates: List[Tuple[str, str, float]]):
+        """Record a document's near-duplicate chunks, as (chunk_id, duplicate_of, similarity)"""
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("""
+                        UPDATE document_chunks SET duplicate_of = NULL, duplicate_similarity = NULL
+                        WHERE document_id = %s AND duplicate_of IS NOT NULL
+                    """, (document_id,))
+                    await cur.executemany("""
+                        UPDATE document_chunks SET duplicate_of = %s, duplicate_similarity = %s
+                        WHERE chunk_id = %s
+                    """, [(duplicate_of, similarity, chunk_id) for chunk_id, duplicate_of, similarity in duplicates])
+        except Exception as e:
+            logger.error(f"Error recording duplicate chunks: {str(e)}")
+            raise
+
+    async def create_pages(self, document_id: str, pages: List[Tuple[int, bool, int, bytes]]):
+        """Store a document's encoded pages, as (page_number, ocr, char_count, content)"""
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.executemany("""
+                        INSERT INTO document_pages (document_id, page_number, ocr, char_count, content)
+                        VALUES (%s, %s, %s, %s, %s)
+                        ON CONFLICT (document_id, page_number) DO UPDATE
+                        SET ocr = EXCLUDED.ocr, char_count = EXCLUDED.char_count, content = EXCLUDED.content
+                    """, [(document_id, *page) for page in pages])
+        except Exception as e:
+            logger.error(f"Error storing pages: {str(e)}")
+            raise
+
+    async def get_pages(self, document_id: str) -> List[Dict]:
+        """A document's stored pages (content still encoded), in page order"""
+        try:
+            async with self.pool.connection() as conn:
+                cur = await conn.execute("""
+                    SELECT page_number, ocr, char_count, content
+                    FROM document_pages
+                    WHERE document_id = %s
+                    ORDER BY page_number
+                """, (document_id,))
+
+                return await cur.fetchall()
+        except Exception as e:
+            logger.error(f"Error getting pages: {str(e)}")
+            return []
+
+    async def get_documents(self, status: Optional[str] = None) -> List[Dict]:
         """Get all documents, optionally filtered by status"""
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            async with self.pool.connection() as conn:
                 if status:
-                    cur.execute("""
-                        SELECT document_id, filename, file_size, uploaded_at, 
+                    cur = await conn.execute("""
+                        SELECT document_id, filename, file_size, uploaded_at,
                                processed_at, status, metadata
                         FROM documents
                         WHERE status = %s
                         ORDER BY uploaded_at DESC
                     """, (status,))
                 else:
-                    cur.execute("""
+                    cur = await conn.execute("""
                         SELECT document_id, filename, file_size, uploaded_at,
                                processed_at, status, metadata
                         FROM documents
                         ORDER BY uploaded_at DESC
                     """)
-                
-                return [dict(row) for row in cur.fetchall()]
+
+                return await cur.fetchall()
         except Exception as e:
             logger.error(f"Error getting documents: {str(e)}")
             return []
-    
-    def get_document(self, document_id: str) -> Optional[Dict]:
+
+    async def get_document(self, document_id: str) -> Optional[Dict]:
         """Get a single document by ID"""
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
+            async with self.pool.connection() as conn:
+                cur = await conn.execute("""
                     SELECT *
                     FROM documents
                     WHERE document_id = %s
                 """, (document_id,))
-                
-                row = cur.fetchone()
-                return dict(row) if row else None
+
+                return await cur.fetchone()
         except Exception as e:
             logger.error(f"Error getting document: {str(e)}")
             return None
-    
-    def get_document_by_filename(self, filename: str) -> Optional[Dict]:
+
+    async def get_document_by_filename(self, filename: str) -> Optional[Dict]:
         """Get document by filename"""
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
+            async with self.pool.connection() as conn:
+                cur = await conn.execute("""
                     SELECT *
                     FROM documents
                     WHERE filename = %s
                     ORDER BY uploaded_at DESC
                     LIMIT 1
                 """, (filename,))
-                
-                row = cur.fetchone()
-                return dict(row) if row else None
+
+                return await cur.fetchone()
         except Exception as e:
             logger.error(f"Error getting document by filename: {str(e)}")
             return None
-    
-    def get_chunks(self, document_id: str) -> List[Dict]:
+
+    async def get_chunks(self, document_id: str) -> List[Dict]:
         """Get all chunks for a document"""
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT chunk_id, chunk_index, content, created_at
+            async with self.pool.connection() as conn:
+                cur = await conn.execute("""
+                    SELECT chunk_id, chunk_index, content, source_page, duplicate_of,
+                           duplicate_similarity, created_at
                     FROM document_chunks
                     WHERE document_id = %s
                     ORDER BY chunk_index
                 """, (document_id,))
-                
-                return [dict(row) for row in cur.fetchall()]
+
+                return await cur.fetchall()
         except Exception as e:
             logger.error(f"Error getting chunks: {str(e)}")
             return []
+
+    async def search_chunks(self, query: str, document_id: Optional[str] = None, limit: int = 20,
+                            after: Optional[Tuple[float, str]] = None) -> List[Dict]:
+        """
+        Chunks matching a web-search style query (quoted phrases, OR, -term),
+        best first by ts_rank_cd, with highlighted snippets. `after` is the
+        (rank, chunk_id) of the last result of the previous page.
+        """
+        conditions = ["c.content_tsv @@ q.query"]
+        params: List[Any] = [query]
+        if document_id:
+            conditions.append("c.document_id = %s")
+            params.append(document_id)
+        if after:
+            conditions.append("(ts_rank_cd(c.content_tsv, q.query), c.chunk_id) < (%s::real, %s::uuid)")
+            params.extend(after)
+        params.append(limit)
+
+        # Rank every match through the GIN index, but only build snippets for the page returned
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(f"""
+                WITH q AS (SELECT websearch_to_tsquery('english', %s) AS query),
+                page AS (
+                    SELECT c.chunk_id, c.document_id, c.chunk_index, c.source_page, c.content,
+                           ts_rank_cd(c.content_tsv, q.query) AS rank
+                    FROM document_chunks c, q
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY rank DESC, c.chunk_id DESC
+                    LIMIT %s
+                )
+                SELECT page.chunk_id, page.document_id, d.filename, page.chunk_index, page.source_page,
+                       page.rank,
+                       ts_headline('english', page.content, q.query,
+                                   'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10')
+                           AS snippet
+                FROM page
+                CROSS JOIN q
+                JOIN documents d ON d.document_id = page.document_id
+                ORDER BY page.rank DESC, page.chunk_id DESC
+            """, params)
+            return await cur.fetchall()
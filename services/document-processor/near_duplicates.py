@@ -0,0 +1,127 @@
+"""
+Near-duplicate detection for document chunks (MinHash with LSH banding).
+
+Each chunk's word shingles are summarised by a MinHash signature, which is
+cut into bands; chunks whose signatures agree on a whole band become
+candidates. Band hashes are stored in `document_chunks.minhash_bands` (GIN
+indexed), so finding candidates for a new document is one array-overlap
+query instead of a comparison against every stored chunk. Candidates are then
+confirmed only if the two texts differ by words at their edges that moved
+into a neighbouring chunk (a shifted chunk boundary), never by an edit inside
+or by text added or removed at an edge.
+
+A confirmed chunk records the earlier chunk as `duplicate_of`, and rule
+extraction reuses that chunk's rules instead of calling the model again, so a
+revised policy only sends its changed text to the LLM.
+"""
+
+import hashlib
+import random
+import re
+from difflib import SequenceMatcher
+from typing import List, Optional, Set, Tuple
+
+from service_core.config import env_float
+
+# Changing any of these invalidates stored band hashes
+SHINGLE_SIZE = 5
+# 16 bands of 8 rows: chunks become candidates from about 0.7 similarity up
+NUM_PERMUTATIONS = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+# Minimum share of a chunk's words a candidate must repeat verbatim (see near_duplicate_similarity)
+NEAR_DUPLICATE_THRESHOLD = env_float("NEAR_DUPLICATE_THRESHOLD", 0.9)
+
+_PRIME = (1 << 61) - 1
+# Fixed seed: signatures must stay comparable across processes and releases
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Overlapping runs of `size` lower-cased words (the whole text if shorter)"""
+    words = WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def signature(shingle_set: Set[str]) -> List[int]:
+    """MinHash signature: per permutation, the minimum permuted shingle hash"""
+    hashes = [_hash(shingle) for shingle in shingle_set]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def minhash_bands(text: str) -> List[int]:
+    """LSH band hashes (signed 64-bit, for a BIGINT[] column); empty for text without words"""
+    shingle_set = shingles(text)
+    if not shingle_set:
+        return []
+    values = signature(shingle_set)
+    bands = []
+    for band in range(BANDS):
+        rows = values[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(f"{band}:{','.join(map(str, rows))}".encode(), digest_size=8).digest()
+        bands.append(int.from_bytes(digest, "big", signed=True))
+    return bands
+
+
+def _words(text: Optional[str]) -> List[str]:
+    return WORD.findall((text or "").lower())
+
+
+def _found_in(words: List[str], neighbour: List[str]) -> bool:
+    """Whether `words` occur in `neighbour` as a run (edge words cut mid-word still match)"""
+    return bool(neighbour) and " ".join(words) in " ".join(neighbour)
+
+
+def near_duplicate_similarity(text: str, candidate: str,
+                              context: Tuple[Optional[str], Optional[str]] = (None, None),
+                              candidate_context: Tuple[Optional[str], Optional[str]] = (None, None),
+                              threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Optional[float]:
+    """
+    Share of the longer chunk's words the two chunks have in one unbroken run,
+    if they are near-duplicates, else None. `context` and `candidate_context`
+    are the (previous, next) chunks of the same document as each chunk.
+
+    Near-duplicates exist to absorb chunk boundaries that moved when text was
+    added or removed elsewhere in a revision, so the chunks may differ only at
+    their edges, and only by words that moved across the boundary: words one
+    chunk has beyond the shared run must be in the other chunk's neighbour on
+    that side. Anything else (an interior edit, or a sentence added or removed
+    at the edge) can change the rule, so the chunk goes to the model; without
+    neighbours only an exact match is confirmed.
+    """
+    words, candidate_words = _words(text), _words(candidate)
+    if not words or not candidate_words:
+        return None
+    if words == candidate_words:
+        return 1.0
+    match = SequenceMatcher(None, words, candidate_words, autojunk=False).find_longest_match(
+        0, len(words), 0, len(candidate_words))
+    previous, following = (_words(chunk) for chunk in context)
+    candidate_previous, candidate_following = (_words(chunk) for chunk in candidate_context)
+
+    # Each edge may be trimmed in one chunk or the other, not differ in both
+    if match.a and match.b:
+        return None
+    if match.a and not _found_in(words[:match.a], candidate_previous):
+        return None
+    if match.b and not _found_in(candidate_words[:match.b], previous):
+        return None
+    extra, candidate_extra = words[match.a + match.size:], candidate_words[match.b + match.size:]
+    if extra and candidate_extra:
+        return None
+    if extra and not _found_in(extra, candidate_following):
+        return None
+    if candidate_extra and not _found_in(candidate_extra, following):
+        return None
+
+    similarity = match.size / max(len(words), len(candidate_words))
+    return similarity if similarity >= threshold else None
@@ -0,0 +1,56 @@
+"""
+Compact storage of extracted page text.
+
+Each page's text and block layout is stored in `document_pages` as
+zlib-compressed JSON, so documents can be re-chunked (with a new chunk size
+or a fixed chunker) without re-opening, re-parsing or re-OCRing the PDF.
+"""
+
+import bisect
+import json
+import zlib
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Separator between pages when a document's text is chunked as a whole
+PAGE_SEPARATOR = "\n\n"
+
+# Page layouts are small and text-heavy; level 6 is zlib's usual size/speed trade-off
+COMPRESSION_LEVEL = 6
+
+
+def encode_page(page: Dict[str, Any]) -> bytes:
+    """Compress a processed page's text and blocks ([x0, y0, x1, y1, text], ...)"""
+    document = {"text": page["text"], "blocks": page.get("blocks", [])}
+    return zlib.compress(json.dumps(document, separators=(",", ":")).encode(), COMPRESSION_LEVEL)
+
+
+def decode_page(content: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(content))
+
+
+def encode_pages(pages: Sequence[Dict[str, Any]]) -> List[Tuple[int, bool, int, bytes]]:
+    """(page_number, ocr, char_count, content) rows for document_pages"""
+    return [
+        (page["page_number"], page.get("ocr", False), page["char_count"], encode_page(page))
+        for page in pages
+    ]
+
+
+def join_pages(pages: Sequence[Dict[str, Any]]) -> Tuple[str, List[int], List[int]]:
+    """
+    A document's text as chunked, plus the offset at which each page starts
+    and the page numbers, for mapping chunk offsets back to pages.
+    """
+    starts, numbers, parts = [], [], []
+    offset = 0
+    for page in pages:
+        starts.append(offset)
+        numbers.append(page["page_number"])
+        parts.append(page["text"])
+        offset += len(page["text"]) + len(PAGE_SEPARATOR)
+    return PAGE_SEPARATOR.join(parts), starts, numbers
+
+
+def page_at(offset: int, starts: List[int], numbers: List[int]) -> int:
+    """Number of the page containing a character offset of the joined text"""
+    return numbers[max(0, bisect.bisect_right(starts, offset) - 1)]
@@ -6,13 +6,14 @@ Handles PDF parsing, OCR, and text chunking for the compliance platform
 import os
 import logging
 from pathlib import Path
-from typing import List, Dict, Any
-import fitz  # PyMuPDF
-import pytesseract
-from PIL import Image
+from typing import List, Dict, Any, Tuple
 import io
 import hashlib
 from datetime import datetime
+from prometheus_client import Counter, Histogram
+from near_duplicates import minhash_bands
+from page_store import join_pages, page_at
+from service_core.tracing import current_span, traced
 
 # Configure logging
 logging.basicConfig(
@@ -21,6 +22,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Pages/s and the OCR share are rate()s of these counters
+PAGES_PROCESSED = Counter("document_processor_pages_processed_total", "PDF pages whose text was extracted")
+OCR_FALLBACKS = Counter("document_processor_ocr_fallbacks_total", "Pages without a text layer that fell back to OCR")
+OCR_FAILURES = Counter("document_processor_ocr_failures_total", "OCR attempts that raised an error")
+PDF_SECONDS = Histogram("document_processor_pdf_seconds", "Time to extract the text of one PDF",
+                        buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+
+
+def load_pdf_libraries():
+    """
+    Import PyMuPDF, pytesseract and Pillow. They are slow to import, so this
+    runs on first use (or warm-up) rather than at service start.
+    """
+    import fitz  # PyMuPDF
+    import pytesseract
+    from PIL import Image
+    return fitz, pytesseract, Image
+
 
 class DocumentProcessor:
     """Processes PDF documents and extracts text content"""
@@ -30,6 +49,8 @@ class DocumentProcessor:
         self.documents_dir.mkdir(parents=True, exist_ok=True)
         logger.info(f"Document processor initialized. Watching: {self.documents_dir}")
     
+    @traced("pdf.process")
+    @PDF_SECONDS.time()
     def process_pdf(self, file_path: Path) -> Dict[str, Any]:
         """
         Process a PDF file and extract text content
@@ -41,9 +62,12 @@ class DocumentProcessor:
             Dictionary containing extracted text and metadata
         """
         logger.info(f"Processing PDF: {file_path.name}")
+        pdf_span = current_span()
+        pdf_span.set_attribute("pdf.file", file_path.name)
         
         try:
             # Open PDF
+            fitz, _, _ = load_pdf_libraries()
             doc = fitz.open(file_path)
             
             # Extract metadata
@@ -61,24 +85,38 @@ class DocumentProcessor:
             
             # Extract text from each page
             pages = []
+            ocr_pages = 0
             for page_num in range(len(doc)):
                 page = doc[page_num]
                 
                 # Try text extraction first
                 text = page.get_text()
+                ocr = not text.strip()
                 
                 # If no text found, try OCR
-                if not text.strip():
+                if ocr:
                     logger.info(f"Page {page_num + 1}: No text found, attempting OCR...")
                     text = self._ocr_page(page)
+                    ocr_pages += 1
+                    OCR_FALLBACKS.inc()
                 
                 pages.append({
                     "page_number": page_num + 1,
                     "text": text,
-                    "char_count": len(text)
+                    "char_count": len(text),
+                    "ocr": ocr,
+                    # Text block layout ([x0, y0, x1, y1, text]); OCR pages have none
+                    "blocks": [] if ocr else [
+                        [round(x0, 1), round(y0, 1), round(x1, 1), round(y1, 1), block_text]
+                        for x0, y0, x1, y1, block_text, _, block_type in page.get_text("blocks")
+                        if block_type == 0
+                    ]
                 })
             
             doc.close()
+            PAGES_PROCESSED.inc(len(pages))
+            pdf_span.set_attribute("pdf.pages", len(pages))
+            pdf_span.set_attribute("pdf.ocr_pages", ocr_pages)
             
             # Calculate document hash
             doc_hash = self._calculate_hash(file_path)
@@ -103,6 +141,7 @@ class DocumentProcessor:
                 "error": str(e)
             }
     
+    @traced("pdf.ocr_page")
     def _ocr_page(self, page) -> str:
         """
         Perform OCR on a PDF page
@@ -115,6 +154,7 @@ class DocumentProcessor:
         """
         try:
             # Render page to image
+            fitz, pytesseract, Image = load_pdf_libraries()
             pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom for better OCR
             img_data = pix.tobytes("png")
             img = Image.open(io.BytesIO(img_data))
@@ -125,24 +165,12 @@ class DocumentProcessor:
             
         except Exception as e:
             logger.error(f"OCR failed: {str(e)}")
+            OCR_FAILURES.inc()
             return ""
     
-    def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-        """
-        Split text into overlapping chunks for better context preservation
-        
-        Args:
-            text: Input text to chunk
-            chunk_size: Target size of each chunk in characters
-            overlap: Number of overlapping characters between chunks
-            
-        Returns:
-            List of text chunks
-        """
-        if not text:
-            return []
-        
-        chunks = []
+    def _chunk_spans(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[Tuple[int, int]]:
+        """(start, end) offsets of overlapping chunks, ending at sentence boundaries where possible"""
+        spans = []
         start = 0
         text_length = len(text)
         
@@ -162,14 +190,62 @@ class DocumentProcessor:
                         end = start + last_delim + len(delimiter)
                         break
             
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
+            spans.append((start, end))
             
-            # Move start position with overlap
-            start = end - overlap if end < text_length else text_length
+            # Move start position with overlap, always forward (an early sentence break
+            # or overlap >= chunk_size would otherwise repeat the same chunk forever)
+            start = max(end - overlap, start + 1) if end < text_length else text_length
         
-        logger.info(f"Created {len(chunks)} chunks from {text_length} characters")
+        return spans
+
+    @traced("pdf.chunk")
+    def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+        """
+        Split text into overlapping chunks for better context preservation
+        
+        Args:
+            text: Input text to chunk
+            chunk_size: Target size of each chunk in characters
+            overlap: Number of overlapping characters between chunks
+            
+        Returns:
+            List of text chunks
+        """
+        if not text:
+            return []
+        
+        chunks = [text[start:end].strip() for start, end in self._chunk_spans(text, chunk_size, overlap)]
+        chunks = [chunk for chunk in chunks if chunk]
+        
+        logger.info(f"Created {len(chunks)} chunks from {len(text)} characters")
+        return chunks
+
+    @traced("pdf.chunk")
+    def chunk_pages(self, pages: List[Dict[str, Any]], chunk_size: int = 500,
+                    overlap: int = 50) -> List[Dict[str, Any]]:
+        """
+        Chunk a document's pages (as from process_pdf or the page store) as one
+        text, recording the page each chunk starts on as `source_page` and its
+        MinHash LSH bands for near-duplicate detection.
+        """
+        text, starts, numbers = join_pages(pages)
+        chunks = []
+        for start, end in self._chunk_spans(text, chunk_size, overlap):
+            raw = text[start:end]
+            content = raw.strip()
+            if not content:
+                continue
+            # The page the chunk's first non-blank character is on
+            first = start + len(raw) - len(raw.lstrip())
+            chunks.append({
+                "chunk_index": len(chunks),
+                "content": content,
+                "char_count": len(content),
+                "source_page": page_at(first, starts, numbers),
+                "minhash_bands": minhash_bands(content)
+            })
+        
+        logger.info(f"Created {len(chunks)} chunks from {len(text)} characters")
         return chunks
     
     def process_and_chunk(self, file_path: Path, chunk_size: int = 500) -> Dict[str, Any]:
@@ -189,21 +265,9 @@ class DocumentProcessor:
         if result["status"] != "success":
             return result
         
-        # Combine all page text
-        full_text = "\n\n".join(page["text"] for page in result["pages"])
-        
-        # Create chunks
-        chunks = self.chunk_text(full_text, chunk_size=chunk_size)
-        
-        result["chunks"] = [
-            {
-                "chunk_index": i,
-                "content": chunk,
-                "char_count": len(chunk)
-            }
-            for i, chunk in enumerate(chunks)
-        ]
-        result["total_chunks"] = len(chunks)
+        # Chunk all page text, keeping each chunk's pages
+        result["chunks"] = self.chunk_pages(result["pages"], chunk_size=chunk_size)
+        result["total_chunks"] = len(result["chunks"])
         
         return result
     
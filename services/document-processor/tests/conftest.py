@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# Service modules are imported by bare name, as in the container
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(SERVICE_DIR), str(SERVICE_DIR.parent / "common")]
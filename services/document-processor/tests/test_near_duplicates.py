@@ -0,0 +1,47 @@
+from near_duplicates import near_duplicate_similarity
+
+PREVIOUS = "Scope. This policy applies to all employees and systems that store customer records."
+CHUNK = (
+    "All employees must complete annual security awareness training before the end of each calendar year. "
+    "Managers must review access rights for their teams every quarter and revoke access that is no longer needed. "
+    "Customer records must be encrypted at rest and in transit using approved algorithms. "
+    "Incidents must be reported to the security team within twenty four hours of discovery. "
+    "Backups are retained for seven years."
+)
+NEXT = "Exceptions. Exceptions to this policy must be approved in writing by the security officer."
+
+
+def test_identical_chunks_match():
+    assert near_duplicate_similarity(CHUNK, CHUNK) == 1.0
+
+
+def test_deleted_edge_sentence_is_not_a_duplicate():
+    revised = CHUNK.replace(" Backups are retained for seven years.", "")
+    assert near_duplicate_similarity(revised, CHUNK, context=(PREVIOUS, NEXT),
+                                     candidate_context=(PREVIOUS, NEXT)) is None
+
+
+def test_appended_edge_sentence_is_not_a_duplicate():
+    revised = CHUNK + " Contractors are exempt from training."
+    assert near_duplicate_similarity(revised, CHUNK, context=(PREVIOUS, NEXT),
+                                     candidate_context=(PREVIOUS, NEXT)) is None
+
+
+def test_interior_edit_is_not_a_duplicate():
+    revised = CHUNK.replace("must complete", "must not complete")
+    assert near_duplicate_similarity(revised, CHUNK, context=(PREVIOUS, NEXT),
+                                     candidate_context=(PREVIOUS, NEXT)) is None
+
+
+def test_shifted_boundary_is_a_duplicate():
+    # The revision moved the boundary: the last sentence now opens the next chunk,
+    # and this chunk takes the end of the previous one
+    moved, kept = "Backups are retained for seven years.", CHUNK.replace(" Backups are retained for seven years.", "")
+    revised = "store customer records. " + kept
+    similarity = near_duplicate_similarity(revised, CHUNK, context=(PREVIOUS, moved + " " + NEXT),
+                                           candidate_context=(PREVIOUS, NEXT))
+    assert similarity is not None and similarity >= 0.9
+
+
+def test_edge_change_without_neighbours_needs_an_exact_match():
+    assert near_duplicate_similarity(CHUNK.replace(" Backups are retained for seven years.", ""), CHUNK) is None
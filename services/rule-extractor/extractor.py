@@ -1,21 +1,70 @@
-import spacy
-import ollama
 import json
 import logging
-from typing import Dict, Any, List
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from prometheus_client import Counter, Histogram
+from service_core.config import env_float
+from service_core.tracing import current_span, span, traced
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Cascade mode: every chunk goes to the small model; chunks it answers with malformed
+# JSON, conflicting rules or a rule below CASCADE_MIN_CONFIDENCE are re-extracted by
+# CASCADE_MODEL (unset disables the cascade)
+EXTRACTION_MODEL = os.getenv("EXTRACTION_MODEL", "llama3.2:3b")
+CASCADE_MODEL = os.getenv("CASCADE_MODEL") or None
+CASCADE_MIN_CONFIDENCE = env_float("CASCADE_MIN_CONFIDENCE", 0.7)
+
+LLM_SECONDS = Histogram("rule_extractor_llm_request_seconds", "Latency of one LLM extraction call", ["model"],
+                        buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300))
+LLM_TOKENS = Counter("rule_extractor_llm_tokens_total", "Tokens processed by the LLM", ["model", "kind"])
+LLM_TOKENS_PER_SECOND = Histogram("rule_extractor_llm_tokens_per_second", "Generation speed of one LLM call",
+                                  ["model"], buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 200))
+LLM_ERRORS = Counter("rule_extractor_llm_errors_total", "LLM calls that raised an error", ["model"])
+JSON_PARSE_FAILURES = Counter("rule_extractor_json_parse_failures_total",
+                              "LLM responses that were not a JSON rule or array of rules")
+CASCADE_CHUNKS = Counter("rule_extractor_cascade_chunks_total",
+                         "Chunks by cascade route (small, escalated, escalation_failed) and escalation reason",
+                         ["route", "reason"])
+
 class RuleExtractor:
-    def __init__(self, model_name: str = "llama3.2:3b"):
-        # Load spaCy model for entity extraction
-        logger.info("Initializing spaCy...")
-        self.nlp = spacy.load("en_core_web_sm")
+    def __init__(self, model_name: str = EXTRACTION_MODEL, cascade_model: Optional[str] = CASCADE_MODEL,
+                 min_confidence: float = CASCADE_MIN_CONFIDENCE):
+        # spaCy (and its model) load on first use or warm_up(), not at import
+        self._nlp = None
+        self._nlp_lock = threading.Lock()
         self.model_name = model_name
-        logger.info(f"Using Ollama model: {self.model_name}")
+        self.cascade_model = cascade_model if cascade_model != model_name else None
+        self.min_confidence = min_confidence
+        self._routes: Dict[str, int] = {}
+        self._reasons: Dict[str, int] = {}
+        self._routes_lock = threading.Lock()
+        if self.cascade_model:
+            logger.info(f"Using Ollama model cascade: {self.model_name} -> {self.cascade_model} "
+                        f"(below confidence {self.min_confidence})")
+        else:
+            logger.info(f"Using Ollama model: {self.model_name}")
+
+    @property
+    def nlp(self):
+        """spaCy pipeline for entity extraction, loaded once"""
+        if self._nlp is None:
+            with self._nlp_lock:
+                if self._nlp is None:
+                    import spacy
+                    logger.info("Initializing spaCy...")
+                    self._nlp = spacy.load("en_core_web_sm")
+        return self._nlp
 
+    def warm_up(self):
+        """Load the spaCy model ahead of the first extraction"""
+        return self.nlp
+
+    @traced("extract.entities")
     def extract_entities(self, text: str) -> Dict[str, Any]:
         """
         Extract relevant entities using spaCy (NER).
@@ -41,9 +90,12 @@ class RuleExtractor:
                 
         return entities
 
+    @traced("extract.rule")
     def extract_rule(self, text: str, document_id: str) -> Dict[str, Any]:
         """
         Main logic: Combine spaCy entities with LLM reasoning.
+        In cascade mode the small model's answer is escalated to `cascade_model`
+        when it is unusable, conflicting or not confident enough.
         """
         # 1. Get entities from spaCy
         entities = self.extract_entities(text)
@@ -60,7 +112,7 @@ class RuleExtractor:
         [
             {{
                 "rule_name": "Short descriptive name",
-                "rule_type": "threshold|date_difference|not_null|pattern|role_based",
+                "rule_type": "threshold|date_difference|not_null|pattern|role_based|cross_table",
                 "description": "Clear explanation of the rule",
                 "parameters": {{
                     "table": "table_name",
@@ -77,17 +129,56 @@ class RuleExtractor:
         - Return an array even if there's only one rule: [{{...}}]
         - If no rules exist, return an empty array: []
         - Always include "table" and "column" in parameters
+        - For role_based and cross_table rules also include "ref_table" and "ref_column" (the referenced table and its key)
+        - For role_based rules also include "allowed_roles" (an array of role names) and "role_column" (the role column of ref_table)
         """
 
+        # 3. Call Ollama (Local API), escalating to the larger model if needed
+        rule_data, status = self._generate(self.model_name, prompt)
+        if self.cascade_model:
+            reason = status if status != "ok" else self._escalation_reason(rule_data)
+            if reason:
+                current_span().set_attribute("cascade.escalated", reason)
+                escalated, escalated_status = self._generate(self.cascade_model, prompt)
+                if escalated_status == "ok":
+                    rule_data, status = escalated, escalated_status
+                    self._route("escalated", reason)
+                else:
+                    # The large model failed as well: keep the small model's answer
+                    self._route("escalation_failed", reason)
+            else:
+                self._route("small", "none")
+
+        if status == "error":
+            return None
+        if status == "malformed":
+            return []
+
+        # Add metadata to each rule
+        for rule in rule_data:
+            if rule:
+                rule["source_document"] = document_id
+        
+        return rule_data
+
+    def _generate(self, model: str, prompt: str) -> Tuple[List[Any], str]:
+        """One model's rules for the prompt, with a status: ok, malformed (unparseable) or error"""
         try:
-            # 3. Call Ollama (Local API)
-            logger.info("Generating with Ollama...")
-            response = ollama.chat(model=self.model_name, messages=[
-                {
-                    'role': 'user',
-                    'content': prompt,
-                },
-            ])
+            logger.info(f"Generating with Ollama ({model})...")
+            import ollama
+            started = time.perf_counter()
+            with span("llm.chat", model=model, prompt_chars=len(prompt)):
+                try:
+                    response = ollama.chat(model=model, messages=[
+                        {
+                            'role': 'user',
+                            'content': prompt,
+                        },
+                    ])
+                except Exception:
+                    LLM_ERRORS.labels(model).inc()
+                    raise
+            self._observe_llm_call(model, response, time.perf_counter() - started)
             
             # 4. Parse JSON response
             content = response['message']['content']
@@ -111,25 +202,76 @@ class RuleExtractor:
                 rule_data = json.loads(content)
             except json.JSONDecodeError as je:
                 logger.error(f"JSON Decode Error: {je}. Raw content: {content}")
-                return []
+                JSON_PARSE_FAILURES.inc()
+                return [], "malformed"
             
             # Normalize to array
             if isinstance(rule_data, dict):
                 rule_data = [rule_data]
             elif not isinstance(rule_data, list):
                 logger.warning("Model returned unexpected format.")
-                return []
+                JSON_PARSE_FAILURES.inc()
+                return [], "malformed"
 
-            # Add metadata to each rule
-            for rule in rule_data:
-                if rule:
-                    rule["source_document"] = document_id
-            
-            return rule_data
+            return rule_data, "ok"
             
         except Exception as e:
             logger.error(f"Error extracting rule: {str(e)}")
-            return None
+            return [], "error"
+
+    def _escalation_reason(self, rules: List[Any]) -> Optional[str]:
+        """Why the small model's parsed rules need the larger model, or None if they can stand"""
+        seen: Dict[Tuple[Any, ...], Any] = {}
+        for rule in rules:
+            if not isinstance(rule, dict):
+                return "malformed"
+            try:
+                confidence = float(rule.get("confidence_score", 0))
+            except (TypeError, ValueError):
+                return "malformed"
+            if confidence < self.min_confidence:
+                return "low_confidence"
+            # Two rules for the same check on the same column that disagree on its parameters
+            parameters = rule.get("parameters") if isinstance(rule.get("parameters"), dict) else {}
+            key = (rule.get("rule_type"), parameters.get("table"), parameters.get("column"))
+            if key in seen and seen[key] != parameters:
+                return "conflicting_rules"
+            seen[key] = parameters
+        return None
+
+    def _route(self, route: str, reason: str):
+        CASCADE_CHUNKS.labels(route, reason).inc()
+        with self._routes_lock:
+            self._routes[route] = self._routes.get(route, 0) + 1
+            if reason != "none":
+                self._reasons[reason] = self._reasons.get(reason, 0) + 1
+
+    def cascade_stats(self) -> Dict[str, Any]:
+        """Chunks answered by the small model vs escalated (and why), since start"""
+        with self._routes_lock:
+            routes, reasons = dict(self._routes), dict(self._reasons)
+        total = sum(routes.values())
+        return {
+            "enabled": bool(self.cascade_model),
+            "model": self.model_name,
+            "cascade_model": self.cascade_model,
+            "min_confidence": self.min_confidence,
+            "chunks": total,
+            "routes": routes,
+            "escalation_reasons": reasons,
+            "escalation_rate": round((total - routes.get("small", 0)) / total, 4) if total else None,
+        }
+
+    def _observe_llm_call(self, model: str, response: Dict[str, Any], seconds: float):
+        """Record latency and token counts (Ollama reports eval_duration in nanoseconds)"""
+        LLM_SECONDS.labels(model).observe(seconds)
+        prompt_tokens = response.get("prompt_eval_count") or 0
+        completion_tokens = response.get("eval_count") or 0
+        LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+        eval_seconds = (response.get("eval_duration") or 0) / 1e9
+        if completion_tokens and eval_seconds:
+            LLM_TOKENS_PER_SECOND.labels(model).observe(completion_tokens / eval_seconds)
 
 if __name__ == "__main__":
     # Test locally
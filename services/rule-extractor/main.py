@@ -1,15 +1,31 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import sys
+from pathlib import Path
+
+# Shared service core (services/common; also on PYTHONPATH in the container)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "common"))
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
 import logging
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Tuple
 from extractor import RuleExtractor
-import psycopg2
-import os
-import json
+from service_core.admission import AdmissionController, client_id
+from service_core.config import env_int
+from service_core.db import Database
+from service_core.events import PIPELINE_EVENTS, EventListener
+from service_core.metrics import metrics_response, register_pool
+from service_core.telemetry import setup_logging
+from service_core.tracing import TraceMiddleware, current_trace_id, setup_tracing, span
+from service_core.warmup import WarmUp
+from prometheus_client import Counter
+from psycopg.types.json import Jsonb
 
 # Setup logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
+setup_tracing("rule-extractor")
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI
@@ -22,128 +38,370 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["traceparent"],
 )
+app.add_middleware(TraceMiddleware)
 
-# Initialize Extractor
+# Initialize Extractor (the spaCy model loads during warm-up, after startup)
 extractor = RuleExtractor()
+warmup = WarmUp()
+warmup.add("spacy", extractor.warm_up)
+
+# Hit rate of rule reuse: rate(...{source="reused"}) / rate(...) over both sources
+CHUNKS_EXTRACTED = Counter("rule_extractor_chunks_total",
+                           "Chunks handled by extraction, by where their rules came from (reused, model)",
+                           ["source"])
+
+# A claim on a document not renewed for this long (its extractor died) may be taken over;
+# the claim is renewed before every model call
+EXTRACTION_LEASE_SECONDS = env_int("EXTRACTION_LEASE_SECONDS", 600)
+
+# Rules per INSERT statement when ingesting in bulk
+RULE_INGEST_BATCH_SIZE = env_int("RULE_INGEST_BATCH_SIZE", 1000)
+
+# Mirrors the compliance_rules.rule_type CHECK constraint
+RULE_TYPES = {"threshold", "date_difference", "role_based", "not_null", "pattern", "cross_table", "custom"}
+
+db = Database()
+register_pool(db)
+
+# Each extraction holds the model for minutes, so far fewer run at once than
+# the shared default allows; beyond this /extract answers 429 with Retry-After
+admission = AdmissionController(
+    "extraction",
+    max_in_flight=env_int("ADMISSION_MAX_IN_FLIGHT", 8),
+    client_limit=env_int("ADMISSION_CLIENT_LIMIT", 2)
+)
+
+@app.on_event("startup")
+async def startup_event():
+    await db.connect()
+    warmup.start()
+    if PIPELINE_EVENTS:
+        document_events.start()
+        # Documents completed while the service was down were not heard
+        document_events.put({"catch_up": True})
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if PIPELINE_EVENTS:
+        await document_events.stop()
+    await db.disconnect()
+
+def validate_rule(rule: Any) -> Optional[str]:
+    """Reason a rule would fail the compliance_rules constraints, or None"""
+    if not isinstance(rule, dict):
+        return "rule must be an object"
+    if rule.get("rule_type", "custom") not in RULE_TYPES:
+        return f"unknown rule_type: {rule.get('rule_type')}"
+    params = rule.get("parameters", {})
+    if not isinstance(params, dict):
+        return "parameters must be an object"
+    rule_type = rule.get("rule_type")
+    if rule_type in ("role_based", "cross_table"):
+        if not params.get("ref_table"):
+            return f"{rule_type} rules need parameters.ref_table"
+        if not params.get("join_keys") and not (params.get("column") and params.get("ref_column")):
+            return f"{rule_type} rules need parameters.column and parameters.ref_column (or join_keys)"
+    if rule_type == "role_based":
+        roles = params.get("allowed_roles")
+        if not isinstance(roles, list) or not roles:
+            return "role_based rules need parameters.allowed_roles (a non-empty list)"
+    try:
+        confidence = float(rule.get("confidence_score", 0.5))
+    except (TypeError, ValueError):
+        return "confidence_score must be a number"
+    if not 0 <= confidence <= 1:
+        return "confidence_score must be between 0 and 1"
+    return None
 
-# Database Connection (from env)
-DB_HOST = os.getenv("DB_HOST", "postgres")
-DB_NAME = os.getenv("DB_NAME", "compliance")
-DB_USER = os.getenv("DB_USER", "admin")
-DB_PASS = os.getenv("DB_PASS", "admin123")
-DB_PORT = os.getenv("DB_PORT", "5432")
-
-def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS,
-        port=DB_PORT
-    )
+async def insert_rules(conn, rules: List[Dict[str, Any]], document_id: Optional[str] = None) -> List[Tuple[Any, str]]:
+    """
+    Insert rules as pending, RULE_INGEST_BATCH_SIZE per INSERT ... SELECT statement.
+    The statement-level audit trigger logs each batch in one set-based write.
+    Rules carry the current trace id, so their scans join the same trace.
+    Returns (rule_id, rule_name) per inserted rule.
+    """
+    inserted = []
+    for start in range(0, len(rules), RULE_INGEST_BATCH_SIZE):
+        batch = [
+            {
+                "rule_name": rule.get("rule_name", "Unknown Rule"),
+                "rule_type": rule.get("rule_type", "custom"),
+                "description": rule.get("description", ""),
+                "parameters": rule.get("parameters", {}),
+                "confidence_score": rule.get("confidence_score", 0.5),
+                "source_document": document_id or rule.get("source_document"),
+                "source_page": rule.get("source_page"),
+                "trace_id": current_trace_id()
+            }
+            for rule in rules[start:start + RULE_INGEST_BATCH_SIZE]
+        ]
+        cur = await conn.execute("""
+            INSERT INTO compliance_rules (
+                rule_name, rule_type, description, parameters,
+                confidence_score, source_document, source_page, status, trace_id
+            )
+            SELECT r.rule_name, r.rule_type, r.description, r.parameters,
+                   r.confidence_score, r.source_document, r.source_page, 'pending', r.trace_id
+            FROM jsonb_to_recordset(%s) AS r(
+                rule_name TEXT, rule_type TEXT, description TEXT, parameters JSONB,
+                confidence_score NUMERIC, source_document TEXT, source_page INTEGER, trace_id TEXT
+            )
+            RETURNING rule_id, rule_name
+        """, (Jsonb(batch),))
+        inserted.extend((row["rule_id"], row["rule_name"]) for row in await cur.fetchall())
+    return inserted
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "service": "rule-extractor"}
+    return {"status": "ok", "service": "rule-extractor", "ready": warmup.ready, "load": admission.load()}
+
+@app.get("/ready")
+def readiness_check():
+    """200 once the spaCy model is loaded, 503 before"""
+    return JSONResponse(warmup.to_dict(), status_code=200 if warmup.ready else 503)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics"""
+    return metrics_response()
+
+@app.get("/cascade/stats")
+def cascade_stats():
+    """How many chunks the small model answered and how many were escalated (and why)"""
+    return extractor.cascade_stats()
+
+async def extract_document(document_id: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Extract and store a document's rules (as pending), marking the document extracted.
+    Chunks that nearly repeat an already-extracted chunk of an earlier document
+    (duplicate_of) reuse its extraction instead of calling the model.
+    The document is claimed (extraction_claimed_at) before any model call, so it is
+    extracted once however many triggers race. The claim is a lease, renewed per model
+    call: it is cleared if the extraction fails (including when any chunk's model call
+    failed) and expires if the process dies, so the document can be retried.
+    rules_extracted_at is set only once the rules are stored.
+    Returns the inserted rules, or None if the document has no chunks.
+    Raises 409 if the document is already extracted or being extracted.
+    """
+    # Get chunks for document, with the extraction of the chunk each one repeats
+    chunks = await db.fetch("""
+        SELECT c.chunk_id, c.content, c.source_page, s.extracted_rules AS reused_rules
+        FROM document_chunks c
+        LEFT JOIN document_chunks s ON s.chunk_id = c.duplicate_of
+        WHERE c.document_id = %s
+        ORDER BY c.chunk_index
+    """, (document_id,))
+    if not chunks:
+        return None
+
+    claimed = await db.fetchone("""
+        UPDATE documents SET extraction_claimed_at = NOW()
+        WHERE document_id = %s AND rules_extracted_at IS NULL
+          AND (extraction_claimed_at IS NULL OR extraction_claimed_at < NOW() - make_interval(secs => %s))
+        RETURNING document_id
+    """, (document_id, EXTRACTION_LEASE_SECONDS))
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Document is already extracted or being extracted.")
+
+    try:
+        return await _extract_claimed(document_id, chunks)
+    except BaseException:
+        async with db.connection() as conn:
+            await conn.execute("UPDATE documents SET extraction_claimed_at = NULL WHERE document_id = %s",
+                               (document_id,))
+        raise
+
+async def _extract_claimed(document_id: str, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """extract_document's work once the document is claimed; raises if any chunk's extraction failed"""
+    # Continue the trace the document was uploaded under
+    document = await db.fetchone("SELECT trace_id FROM documents WHERE document_id = %s", (document_id,))
+    trace_id = document["trace_id"] if document else None
+
+    pending_rules = []
+    # Each chunk's raw extraction, stored for later near-duplicates of it
+    extractions = []
+    reused = 0
+
+    logger.info(f"Processing {len(chunks)} chunks for document {document_id}")
+
+    with span("extract.document", trace_id=trace_id, document_id=document_id, chunks=len(chunks)) as current:
+        for chunk in chunks:
+            if chunk["reused_rules"] is not None:
+                rules = [dict(rule, source_document=document_id) if isinstance(rule, dict) else rule
+                         for rule in chunk["reused_rules"]]
+                reused += 1
+                CHUNKS_EXTRACTED.labels("reused").inc()
+            else:
+                # Renew the claim so a long extraction is not taken over mid-way
+                async with db.connection() as conn:
+                    await conn.execute("UPDATE documents SET extraction_claimed_at = NOW() WHERE document_id = %s",
+                                       (document_id,))
+                # AI Inference - now returns an array of rules (blocking model call, run off the event loop)
+                rules = await run_in_threadpool(extractor.extract_rule, chunk["content"], document_id)
+                CHUNKS_EXTRACTED.labels("model").inc()
+            if rules is None:
+                # The model call failed: store nothing, so a retry extracts the whole document
+                raise HTTPException(status_code=502,
+                                    detail=f"Rule extraction failed for chunk {chunk['chunk_id']}.")
+            extractions.append({
+                    "chunk_id": str(chunk["chunk_id"]),
+                    "rules": [{key: value for key, value in rule.items() if key != "source_document"}
+                              if isinstance(rule, dict) else rule for rule in rules]
+                })
+            
+            for rule in rules:
+                reason = validate_rule(rule) if rule else "empty rule"
+                if reason:
+                    logger.warning(f"Skipping extracted rule from chunk {chunk['chunk_id']}: {reason}")
+                    continue
+                # Cite the page the rule's chunk starts on (also for rules reused from another document)
+                pending_rules.append({**rule, "source_page": chunk["source_page"]})
+
+        current.set_attribute("chunks.reused", reused)
+        if reused:
+            logger.info(f"Reused extractions for {reused}/{len(chunks)} near-duplicate chunks of document {document_id}")
+
+        # Insert all of the document's rules in batches rather than one statement per rule
+        with span("db.insert_rules", rules=len(pending_rules)):
+            async with db.connection() as conn:
+                # If the claim expired and another extractor already stored the rules, store nothing
+                cur = await conn.execute("""
+                    UPDATE documents SET rules_extracted_at = NOW(), extraction_claimed_at = NULL
+                    WHERE document_id = %s AND rules_extracted_at IS NULL
+                """, (document_id,))
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=409, detail="Document was extracted by another extractor.")
+                inserted = await insert_rules(conn, pending_rules, document_id)
+                await conn.execute("""
+                    UPDATE document_chunks c SET extracted_rules = x.rules
+                    FROM jsonb_to_recordset(%s) AS x(chunk_id UUID, rules JSONB)
+                    WHERE c.chunk_id = x.chunk_id
+                """, (Jsonb(extractions),))
+    return [{"id": rule_id, "name": name} for rule_id, name in inserted]
+
+async def on_documents_completed(events: List[Dict[str, Any]]):
+    """
+    Extract rules for documents that finished processing (document_completed events),
+    each once and oldest first. A catch_up event covers all completed documents not yet extracted,
+    including those whose extraction claim expired (the extracting process died).
+    """
+    if any(event.get("catch_up") for event in events):
+        rows = await db.fetch("""
+            SELECT d.document_id FROM documents d
+            WHERE d.status = 'completed' AND d.rules_extracted_at IS NULL
+              AND (d.extraction_claimed_at IS NULL
+                   OR d.extraction_claimed_at < NOW() - make_interval(secs => %s))
+              AND NOT EXISTS (SELECT 1 FROM compliance_rules r WHERE r.source_document = d.document_id::text)
+            ORDER BY d.processed_at
+        """, (EXTRACTION_LEASE_SECONDS,))
+    else:
+        document_ids = list({str(event["document_id"]) for event in events if event.get("document_id")})
+        rows = await db.fetch("""
+            SELECT document_id FROM documents
+            WHERE document_id = ANY(%s::uuid[]) AND status = 'completed' AND rules_extracted_at IS NULL
+            ORDER BY processed_at
+        """, (document_ids,))
+
+    for row in rows:
+        document_id = str(row["document_id"])
+        try:
+            extracted = await extract_document(document_id)
+            logger.info(f"Auto-extracted {len(extracted or [])} rules from document {document_id}")
+        except HTTPException as e:
+            if e.status_code == 409:
+                logger.info(f"Skipping document {document_id}: already extracted or being extracted")
+            else:
+                logger.error(f"Auto-extraction failed for document {document_id}: {e.detail}")
+        except Exception as e:
+            logger.error(f"Auto-extraction failed for document {document_id}: {e}")
+
+document_events = EventListener("document_completed", on_documents_completed)
 
 @app.post("/extract/{document_id}")
-async def extract_rules_from_document(document_id: str):
+async def extract_rules_from_document(document_id: str, request: Request):
     """
     Trigger rule extraction for a document.
     1. Fetch chunks from database.
     2. Process chunks with AI.
     3. Save rules to database.
+    Documents are also extracted automatically when they finish processing (PIPELINE_EVENTS).
+    Answers 429 with Retry-After while too many extractions are running, and 409 if
+    the document is already extracted or being extracted.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
     try:
-        # Get chunks for document
-        cur.execute("SELECT chunk_id, content FROM document_chunks WHERE document_id = %s", (document_id,))
-        chunks = cur.fetchall()
-        
-        if not chunks:
+        async with admission.slot(client_id(request)):
+            extracted_rules = await extract_document(document_id)
+        if extracted_rules is None:
             raise HTTPException(status_code=404, detail="No chunks found for document.")
-            
-        extracted_rules = []
-
-        logger.info(f"Processing {len(chunks)} chunks for document {document_id}")
-
-        for chunk_id, content in chunks:
-            # AI Inference - now returns an array of rules
-            rules = extractor.extract_rule(content, document_id)
-            
-            if rules:
-                for rule in rules:
-                    if not rule:
-                        continue
-                    # Insert into compliance_rules table
-                    cur.execute("""
-                        INSERT INTO compliance_rules (
-                            rule_name, rule_type, description, parameters, 
-                            confidence_score, source_document, status
-                        ) 
-                        VALUES (%s, %s, %s, %s, %s, %s, 'pending')
-                        RETURNING rule_id
-                    """, (
-                        rule.get("rule_name", "Unknown Rule"),
-                        rule.get("rule_type", "custom"),
-                        rule.get("description", ""),
-                        json.dumps(rule.get("parameters", {})),
-                        rule.get("confidence_score", 0.5),
-                        document_id
-                    ))
-                    new_rule_id = cur.fetchone()[0]
-                    extracted_rules.append({"id": new_rule_id, "name": rule["rule_name"]})
-                
-        conn.commit()
         return {"status": "success", "extracted_count": len(extracted_rules), "rules": extracted_rules}
         
+    except HTTPException:
+        raise
     except Exception as e:
-        conn.rollback()
         logger.error(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cur.close()
-        conn.close()
+
+@app.post("/rules/bulk")
+async def ingest_rules(rules: List[Dict[str, Any]], source_document: Optional[str] = None):
+    """
+    Ingest many rules in one transaction, as pending.
+    Invalid rules are skipped and reported; the rest are inserted in batches.
+    """
+    rejected = []
+    valid = []
+    for index, rule in enumerate(rules):
+        reason = validate_rule(rule)
+        if reason:
+            rejected.append({"index": index, "error": reason})
+        else:
+            valid.append(rule)
+
+    try:
+        async with db.connection() as conn:
+            inserted = await insert_rules(conn, valid, source_document)
+        logger.info(f"Ingested {len(inserted)} rules ({len(rejected)} rejected)")
+        return {
+            "status": "success",
+            "inserted_count": len(inserted),
+            "rule_ids": [rule_id for rule_id, _ in inserted],
+            "rejected": rejected
+        }
+    except Exception as e:
+        logger.error(f"Error ingesting rules: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/rules")
 async def list_rules():
     """
     List all extracted rules from the database.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
     try:
-        cur.execute("""
+        rows = await db.fetch("""
             SELECT rule_id, rule_name, rule_type, description, parameters, 
                    confidence_score, source_document, status 
             FROM compliance_rules
             ORDER BY created_at DESC
         """)
-        rows = cur.fetchall()
         
         rules = []
         for row in rows:
             rules.append({
-                "rule_id": row[0],
-                "rule_name": row[1],
-                "rule_type": row[2],
-                "description": row[3],
-                "parameters": row[4],  # JSONB is auto-converted by psycopg2
-                "confidence_score": row[5],
-                "source_document": row[6],
-                "status": row[7]
+                "rule_id": row["rule_id"],
+                "rule_name": row["rule_name"],
+                "rule_type": row["rule_type"],
+                "description": row["description"],
+                "parameters": row["parameters"],  # JSONB is auto-converted by psycopg
+                "confidence_score": row["confidence_score"],
+                "source_document": row["source_document"],
+                "status": row["status"]
             })
             
         return {"rules": rules, "count": len(rules)}
     except Exception as e:
         logger.error(f"Error listing rules: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cur.close()
-        conn.close()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8082)
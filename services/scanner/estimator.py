@@ -0,0 +1,155 @@
+"""
+Quick violation estimates over TABLESAMPLE.
+
+Lets reviewers see roughly how many violations a (typically pending) rule
+would raise before activating it, without scanning the full target table and
+without writing to `violations`.
+
+The confidence interval is a Wilson score interval, which assumes rows were
+sampled independently. That holds for BERNOULLI (row) sampling. SYSTEM
+samples whole blocks, and rows in one block (loaded together, often by the
+same batch) tend to violate together, so for SYSTEM the interval is widened
+by a design effect: the sample counts as one row per sampled block. That is
+the effective sample size if rows in a block were perfectly correlated, an
+upper bound on the real widening. Use method=bernoulli for a tighter interval.
+"""
+
+import json
+import logging
+import math
+import random
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2 import sql
+
+from query_generator import CompiledQuery, identifier
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SAMPLE_METHODS = {"system": "SYSTEM", "bernoulli": "BERNOULLI"}
+
+
+def wilson_interval(hits: float, n: float, confidence: float) -> Tuple[float, float]:
+    """Wilson score interval for a proportion hits/n (n may be an effective sample size)."""
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = hits / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+class ViolationEstimator:
+    """Estimates per-rule violation counts from a table sample (read-only)"""
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.generator = scanner.generator
+
+    def estimate(self, rule_ids: Optional[List[str]] = None, status: str = "pending", rate: float = 1.0,
+                 method: str = "system", confidence: float = 0.95, seed: Optional[int] = None,
+                 timeout_seconds: int = 30) -> List[Dict[str, Any]]:
+        """
+        Estimate violations for rules in `status` (or the given `rule_ids`).
+
+        Args:
+            rate: Sample percentage of each table (0-100]
+            method: "system" (block sampling, fastest; wider interval) or "bernoulli" (row sampling)
+            confidence: Confidence level of the reported interval
+            seed: REPEATABLE seed, so the violation and row counts see the same sample
+
+        Returns:
+            Per-rule estimated violation count with a confidence interval
+        """
+        if method.lower() not in SAMPLE_METHODS:
+            raise ValueError(f"Unknown sample method: {method}")
+        if not 0 < rate <= 100:
+            raise ValueError("rate must be in (0, 100]")
+        seed = seed if seed is not None else random.randint(0, 2 ** 31 - 1)
+        sample = sql.SQL("TABLESAMPLE {} ({}) REPEATABLE ({})").format(
+            sql.SQL(SAMPLE_METHODS[method.lower()]), sql.Literal(float(rate)), sql.Literal(seed)
+        )
+
+        conn = self.scanner.get_connection()
+        conn.set_session(readonly=True, autocommit=True)
+        cur = conn.cursor()
+        estimates = []
+
+        try:
+            cur.execute("SET statement_timeout = %s", (f"{int(timeout_seconds)}s",))
+            query = """
+                SELECT rule_id, rule_name, rule_type, parameters FROM compliance_rules
+            """
+            if rule_ids:
+                query += " WHERE rule_id = ANY(%s::uuid[])"
+                params = (list(rule_ids),)
+            else:
+                query += " WHERE status = %s"
+                params = (status,)
+            cur.execute(query, params)
+
+            for rule_id, name, rule_type, params_json in cur.fetchall():
+                parameters = json.loads(params_json) if isinstance(params_json, str) else params_json
+                entry = {"rule_id": rule_id, "rule_name": name, "table": parameters.get("table")}
+                estimates.append(entry)
+                try:
+                    entry.update(self._estimate_rule(cur, rule_type, parameters, sample, rate, confidence,
+                                                     block_sampled=method.lower() == "system"))
+                except Exception as e:
+                    logger.error(f"Estimate failed for rule {name}: {e}")
+                    entry["error"] = str(e)
+
+            return estimates
+        finally:
+            cur.close()
+            conn.close()
+
+    def _estimate_rule(self, cur, rule_type: str, parameters: Dict[str, Any], sample: sql.Composable,
+                       rate: float, confidence: float, block_sampled: bool) -> Dict[str, Any]:
+        compiled = self.generator.generate_violation_query(
+            {"rule_type": rule_type, "parameters": parameters}, sample=sample
+        )
+        if not compiled:
+            raise ValueError(f"Unsupported rule type: {rule_type}")
+
+        table = identifier(parameters["table"])
+        counts = CompiledQuery(
+            compiled.name,
+            sql.SQL("""
+                SELECT (SELECT count(*) FROM ({}) v), s.rows, s.blocks
+                FROM (SELECT count(*) AS rows, count(DISTINCT (ctid::text::point)[0]) AS blocks FROM {} {}) s
+            """).format(compiled.query, table, sample),
+            compiled.params
+        )
+        cur.execute(counts.prepare_sql())
+        try:
+            cur.execute(counts.execute_sql(), counts.params)
+            hits, sampled, blocks = cur.fetchone()
+        finally:
+            cur.execute(sql.SQL("DEALLOCATE {}").format(sql.Identifier(counts.name)))
+
+        # Scale the sampled violation rate to the table's size
+        cur.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                    (parameters["table"],))
+        row = cur.fetchone()
+        total_rows = row[0] if row and row[0] else round(sampled * 100 / rate)
+
+        rate_estimate = hits / sampled if sampled else 0.0
+        # Design effect of block sampling: at most the average rows per sampled block (see module docstring)
+        design_effect = sampled / blocks if block_sampled and blocks else 1.0
+        effective_n = sampled / design_effect
+        low, high = wilson_interval(rate_estimate * effective_n, effective_n, confidence)
+        return {
+            "sampled_rows": sampled,
+            "sampled_violations": hits,
+            "estimated_total_rows": total_rows,
+            "estimated_violations": round(rate_estimate * total_rows),
+            "confidence": confidence,
+            "design_effect": round(design_effect, 2),
+            "interval": [math.floor(low * total_rows), math.ceil(high * total_rows)]
+        }
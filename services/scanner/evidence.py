@@ -0,0 +1,72 @@
+"""
+Compact violation evidence.
+
+Instead of persisting a repr of the whole failing row, a violation keeps only
+the columns its rule references (plus the record key), keyed by column name,
+with long values truncated and the whole document capped in size. The full
+row can still be fetched on demand from the target table.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+# Longest string kept per field, and the cap on the serialized evidence document
+EVIDENCE_FIELD_MAX_CHARS = int(os.getenv("EVIDENCE_FIELD_MAX_CHARS", "256"))
+EVIDENCE_MAX_BYTES = int(os.getenv("EVIDENCE_MAX_BYTES", "2048"))
+
+
+def rule_columns(rule_type: Optional[str], params: Dict[str, Any]) -> List[str]:
+    """Columns of the target table a rule's condition reads."""
+    if rule_type in ("threshold", "not_null", "pattern"):
+        return [params["column"]] if params.get("column") else []
+    if rule_type == "date_difference":
+        return [c for c in (params.get("date_col_1"), params.get("date_col_2")) if c]
+    if rule_type in ("cross_table", "role_based"):
+        keys = params.get("join_keys") or [{"column": params.get("column")}]
+        return [k["column"] for k in keys if k.get("column")]
+    return [params["column"]] if params.get("column") else []
+
+
+def _compact(value: Any, max_chars: int) -> Any:
+    """JSON-safe value, with strings (and anything rendered as one) truncated."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = value if isinstance(value, str) else str(value)
+    if len(text) > max_chars:
+        return text[:max_chars] + f"...[{len(text) - max_chars} more chars]"
+    return text
+
+
+def build_evidence(column_names: Sequence[str], row: Sequence[Any], columns: Sequence[str],
+                   source: str = "table", max_chars: int = EVIDENCE_FIELD_MAX_CHARS,
+                   max_bytes: int = EVIDENCE_MAX_BYTES) -> Dict[str, Any]:
+    """
+    Project a failing row onto the rule's columns.
+
+    The first column is taken as the record key (as for record_id). Fields are
+    added in order until the serialized document would exceed `max_bytes`;
+    the names of any left out are listed under "omitted".
+    """
+    values = dict(zip(column_names, row))
+    record_key = column_names[0] if column_names else None
+    evidence = {"source": source, "record_key": record_key, "columns": {}}
+
+    wanted = [c for c in columns if c in values]
+    missing = [c for c in columns if c not in values]
+    if missing:
+        evidence["missing_columns"] = missing
+
+    omitted = []
+    size = len(json.dumps(evidence))
+    for column in wanted:
+        compact = _compact(values[column], max_chars)
+        field_size = len(json.dumps({column: compact})) + 1
+        if size + field_size > max_bytes:
+            omitted.append(column)
+            continue
+        evidence["columns"][column] = compact
+        size += field_size
+    if omitted:
+        evidence["omitted"] = omitted
+    return evidence
@@ -0,0 +1,245 @@
+"""
+Streaming export of violations joined with their rules, for bulk reporting.
+
+Rows are read through a server-side (named) cursor, EXPORT_BATCH_SIZE at a
+time, and each batch is encoded as soon as it arrives: as a Parquet row
+group, an Arrow IPC record batch or a gzip-compressed CSV block. Memory stays
+bounded by one batch however many violations are exported, and the client
+starts receiving data after the first batch instead of after the whole query.
+
+Served as GET /violations/export; also usable from the command line:
+    python export.py --format parquet --since 2026-07-01 --until 2026-10-01 -o q3.parquet
+"""
+
+import csv
+import io
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "50000"))
+
+# (column, SELECT expression, Arrow type name); ids and JSON are exported as text
+EXPORT_COLUMNS = [
+    ("violation_id", "v.violation_id::text", "string"),
+    ("rule_id", "v.rule_id::text", "string"),
+    ("rule_name", "r.rule_name", "string"),
+    ("rule_type", "r.rule_type", "string"),
+    ("rule_description", "r.description", "string"),
+    ("rule_parameters", "r.parameters::text", "string"),
+    ("source_document", "r.source_document", "string"),
+    ("source_page", "r.source_page", "int32"),
+    ("table_name", "v.table_name", "string"),
+    ("record_id", "v.record_id", "string"),
+    ("severity", "v.severity", "string"),
+    ("status", "v.status", "string"),
+    ("detected_at", "v.detected_at", "timestamp"),
+    ("last_seen", "v.last_seen", "timestamp"),
+    ("resolved_at", "v.resolved_at", "timestamp"),
+    ("resolved_by", "v.resolved_by", "string"),
+    ("explanation", "v.explanation", "string"),
+    ("evidence", "v.evidence::text", "string"),
+]
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "csv.gz": ("application/gzip", "csv.gz"),
+}
+
+
+def violation_filters(severity: Optional[str] = None, status: Optional[str] = None,
+                      rule_id: Optional[str] = None, table: Optional[str] = None,
+                      since: Optional[datetime] = None,
+                      until: Optional[datetime] = None) -> Tuple[List[str], List[Any]]:
+    """WHERE conditions (on `violations v`) and their parameters for the given filters"""
+    conditions, params = [], []
+    for condition, value in (("v.severity = %s", severity), ("v.status = %s", status),
+                             ("v.rule_id = %s", rule_id), ("v.table_name = %s", table),
+                             # Bounds on detected_at also prune the monthly partitions
+                             ("v.detected_at >= %s", since), ("v.detected_at < %s", until)):
+        if value:
+            conditions.append(condition)
+            params.append(value)
+    return conditions, params
+
+
+def export_query(conditions: Sequence[str]) -> str:
+    query = f"""
+        SELECT {", ".join(expression for _, expression, _ in EXPORT_COLUMNS)}
+        FROM violations v
+        JOIN compliance_rules r ON v.rule_id = r.rule_id
+    """
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query + " ORDER BY v.detected_at, v.violation_id"
+
+
+class _Sink:
+    """Write-only file object collecting a pyarrow writer's output until it is drained"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class ArrowEncoder:
+    """Encodes row batches as Parquet row groups or an Arrow IPC stream"""
+
+    def __init__(self, format: str = "parquet"):
+        import pyarrow as pa
+
+        self._pa = pa
+        types = {"string": pa.string(), "int32": pa.int32(), "timestamp": pa.timestamp("us")}
+        self.schema = pa.schema([(name, types[kind]) for name, _, kind in EXPORT_COLUMNS])
+        self._sink = _Sink()
+        if format == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self._sink, self.schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        columns = zip(*rows)
+        arrays = [self._pa.array(column, type=field.type) for column, field in zip(columns, self.schema)]
+        self._writer.write_batch(self._pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+class CsvGzipEncoder:
+    """Encodes row batches as one gzip-compressed CSV stream with a header row"""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self._header = True
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        text = io.StringIO()
+        writer = csv.writer(text)
+        if self._header:
+            writer.writerow(name for name, _, _ in EXPORT_COLUMNS)
+            self._header = False
+        writer.writerows(rows)
+        return self._compressor.compress(text.getvalue().encode())
+
+    def finish(self) -> bytes:
+        if self._header:
+            return self.encode([]) + self._compressor.flush()
+        return self._compressor.flush()
+
+
+def make_encoder(format: str):
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {format} (expected one of {', '.join(EXPORT_FORMATS)})")
+    return CsvGzipEncoder() if format == "csv.gz" else ArrowEncoder(format)
+
+
+def export_filename(format: str) -> str:
+    return f"violations-{datetime.now().strftime('%Y%m%dT%H%M%S')}.{EXPORT_FORMATS[format][1]}"
+
+
+async def stream_export(db, format: str, conditions: Sequence[str], params: Sequence[Any],
+                        batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Async iterator of encoded export bytes, read through a server-side cursor on a
+    pooled connection. Nothing is yielded until the query has run and its first
+    batch has been fetched, so awaiting the first item surfaces query errors.
+    """
+    from fastapi.concurrency import run_in_threadpool
+    from psycopg.rows import tuple_row
+
+    encoder = make_encoder(format)
+    exported = 0
+    async with db.connection() as conn:
+        async with conn.cursor(name="violations_export", row_factory=tuple_row) as cur:
+            await cur.execute(export_query(conditions), params)
+            while True:
+                rows = await cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                exported += len(rows)
+                # Encoding/compression is CPU-bound: keep it off the event loop
+                data = await run_in_threadpool(encoder.encode, rows)
+                if data:
+                    yield data
+    yield encoder.finish()
+    logger.info(f"Exported {exported} violations as {format}")
+
+
+def export_to_file(conninfo: str, path: str, format: str, conditions: Sequence[str],
+                   params: Sequence[Any], batch_size: int = EXPORT_BATCH_SIZE) -> int:
+    """Write an export to `path` through a server-side cursor; returns the number of rows"""
+    import psycopg
+
+    encoder = make_encoder(format)
+    exported = 0
+    with psycopg.connect(conninfo) as conn, open(path, "wb") as out:
+        with conn.cursor(name="violations_export") as cur:
+            cur.execute(export_query(conditions), params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                exported += len(rows)
+                out.write(encoder.encode(rows))
+        out.write(encoder.finish())
+    return exported
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+    from service_core.config import database_url
+
+    parser = argparse.ArgumentParser(description="Export violations joined with their rules")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="parquet")
+    parser.add_argument("-o", "--output", help="Output file (default: violations-<timestamp>.<ext>)")
+    parser.add_argument("--severity")
+    parser.add_argument("--status")
+    parser.add_argument("--rule-id")
+    parser.add_argument("--table")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="detected_at lower bound (inclusive)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="detected_at upper bound (exclusive)")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    output = args.output or export_filename(args.format)
+    conditions, params = violation_filters(args.severity, args.status, args.rule_id, args.table,
+                                           args.since, args.until)
+    count = export_to_file(database_url(), output, args.format, conditions, params, args.batch_size)
+    print(f"Exported {count} violations to {output}")
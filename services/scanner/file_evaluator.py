@@ -0,0 +1,224 @@
+"""
+In-process rule evaluation over CSV/Parquet extracts.
+
+Evaluates the same rule JSON QueryGenerator consumes, vectorized with Arrow
+compute kernels over record batches, so files are streamed in constant memory
+instead of being bulk-loaded into Postgres first. Failing rows are handed to
+a callback batch by batch, as tuples in column order exactly like the rows the
+SQL path fetches, so memory does not grow with the number of violations either.
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Iterator, Optional, Tuple
+import json
+import logging
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from evidence import rule_columns
+from query_generator import INVERSE_OPERATORS
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQL comparison operator -> Arrow compute kernel
+COMPARE = {
+    ">": pc.greater,
+    "<": pc.less,
+    ">=": pc.greater_equal,
+    "<=": pc.less_equal,
+    "=": pc.equal,
+    "!=": pc.not_equal
+}
+
+SUPPORTED_RULE_TYPES = ("threshold", "date_difference", "not_null", "pattern")
+
+SECONDS_PER_DAY = 86400
+
+
+def _as_days(array: pa.Array) -> pa.Array:
+    """Convert a date/timestamp (or ISO date string) column to days since epoch."""
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        array = pc.cast(array, pa.date32())
+    if pa.types.is_date32(array.type):
+        return pc.cast(array, pa.int32())
+    if pa.types.is_date64(array.type) or pa.types.is_timestamp(array.type):
+        seconds = pc.cast(pc.cast(array, pa.timestamp("s")), pa.int64())
+        return pc.divide(pc.cast(seconds, pa.float64()), SECONDS_PER_DAY)
+    return array
+
+
+def _scalar_like(value: Any, array: pa.Array) -> pa.Scalar:
+    """Coerce a rule value to the column's type, as Postgres would for a bound parameter."""
+    scalar = pa.scalar(value)
+    if scalar.type != array.type:
+        try:
+            scalar = scalar.cast(array.type)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+    return scalar
+
+
+def violation_mask(rule: Dict[str, Any], batch: pa.RecordBatch) -> pa.Array:
+    """
+    Boolean mask of the rows in `batch` that VIOLATE the rule.
+    Follows SQL semantics: a NULL comparison is not a violation.
+    """
+    rule_type = rule.get("rule_type")
+    params = rule.get("parameters", {})
+
+    if rule_type == "threshold":
+        column = batch.column(params["column"])
+        inverse = INVERSE_OPERATORS.get(params.get("operator", "="), "!=")
+        return COMPARE[inverse](column, _scalar_like(params["value"], column))
+
+    if rule_type == "date_difference":
+        start = _as_days(batch.column(params["date_col_1"]))
+        end = _as_days(batch.column(params["date_col_2"]))
+        return pc.greater(pc.subtract(end, start), params["max_days"])
+
+    if rule_type == "not_null":
+        column = batch.column(params["column"])
+        mask = pc.is_null(column)
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            mask = pc.or_(mask, pc.fill_null(pc.equal(column, ""), False))
+        return mask
+
+    if rule_type == "pattern":
+        column = batch.column(params["column"])
+        if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+            column = pc.cast(column, pa.string())
+        return pc.invert(pc.match_substring_regex(column, params["regex_pattern"]))
+
+    raise ValueError(f"Unsupported rule type: {rule_type}")
+
+
+def _iter_csv(path: Path, read_options: pa_csv.ReadOptions) -> Iterator[Tuple[pa.RecordBatch, Dict[str, str]]]:
+    """
+    CSV batches with column types inferred from the first block, like pyarrow's
+    reader, except that a later value of another type does not abort the read:
+    the file is read as text and converted per batch, and a column that fails to
+    convert stays text from then on and is reported with the conversion error.
+    """
+    with pa_csv.open_csv(str(path), read_options=read_options) as probe:
+        schema = probe.schema
+    convert_options = pa_csv.ConvertOptions(column_types={name: pa.string() for name in schema.names})
+    # Text the typed reader would have read as NULL
+    null_values = pa.array(pa_csv.ConvertOptions().null_values, pa.string())
+    null = pa.scalar(None, pa.string())
+    unconverted: Dict[str, str] = {}
+
+    for batch in pa_csv.open_csv(str(path), read_options=read_options, convert_options=convert_options):
+        columns = []
+        for field, column in zip(schema, batch.columns):
+            if field.name in unconverted or pa.types.is_string(field.type) or pa.types.is_null(field.type):
+                columns.append(column)
+                continue
+            try:
+                columns.append(pc.cast(pc.if_else(pc.is_in(column, value_set=null_values), null, column), field.type))
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                logger.warning(f"Column {field.name} of {path.name} is not all {field.type}: {e}")
+                unconverted[field.name] = f"not all {field.type} ({e})"
+                columns.append(column)
+        yield pa.RecordBatch.from_arrays(columns, names=schema.names), dict(unconverted)
+
+
+def iter_batches(path: Path, batch_size: int = 65536) -> Iterator[Tuple[pa.RecordBatch, Dict[str, str]]]:
+    """
+    Stream a CSV or Parquet file as record batches, each with the columns that
+    could not be read as their type (CSV only, see _iter_csv) and why.
+    """
+    suffix = path.suffix.lower()
+    if suffix == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield batch, {}
+    elif suffix in (".csv", ".gz"):
+        # block_size bounds memory per batch (bytes of CSV text, not rows)
+        yield from _iter_csv(path, pa_csv.ReadOptions(block_size=max(batch_size * 64, 1 << 20)))
+    else:
+        raise ValueError(f"Unsupported file type: {path.name} (expected .csv or .parquet)")
+
+
+class FileRuleEvaluator:
+    """Evaluates compliance rules against file-based datasets"""
+
+    def __init__(self, batch_size: int = 65536):
+        self.batch_size = batch_size
+
+    def evaluate(self, path: Path, rules: List[Dict[str, Any]],
+                 on_failed: Optional[Callable[[int, List[tuple], List[str]], None]] = None
+                 ) -> Tuple[Dict[int, int], int, List[str], Dict[int, str]]:
+        """
+        Evaluate every rule in a single pass over the file.
+
+        Args:
+            path: CSV or Parquet file
+            rules: Rule objects ({"rule_type", "parameters"}) as QueryGenerator takes them
+            on_failed: Called per batch and rule with the rule's index into `rules`,
+                its failing rows of the batch (tuples in column order) and the column names
+
+        Returns:
+            Failing row count per rule (keyed by index into `rules`), the number
+            of rows read, the column names, and the error for each rule that
+            could not be evaluated (its failing rows are incomplete: they must
+            not be taken as the rule's complete result)
+        """
+        path = Path(path)
+        failed: Dict[int, int] = {i: 0 for i in range(len(rules))}
+        errors: Dict[int, str] = {}
+        active = {
+            i: rule for i, rule in enumerate(rules)
+            if rule.get("rule_type") in SUPPORTED_RULE_TYPES
+        }
+        for i, rule in enumerate(rules):
+            if i not in active:
+                logger.warning(f"Unsupported rule type for file scan: {rule.get('rule_type')}")
+
+        rows_read = 0
+        column_names: List[str] = []
+        for batch, unconverted in iter_batches(path, self.batch_size):
+            rows_read += batch.num_rows
+            column_names = column_names or batch.schema.names
+            for i, rule in list(active.items()):
+                # A column with values of another type fails only the rules that read it
+                bad = [column for column in rule_columns(rule.get("rule_type"), rule.get("parameters", {}))
+                       if column in unconverted]
+                if bad:
+                    logger.error(f"Cannot evaluate rule {rule.get('rule_name', i)} on {path.name}: "
+                                 f"column {bad[0]} is {unconverted[bad[0]]}")
+                    errors[i] = f"Column {bad[0]} is {unconverted[bad[0]]}"
+                    del active[i]
+                    continue
+                try:
+                    mask = pc.fill_null(violation_mask(rule, batch), False)
+                except (KeyError, pa.ArrowException, ValueError) as e:
+                    logger.error(f"Cannot evaluate rule {rule.get('rule_name', i)} on {path.name}: {e}")
+                    errors[i] = f"{type(e).__name__}: {e}"
+                    del active[i]
+                    continue
+                matches = batch.filter(mask)
+                if matches.num_rows:
+                    failed[i] += matches.num_rows
+                    if on_failed:
+                        columns = [col.to_pylist() for col in matches.columns]
+                        on_failed(i, list(zip(*columns)), column_names)
+
+        logger.info(f"Evaluated {len(rules)} rules over {rows_read} rows of {path.name}")
+        return failed, rows_read, column_names, errors
+
+
+if __name__ == "__main__":
+    # Usage: python file_evaluator.py data.csv rules.json
+    import sys
+    file_path, rules_path = Path(sys.argv[1]), Path(sys.argv[2])
+    rules = json.loads(rules_path.read_text())
+    results, _, _, errors = FileRuleEvaluator().evaluate(file_path, rules)
+    for i, count in results.items():
+        if i in errors:
+            print(f"{rules[i].get('rule_name', i)}: failed ({errors[i]})")
+        else:
+            print(f"{rules[i].get('rule_name', i)}: {count} violations")
@@ -0,0 +1,198 @@
+"""
+Index advisor for violation queries.
+
+Violation predicates (`col IS NULL OR col = ''`, `col !~ 'regex'`,
+`(d2 - d1) > n`, ...) force sequential scans on target tables. The advisor
+proposes, per active rule, a partial or expression index that makes the
+violation query index-driven, compares EXPLAIN costs before and after, and can
+build the index with CREATE INDEX CONCURRENTLY. For join rules the index goes
+on the reference table's join keys, which the anti/semi-join probes.
+"""
+
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2 import sql
+
+from query_generator import INVERSE_OPERATORS, JOIN_RULE_TYPES, CompiledQuery, identifier
+from scanner import summarize_plan
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Inverse operators a plain btree on the column can serve with any bound value
+BTREE_OPERATORS = {"<", "<=", ">", ">=", "="}
+
+
+def index_definition(rule: Dict[str, Any]) -> Optional[Tuple[str, str, sql.Composed]]:
+    """
+    Build the CREATE INDEX CONCURRENTLY statement that serves a rule's violation query.
+    Predicates with no parameters become partial indexes over the violating rows;
+    date differences become expression indexes; join rules index the reference
+    table's join keys. Returns (index_name, indexed_table, statement).
+    """
+    rule_type = rule.get("rule_type")
+    params = rule.get("parameters", {})
+    indexed_table = params["table"]
+
+    if rule_type in JOIN_RULE_TYPES:
+        indexed_table = params["ref_table"]
+        keys = params.get("join_keys") or [{"ref_column": params["ref_column"]}]
+        columns = [identifier(k["ref_column"]) for k in keys]
+        if rule_type == "role_based":
+            columns.append(identifier(params.get("role_column", "role")))
+        target = sql.SQL("({})").format(sql.SQL(", ").join(columns))
+        where = None
+    elif rule_type == "threshold":
+        column = identifier(params["column"])
+        inverse = INVERSE_OPERATORS.get(params.get("operator", "="), "!=")
+        target = sql.SQL("({})").format(column)
+        where = None
+        if inverse not in BTREE_OPERATORS:
+            where = sql.SQL("{} {} {}").format(column, sql.SQL(inverse), sql.Literal(params["value"]))
+    elif rule_type == "date_difference":
+        target = sql.SQL("(({} - {}))").format(identifier(params["date_col_2"]), identifier(params["date_col_1"]))
+        where = None
+    elif rule_type == "not_null":
+        column = identifier(params["column"])
+        target = sql.SQL("({})").format(column)
+        where = sql.SQL("{0} IS NULL OR {0} = ''").format(column)
+    elif rule_type == "pattern":
+        column = identifier(params["column"])
+        target = sql.SQL("({})").format(column)
+        where = sql.SQL("{} !~ {}").format(column, sql.Literal(params["regex_pattern"]))
+    else:
+        return None
+
+    fingerprint = json.dumps({"rule_type": rule_type, "parameters": params}, sort_keys=True, default=str)
+    name = "idx_rule_" + hashlib.sha1(fingerprint.encode()).hexdigest()[:20]
+
+    statement = sql.SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} {}").format(
+        sql.Identifier(name), identifier(indexed_table), target
+    )
+    if where is not None:
+        statement += sql.SQL(" WHERE ") + where
+    return name, indexed_table, statement
+
+
+class IndexAdvisor:
+    """Proposes and optionally builds indexes for active rules' violation queries"""
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.generator = scanner.generator
+
+    def _explain(self, cur, compiled: CompiledQuery) -> Dict[str, Any]:
+        """Planner estimate (no ANALYZE) for a violation query with its real parameter values."""
+        cur.execute(compiled.prepare_sql())
+        try:
+            cur.execute(sql.SQL("EXPLAIN (FORMAT JSON) ") + compiled.execute_sql(), compiled.params)
+            result = cur.fetchone()[0]
+            if isinstance(result, str):
+                result = json.loads(result)
+            summary = summarize_plan(result[0])
+            return {"total_cost": summary["total_cost"], "scans": summary["scans"]}
+        finally:
+            cur.execute(sql.SQL("DEALLOCATE {}").format(sql.Identifier(compiled.name)))
+
+    def _index_state(self, cur, name: str) -> Tuple[Optional[str], bool]:
+        """
+        (schema, valid) of the index called `name`, or (None, False) if there is none.
+        A CREATE INDEX CONCURRENTLY that failed or was cancelled leaves an INVALID
+        index behind: it exists but the planner never uses it.
+        """
+        cur.execute("""
+            SELECT n.nspname, i.indisvalid
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_index i ON i.indexrelid = c.oid
+            WHERE c.relname = %s
+        """, (name,))
+        row = cur.fetchone()
+        return (row[0], row[1]) if row else (None, False)
+
+    def _has_hypopg(self, cur) -> bool:
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")
+        return cur.fetchone() is not None
+
+    def advise(self, rule_ids: Optional[List[str]] = None, create: bool = False) -> List[Dict[str, Any]]:
+        """
+        Propose an index per active rule and report before/after plan cost.
+        The after cost comes from the built index (create=True) or, when the
+        hypopg extension is installed, from a hypothetical index.
+        An INVALID index left by an interrupted build is reported as not existing
+        (`invalid`: true), and with create=True is dropped and built again.
+        """
+        conn = self.scanner.get_connection()
+        conn.autocommit = True  # CREATE INDEX CONCURRENTLY cannot run in a transaction
+        cur = conn.cursor()
+        advice = []
+
+        try:
+            query = """
+                SELECT rule_id, rule_name, rule_type, parameters, version
+                FROM compliance_rules
+                WHERE status IN ('active', 'pending')
+            """
+            params = ()
+            if rule_ids:
+                query += " AND rule_id = ANY(%s::uuid[])"
+                params = (list(rule_ids),)
+            cur.execute(query, params)
+            rules = cur.fetchall()
+            hypopg = self._has_hypopg(cur)
+
+            for rule_id, name, rule_type, params_json, version in rules:
+                parameters = json.loads(params_json) if isinstance(params_json, str) else params_json
+                rule = {"rule_id": rule_id, "version": version, "rule_type": rule_type, "parameters": parameters}
+                entry = {"rule_id": rule_id, "rule_name": name, "table": parameters.get("table")}
+                advice.append(entry)
+
+                try:
+                    compiled = self.generator.generate_violation_query(rule)
+                    definition = index_definition(rule) if compiled else None
+                    if not definition:
+                        entry["error"] = f"No index strategy for rule type {rule_type}"
+                        continue
+
+                    index_name, indexed_table, statement = definition
+                    entry["index_name"] = index_name
+                    entry["indexed_table"] = indexed_table
+                    entry["definition"] = statement.as_string(conn)
+                    schema, valid = self._index_state(cur, index_name)
+                    entry["exists"] = valid
+                    if schema and not valid:
+                        entry["invalid"] = True
+                    entry["before"] = self._explain(cur, compiled)
+
+                    if create and not entry["exists"]:
+                        if entry.get("invalid"):
+                            # IF NOT EXISTS would keep the unusable index: drop it and build it again
+                            logger.info(f"Dropping invalid index {index_name} for rule {name}")
+                            cur.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(
+                                sql.Identifier(schema, index_name)))
+                        logger.info(f"Creating {index_name} for rule {name}")
+                        cur.execute(statement)
+                        cur.execute(sql.SQL("ANALYZE {}").format(identifier(indexed_table)))
+                        entry["created"] = True
+                        entry["after"] = self._explain(cur, compiled)
+                        entry["after_source"] = "created"
+                    elif hypopg and not entry["exists"]:
+                        hypothetical = entry["definition"].replace("CONCURRENTLY IF NOT EXISTS ", "", 1)
+                        cur.execute("SELECT * FROM hypopg_create_index(%s)", (hypothetical,))
+                        try:
+                            entry["after"] = self._explain(cur, compiled)
+                            entry["after_source"] = "hypothetical"
+                        finally:
+                            cur.execute("SELECT hypopg_reset()")
+                except Exception as e:
+                    logger.error(f"Index advice failed for rule {name}: {e}")
+                    entry["error"] = str(e)
+
+            return advice
+        finally:
+            cur.close()
+            conn.close()
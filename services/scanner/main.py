@@ -1,13 +1,36 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import sys
+from pathlib import Path
+
+# Shared service core (services/common; also on PYTHONPATH in the container)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "common"))
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
 from typing import List, Optional
+from psycopg import sql
+from service_core.db import Database
+from service_core.events import PIPELINE_EVENTS, EventListener
+from service_core.metrics import metrics_response, register_pool
+from service_core.telemetry import setup_logging
+from service_core.tracing import TraceMiddleware, setup_tracing
+from service_core.warmup import WarmUp
 from scanner import ComplianceScanner
+from scheduler import ScanScheduler
+from index_advisor import IndexAdvisor
+from estimator import ViolationEstimator
+from export import EXPORT_FORMATS, export_filename, stream_export, violation_filters
 import os
+import json
+import base64
+import uuid
+from datetime import datetime
 
 # Setup logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
+setup_tracing("scanner")
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI
@@ -20,67 +43,285 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["traceparent"],
 )
+app.add_middleware(TraceMiddleware)
 
-# Initialize Scanner
+# Initialize Scanner and its job scheduler
 scanner = ComplianceScanner()
+scan_scheduler = ScanScheduler(scanner)
+index_advisor = IndexAdvisor(scanner)
+estimator = ViolationEstimator(scanner)
+
+# Pooled async access for request handlers (scans use their own blocking connections, see connect_blocking)
+db = Database()
+register_pool(db)
+
+# Work deferred until after startup so /health answers immediately
+warmup = WarmUp()
+
+# Directory that file-based scans may read extracts from
+SCAN_FILES_DIR = Path(os.getenv("SCAN_FILES_DIR", "/app/data"))
+
+def resume_range_scans():
+    unfinished = scanner.range_scanner.unfinished_rules()
+    if unfinished:
+        scan_scheduler.submit(rule_ids=unfinished, trigger="resume")
+
+warmup.add("file_evaluator", lambda: scanner.file_evaluator)
+warmup.add("resume_range_scans", resume_range_scans)
+
+async def on_rules_changed(events):
+    """Scan just the rules that were inserted or activated (rules_changed events), as one job"""
+    rule_ids = sorted({str(rule_id) for event in events for rule_id in event.get("rule_ids") or []})
+    if rule_ids:
+        job, deduplicated = scan_scheduler.submit(rule_ids=rule_ids, trigger="event", fresh=True)
+        logger.info(f"{len(rule_ids)} changed rules -> scan job {job.job_id}{' (merged)' if deduplicated else ''}")
+
+rule_events = EventListener("rules_changed", on_rules_changed)
+
+@app.on_event("startup")
+async def startup_event():
+    """
+    Open the database pool, start the scan worker and schedule ticker and listen for
+    rules_changed events; resume interrupted range scans in warm-up
+    """
+    await db.connect()
+    scan_scheduler.start()
+    warmup.start()
+    if PIPELINE_EVENTS:
+        rule_events.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background scanning"""
+    if PIPELINE_EVENTS:
+        await rule_events.stop()
+    scan_scheduler.stop()
+    await db.disconnect()
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "service": "violation-scanner"}
+    return {"status": "ok", "service": "violation-scanner", "ready": warmup.ready}
+
+@app.get("/ready")
+def readiness_check():
+    """200 once warm-up has finished, 503 before"""
+    return JSONResponse(warmup.to_dict(), status_code=200 if warmup.ready else 503)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics"""
+    return metrics_response()
+
+def encode_cursor(detected_at, violation_id) -> str:
+    """Opaque keyset cursor: the (detected_at, violation_id) of the last row on a page"""
+    raw = json.dumps([detected_at.isoformat(), str(violation_id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        detected_at, violation_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(detected_at), violation_id
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
 
 @app.get("/violations")
-async def list_violations(severity: Optional[str] = None, status: Optional[str] = None):
+async def list_violations(
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    rule_id: Optional[str] = None,
+    table: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
     """
-    List all detected violations.
+    List detected violations, newest first, one page at a time.
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page.
+    For bulk reporting use /violations/export instead.
     """
-    conn = scanner.get_connection()
-    cur = conn.cursor()
     try:
         query = """
-            SELECT v.violation_id, v.severity, v.status, v.evidence, v.explanation, v.detected_at, r.rule_name, r.rule_type
+            SELECT v.violation_id, v.severity, v.status, v.evidence, v.explanation, v.detected_at, r.rule_name, r.rule_type, v.last_seen,
+                   v.rule_id, v.table_name
             FROM violations v
             JOIN compliance_rules r ON v.rule_id = r.rule_id
         """
-        params = []
-        conditions = []
-        
-        if severity:
-            conditions.append("v.severity = %s")
-            params.append(severity)
-            
-        if status:
-            conditions.append("v.status = %s")
-            params.append(status)
+        conditions, params = violation_filters(severity, status, rule_id, table, since, until)
+
+        if cursor:
+            # Keyset: continue strictly after the last row of the previous page
+            conditions.append("(v.detected_at, v.violation_id) < (%s, %s::uuid)")
+            params.extend(decode_cursor(cursor))
             
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
             
-        query += " ORDER BY v.detected_at DESC"
+        query += " ORDER BY v.detected_at DESC, v.violation_id DESC LIMIT %s"
+        params.append(limit + 1)
         
-        cur.execute(query, tuple(params))
-        rows = cur.fetchall()
+        rows = await db.fetch(query, params)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
         violations = []
         for row in rows:
             violations.append({
-                "violation_id": row[0],
-                "severity": row[1],
-                "status": row[2],
-                "evidence": row[3], # JSONB
-                "explanation": row[4],
-                "created_at": row[5].isoformat(),
-                "rule_name": row[6],
-                "rule_type": row[7]
+                "violation_id": row["violation_id"],
+                "severity": row["severity"],
+                "status": row["status"],
+                "evidence": row["evidence"], # JSONB
+                "explanation": row["explanation"],
+                "created_at": row["detected_at"].isoformat(),
+                "rule_name": row["rule_name"],
+                "rule_type": row["rule_type"],
+                "last_seen": row["last_seen"].isoformat() if row["last_seen"] else None,
+                "rule_id": row["rule_id"],
+                "table_name": row["table_name"]
             })
-            
-        return {"violations": violations, "count": len(violations)}
+
+        next_cursor = encode_cursor(rows[-1]["detected_at"], rows[-1]["violation_id"]) if has_more else None
+        return {"violations": violations, "count": len(violations), "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching violations: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cur.close()
-        conn.close()
+
+@app.get("/violations/export")
+async def export_violations(
+    format: str = Query("parquet", description="parquet, arrow (IPC stream) or csv.gz"),
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    rule_id: Optional[str] = None,
+    table: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """
+    Stream all matching violations, joined with their rules, as one file.
+    since/until bound detected_at (inclusive/exclusive). Rows are read through a
+    server-side cursor and encoded batch by batch, so exports of any size run in
+    constant memory.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format} (expected one of {', '.join(EXPORT_FORMATS)})")
+    if rule_id:
+        try:
+            uuid.UUID(rule_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid rule_id (expected a UUID): {rule_id}")
+    conditions, params = violation_filters(severity, status, rule_id, table, since, until)
+    media_type, _ = EXPORT_FORMATS[format]
+    # Run the query and read the first batch before the 200 goes out, so a failing
+    # query is reported as an error instead of a truncated file
+    chunks = stream_export(db, format, conditions, params)
+    try:
+        first = await chunks.__anext__()
+    except Exception as e:
+        await chunks.aclose()
+        logger.error(f"Error exporting violations: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format)}"'}
+    )
+
+@app.get("/violations/summary")
+async def violation_summary():
+    """
+    Violation counts by severity, status, rule and table, read from the
+    trigger-maintained violation_summary table.
+    """
+    try:
+        rows = await db.fetch("""
+            SELECT s.rule_id, r.rule_name, r.rule_type, s.table_name, s.severity, s.status,
+                   s.violation_count, s.last_detected
+            FROM violation_summary s
+            JOIN compliance_rules r ON r.rule_id = s.rule_id
+            WHERE s.violation_count > 0
+        """)
+
+        total = 0
+        by_severity, by_status, by_table, by_rule = {}, {}, {}, {}
+        for row in rows:
+            count, severity, status = row["violation_count"], row["severity"], row["status"]
+            last_detected = row["last_detected"]
+            total += count
+            by_severity.setdefault(severity, {}).setdefault(status, 0)
+            by_severity[severity][status] += count
+            by_status[status] = by_status.get(status, 0) + count
+            table_counts = by_table.setdefault(row["table_name"], {"total": 0, "open": 0})
+            table_counts["total"] += count
+            rule = by_rule.setdefault(row["rule_id"], {
+                "rule_id": row["rule_id"], "rule_name": row["rule_name"], "rule_type": row["rule_type"],
+                "severity": severity, "total": 0, "open": 0, "last_detected": None
+            })
+            rule["total"] += count
+            if status == "open":
+                table_counts["open"] += count
+                rule["open"] += count
+            if last_detected and (rule["last_detected"] is None or last_detected.isoformat() > rule["last_detected"]):
+                rule["last_detected"] = last_detected.isoformat()
+
+        return {
+            "total": total,
+            "open": by_status.get("open", 0),
+            "by_severity": by_severity,
+            "by_status": by_status,
+            "by_table": by_table,
+            "by_rule": sorted(by_rule.values(), key=lambda r: r["open"], reverse=True)
+        }
+    except Exception as e:
+        logger.error(f"Error fetching violation summary: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/violations/{violation_id}/record")
+async def get_violation_record(violation_id: str):
+    """
+    Fetch the current full row behind a violation from its target table.
+    Violations only store a compact projection of the row as evidence.
+    """
+    try:
+        violation = await db.fetchone("""
+            SELECT table_name, record_id, evidence->>'record_key' AS record_key, evidence->>'source' AS source
+            FROM violations WHERE violation_id = %s
+        """, (violation_id,))
+        if not violation:
+            raise HTTPException(status_code=404, detail="Violation not found")
+        if violation["source"] == "file" or not violation["record_key"]:
+            raise HTTPException(status_code=409, detail="Violation has no table row to fetch (file scan or legacy evidence)")
+
+        table_name, record_id = violation["table_name"], violation["record_id"]
+        # Cast the stored id to the key column's type (not the column to text), so the lookup can use its index
+        key = await db.fetchone("""
+            SELECT format_type(atttypid, atttypmod) AS key_type FROM pg_attribute
+            WHERE attrelid = to_regclass(%s) AND attname = %s AND NOT attisdropped
+        """, (table_name, violation["record_key"]))
+        if not key:
+            raise HTTPException(status_code=404, detail="Record key column no longer exists")
+        record = await db.fetchone(sql.SQL("SELECT * FROM {} WHERE {} = %s::{} LIMIT 1").format(
+            sql.Identifier(*table_name.split(".")), sql.Identifier(violation["record_key"]),
+            sql.SQL(key["key_type"])
+        ), (record_id,))
+        if not record:
+            raise HTTPException(status_code=404, detail="Record no longer exists")
+        return {"violation_id": violation_id, "table_name": table_name, "record_id": record_id,
+                "record": json.loads(json.dumps(record, default=str))}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching violation record: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/violations/{violation_id}/resolve")
 async def resolve_violation(violation_id: str, status: str = "resolved"):
@@ -90,47 +331,191 @@ async def resolve_violation(violation_id: str, status: str = "resolved"):
     if status not in ["resolved", "false_positive", "ignored"]:
         raise HTTPException(status_code=400, detail="Invalid status")
 
-    conn = scanner.get_connection()
-    cur = conn.cursor()
     try:
-        cur.execute("""
+        updated_id = await db.fetchone("""
             UPDATE violations 
             SET status = %s, resolved_at = NOW() 
             WHERE violation_id = %s
             RETURNING violation_id
         """, (status, violation_id))
         
-        updated_id = cur.fetchone()
-        conn.commit()
-        
         if not updated_id:
              raise HTTPException(status_code=404, detail="Violation not found")
              
         return {"status": "success", "violation_id": violation_id, "new_status": status}
+    except HTTPException:
+        raise
     except Exception as e:
-        conn.rollback()
         logger.error(f"Error resolving violation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cur.close()
-        conn.close()
 
-@app.post("/scan")
-async def trigger_scan(scan_all: bool = True):
+@app.get("/rules/slowest")
+def slowest_rules(limit: int = 10, days: int = 7):
     """
-    Manually trigger a full compliance scan.
+    Rules ranked by average execution time, from rule_executions.
     """
     try:
-        logger.info("Starting manual scan...")
-        violations = scanner.scan_all_tables()
-        
+        rules = scanner.slowest_rules(limit=limit, days=days)
+        return {"rules": rules, "count": len(rules)}
+    except Exception as e:
+        logger.error(f"Error fetching slowest rules: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/rules/estimate")
+def estimate_violations(
+    rule_ids: Optional[List[str]] = Query(None),
+    status: str = "pending",
+    rate: float = 1.0,
+    method: str = "system",
+    confidence: float = 0.95,
+    seed: Optional[int] = None
+):
+    """
+    Estimate violation counts over a TABLESAMPLE of each target table.
+    method=system intervals are widened for block sampling; bernoulli gives tighter ones.
+    Defaults to pending rules; nothing is written to violations.
+    """
+    try:
+        estimates = estimator.estimate(
+            rule_ids=rule_ids, status=status, rate=rate, method=method, confidence=confidence, seed=seed
+        )
+        return {"estimates": estimates, "count": len(estimates), "rate": rate, "method": method}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error estimating violations: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/indexes/advice")
+def index_advice(rule_ids: Optional[List[str]] = Query(None)):
+    """
+    Propose partial/expression indexes for active rules' violation queries,
+    with the current plan cost (and hypothetical cost when hypopg is installed).
+    """
+    try:
+        advice = index_advisor.advise(rule_ids=rule_ids)
+        return {"advice": advice, "count": len(advice)}
+    except Exception as e:
+        logger.error(f"Error building index advice: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/indexes/apply")
+def apply_index_advice(rule_ids: Optional[List[str]] = Query(None)):
+    """
+    Build the proposed indexes with CREATE INDEX CONCURRENTLY and report before/after plan cost.
+    Invalid indexes left by interrupted builds are dropped and rebuilt.
+    """
+    try:
+        advice = index_advisor.advise(rule_ids=rule_ids, create=True)
+        return {"advice": advice, "created": sum(1 for a in advice if a.get("created"))}
+    except Exception as e:
+        logger.error(f"Error applying index advice: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/maintenance/partitions")
+def run_partition_maintenance():
+    """
+    Create upcoming monthly partitions and retire expired ones now
+    (also runs daily from the scheduler).
+    """
+    try:
+        return scanner.maintain_partitions()
+    except Exception as e:
+        logger.error(f"Partition maintenance failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/scan", status_code=202)
+async def trigger_scan(rule_ids: Optional[List[str]] = Query(None), explain: bool = False):
+    """
+    Queue a compliance scan of all active rules (or just `rule_ids`).
+    Returns immediately with a job ID; overlapping requests share one job.
+    explain=true stores an EXPLAIN (ANALYZE, BUFFERS) summary per rule.
+    Answers 400 if any of `rule_ids` is not a UUID.
+    """
+    invalid = []
+    for rule_id in rule_ids or []:
+        try:
+            uuid.UUID(rule_id)
+        except ValueError:
+            invalid.append(rule_id)
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid rule_ids (expected UUIDs): {', '.join(invalid)}")
+    job, deduplicated = scan_scheduler.submit(rule_ids=rule_ids, explain=explain)
+    return {
+        "status": "accepted",
+        "job_id": job.job_id,
+        "job_status": job.status,
+        "deduplicated": deduplicated
+    }
+
+@app.get("/scan/jobs")
+async def list_scan_jobs():
+    """
+    Recent scan jobs, newest first.
+    """
+    jobs = [job.to_dict() for job in scan_scheduler.list_jobs()]
+    return {"jobs": jobs, "count": len(jobs)}
+
+@app.get("/scan/jobs/{job_id}")
+async def get_scan_job(job_id: str):
+    """
+    Status and progress of a scan job.
+    """
+    job = scan_scheduler.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return job.to_dict()
+
+@app.get("/scan/ranges/{scan_id}")
+def get_range_scan(scan_id: str):
+    """
+    Checkpoint progress of a range-partitioned scan.
+    """
+    progress = scanner.range_scanner.progress(scan_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Range scan not found")
+    return progress
+
+@app.post("/scan/ranges/{scan_id}/work")
+def work_range_scan(scan_id: str):
+    """
+    Join a range-partitioned scan as an extra worker until its ranges are exhausted.
+    """
+    try:
+        stats = scanner.range_scanner.run_worker(scan_id)
+        return {
+            "status": "success",
+            "ranges_completed": stats["ranges"],
+            "violations_found": stats["failed_rows"],
+            "new_violations": stats["new_violations"]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error working range scan: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/scan/file")
+def trigger_file_scan(path: str, table: Optional[str] = None):
+    """
+    Evaluate active rules against a CSV/Parquet extract under SCAN_FILES_DIR.
+    `table` names the table the file represents (defaults to the file name).
+    """
+    file_path = (SCAN_FILES_DIR / path).resolve()
+    if SCAN_FILES_DIR.resolve() not in file_path.parents or not file_path.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+
+    try:
+        logger.info(f"Starting file scan of {file_path.name}...")
+        violations = scanner.scan_file(file_path, table_name=table)
+
         return {
             "status": "success",
             "violations_found": len(violations),
             "new_violations": violations
         }
     except Exception as e:
-        logger.error(f"Error during scan: {str(e)}")
+        logger.error(f"Error during file scan: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
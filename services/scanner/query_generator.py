@@ -1,5 +1,9 @@
-from typing import Dict, Any
+from typing import Dict, Any, NamedTuple, Optional, Tuple
 from jinja2 import Template
+from psycopg2 import sql
+from service_core.tracing import traced
+import hashlib
+import json
 import logging
 
 # Setup logging
@@ -7,29 +11,70 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Templates for different rule types
-# A violation is the *inverse* of the rule condition
+# A violation is the *inverse* of the rule condition.
+# Jinja only renders the query *shape*; {table}/{column} placeholders are filled
+# with quoted identifiers via psycopg2.sql, and values are bound as $n parameters.
+# {sample} is empty for scans and a TABLESAMPLE clause for estimates; {range} is
+# empty unless the table is scanned in primary-key or ctid ranges.
 TEMPLATES = {
     "threshold": """
-    SELECT * FROM {{ table }}
-    WHERE {{ column }} {{ inverse_operator }} {{ value }}
+    SELECT * FROM {table} {sample}
+    WHERE {column} {{ inverse_operator }} $1 {range}
     """,
-    
+
     "date_difference": """
-    SELECT * FROM {{ table }}
-    WHERE ({{ date_col_2 }} - {{ date_col_1 }}) > {{ max_days }}
+    SELECT * FROM {table} {sample}
+    WHERE ({date_col_2} - {date_col_1}) > $1 {range}
     """,
-    
+
     "not_null": """
-    SELECT * FROM {{ table }}
-    WHERE {{ column }} IS NULL OR {{ column }} = ''
+    SELECT * FROM {table} {sample}
+    WHERE ({column} IS NULL OR {column} = '') {range}
     """,
-    
+
     "pattern": """
-    SELECT * FROM {{ table }}
-    WHERE {{ column }} !~ '{{ regex_pattern }}'
+    SELECT * FROM {table} {sample}
+    WHERE {column} !~ $1 {range}
+    """,
+
+    # Set-based joins: semi-join rules (referenced row must exist) find violations with
+    # NOT EXISTS, anti-join rules (referenced row must not exist) with EXISTS
+    "cross_table": """
+    SELECT t.* FROM {table} t {sample}
+    WHERE {% if skip_null_keys %}{keys_not_null} AND {% endif %}{% if mode == 'not_exists' %}EXISTS{% else %}NOT EXISTS{% endif %} (
+        SELECT 1 FROM {ref_table} r
+        WHERE {join_condition}{% if has_ref_filter %} AND {ref_filter}{% endif %}
+    ) {range}
+    """,
+
+    # Anti-join: the record's user must hold one of the allowed roles
+    "role_based": """
+    SELECT t.* FROM {table} t {sample}
+    WHERE {keys_not_null} AND NOT EXISTS (
+        SELECT 1 FROM {ref_table} r
+        WHERE {join_condition} AND r.{role_column} = ANY($1)
+    ) {range}
     """
 }
 
+# Rule types compiled to joins against a second (reference) table
+JOIN_RULE_TYPES = ("cross_table", "role_based")
+
+# Identifier parameters and bound value parameters for each rule type
+IDENTIFIERS = {
+    "threshold": ["table", "column"],
+    "date_difference": ["table", "date_col_1", "date_col_2"],
+    "not_null": ["table", "column"],
+    "pattern": ["table", "column"],
+}
+
+VALUES = {
+    "threshold": ["value"],
+    "date_difference": ["max_days"],
+    "not_null": [],
+    "pattern": ["regex_pattern"],
+}
+
 # Operator inversion map (rule says >= 18, violation is < 18)
 INVERSE_OPERATORS = {
     ">": "<=",
@@ -40,34 +85,150 @@ INVERSE_OPERATORS = {
     "!=": "="
 }
 
+
+def identifier(name: str) -> sql.Identifier:
+    """Quote a (possibly schema-qualified) table or column name."""
+    return sql.Identifier(*str(name).split("."))
+
+
+class CompiledQuery(NamedTuple):
+    """A violation query ready to run as a server-side prepared statement."""
+    name: str               # prepared statement name, derived from the rule definition
+    query: sql.Composed     # violation query with $1..$n value placeholders
+    params: Tuple[Any, ...] # values bound at EXECUTE time
+    rule_type: Optional[str] = None
+
+    def prepare_sql(self) -> sql.Composed:
+        return sql.SQL("PREPARE {} AS ").format(sql.Identifier(self.name)) + self.query
+
+    def execute_sql(self) -> sql.Composed:
+        statement = sql.SQL("EXECUTE {}").format(sql.Identifier(self.name))
+        if self.params:
+            statement += sql.SQL(" ({})").format(sql.SQL(", ").join(sql.Placeholder() * len(self.params)))
+        return statement
+
+
 class QueryGenerator:
-    def generate_violation_query(self, rule: Dict[str, Any]) -> str:
+    def __init__(self):
+        # Compiled Jinja templates per rule type, generated queries per (rule_id, version)
+        self._templates: Dict[str, Template] = {}
+        self._queries: Dict[Tuple[str, int, Optional[str]], CompiledQuery] = {}
+
+    def _template(self, rule_type: str) -> Template:
+        template = self._templates.get(rule_type)
+        if template is None:
+            template = self._templates[rule_type] = Template(TEMPLATES[rule_type])
+        return template
+
+    def _join_parts(self, rule_type: str, params: Dict[str, Any],
+                    context: Dict[str, Any]) -> Tuple[Dict[str, sql.Composable], Tuple[Any, ...]]:
+        """
+        Identifiers and values for a join rule. Join keys come from `join_keys`
+        ([{"column", "ref_column"}, ...]) or the single `column`/`ref_column` pair.
+        """
+        keys = params.get("join_keys") or [{"column": params["column"], "ref_column": params["ref_column"]}]
+        parts = {
+            "table": identifier(params["table"]),
+            "ref_table": identifier(params["ref_table"]),
+            "join_condition": sql.SQL(" AND ").join(
+                sql.SQL("r.{} = t.{}").format(identifier(k["ref_column"]), identifier(k["column"])) for k in keys
+            ),
+            "keys_not_null": sql.SQL(" AND ").join(
+                sql.SQL("t.{} IS NOT NULL").format(identifier(k["column"])) for k in keys
+            ),
+        }
+
+        if rule_type == "role_based":
+            parts["role_column"] = identifier(params.get("role_column", "role"))
+            return parts, (list(params["allowed_roles"]),)
+
+        # cross_table: NULL keys reference nothing, so they are skipped unless allow_null is false
+        context["mode"] = params.get("mode", "exists")
+        context["skip_null_keys"] = params.get("allow_null", True)
+        ref_filter = params.get("ref_filter")
+        context["has_ref_filter"] = bool(ref_filter)
+        if not ref_filter:
+            return parts, ()
+        operator = ref_filter.get("operator", "=")
+        if operator not in INVERSE_OPERATORS:
+            raise ValueError(f"Unsupported ref_filter operator: {operator}")
+        parts["ref_filter"] = sql.SQL("r.{} {} $1").format(identifier(ref_filter["column"]), sql.SQL(operator))
+        return parts, (ref_filter["value"],)
+
+    def _range_clause(self, range_key: Optional[str], first: int) -> sql.Composable:
+        """Bound the scan to [lower, upper] of a primary key, or [lower, upper) of ctid."""
+        if range_key is None:
+            return sql.SQL("")
+        if range_key == "ctid":
+            return sql.SQL("AND ctid >= ${}::tid AND ctid < ${}::tid").format(
+                sql.SQL(str(first)), sql.SQL(str(first + 1))
+            )
+        return sql.SQL("AND {} BETWEEN ${} AND ${}").format(
+            identifier(range_key), sql.SQL(str(first)), sql.SQL(str(first + 1))
+        )
+
+    @traced("scan.generate_query")
+    def generate_violation_query(self, rule: Dict[str, Any], sample: Optional[sql.Composable] = None,
+                                 range_key: Optional[str] = None) -> Optional[CompiledQuery]:
         """
         Translates a rule JSON object into a SQL query that finds VIOLATIONS.
+        `sample` (a TABLESAMPLE clause) restricts the query to a sample of the table.
+        `range_key` (an integer primary key column, or "ctid") adds two trailing
+        parameters bounding the rows scanned, for range-partitioned scans.
+        Results are cached per (rule_id, version, range_key) when the rule carries both.
         """
+        cache_key = None
+        if sample is None and rule.get("rule_id") is not None and rule.get("version") is not None:
+            cache_key = (str(rule["rule_id"]), rule["version"], range_key)
+            if cache_key in self._queries:
+                return self._queries[cache_key]
+
         try:
             rule_type = rule.get("rule_type")
             params = rule.get("parameters", {})
-            
+
             if rule_type not in TEMPLATES:
                 logger.warning(f"Unsupported rule type: {rule_type}")
                 return None
-                
-            template_str = TEMPLATES[rule_type]
-            template = Template(template_str)
-            
+
+            template = self._template(rule_type)
+
             # Prepare context based on rule type
-            context = params.copy()
-            
+            context = {}
+
             if rule_type == "threshold":
                 op = params.get("operator", "=")
                 context["inverse_operator"] = INVERSE_OPERATORS.get(op, "!=")
-            
-            # Additional logic for specific types...
-            
-            query = template.render(context)
-            return query.strip()
-            
+
+            if rule_type in JOIN_RULE_TYPES:
+                identifiers, values = self._join_parts(rule_type, params, context)
+            else:
+                identifiers = {key: identifier(params[key]) for key in IDENTIFIERS[rule_type]}
+                values = tuple(params[key] for key in VALUES[rule_type])
+
+            shape = template.render(context).strip()
+            query = sql.SQL(shape).format(
+                sample=sample if sample is not None else sql.SQL(""),
+                range=self._range_clause(range_key, len(values) + 1),
+                **identifiers
+            )
+
+            # Name the statement after the rule definition so identical rules share a plan
+            fingerprint = json.dumps({"rule_type": rule_type, "parameters": params}, sort_keys=True, default=str)
+            name = "violation_" + hashlib.sha1(fingerprint.encode()).hexdigest()[:24]
+            if sample is not None:
+                name = "sample_" + name
+            elif range_key is not None:
+                name = "range_" + name
+
+            compiled = CompiledQuery(name, query, values, rule_type)
+            if cache_key:
+                # Drop the rule's queries for other versions
+                for key in [key for key in self._queries if key[0] == cache_key[0] and key[1] != cache_key[1]]:
+                    del self._queries[key]
+                self._queries[cache_key] = compiled
+            return compiled
+
         except Exception as e:
             logger.error(f"Error generating query for rule {rule}: {str(e)}")
             return None
@@ -0,0 +1,374 @@
+"""
+Range-partitioned, resumable scans of large target tables.
+
+A rule's violation query over a large table is split into primary-key (or
+ctid block) ranges stored in `scan_ranges`. Any number of workers, in this
+process or other scanner pods, claim ranges with FOR UPDATE SKIP LOCKED and
+evaluate each in its own short transaction; the checkpoint (range marked done)
+commits atomically with that range's violation upserts. A crashed worker's
+claim expires after a lease, so an interrupted scan resumes where it left off;
+a range whose lease keeps expiring is marked failed after RANGE_SCAN_MAX_ATTEMPTS.
+Finished scans are pruned after RANGE_SCAN_RETENTION_DAYS (see prune_history).
+"""
+
+import contextvars
+import logging
+import math
+import os
+import socket
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2 import sql
+
+from evidence import rule_columns
+from query_generator import identifier
+from service_core.tracing import span
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tables estimated above this many rows are scanned in ranges
+RANGE_SCAN_MIN_ROWS = int(os.getenv("RANGE_SCAN_MIN_ROWS", "1000000"))
+# Target rows per range (one unit of work / one transaction)
+RANGE_SCAN_ROWS_PER_RANGE = int(os.getenv("RANGE_SCAN_ROWS_PER_RANGE", "250000"))
+# In-process workers per range scan
+RANGE_SCAN_WORKERS = int(os.getenv("RANGE_SCAN_WORKERS", "2"))
+# A claimed range not checkpointed within this many seconds is handed to another worker
+RANGE_SCAN_LEASE_SECONDS = int(os.getenv("RANGE_SCAN_LEASE_SECONDS", "600"))
+# Attempts before a range is marked failed
+RANGE_SCAN_MAX_ATTEMPTS = 3
+# Completed and failed range scans (with their ranges) are kept this long
+RANGE_SCAN_RETENTION_DAYS = int(os.getenv("RANGE_SCAN_RETENTION_DAYS", "30"))
+
+INTEGER_TYPES = ("smallint", "integer", "bigint")
+
+# ctid upper bound past any real block, for the open-ended last range
+MAX_TID = "(4294967295,0)"
+
+
+class RangeScanner:
+    """Plans range scans and runs workers that claim and checkpoint ranges"""
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.generator = scanner.generator
+
+    def _table_stats(self, cur, table_name: str) -> Tuple[int, int]:
+        """Estimated rows and current size in blocks of a table."""
+        cur.execute("""
+            SELECT GREATEST(reltuples, 0)::bigint,
+                   pg_relation_size(oid) / current_setting('block_size')::bigint
+            FROM pg_class WHERE oid = to_regclass(%s)
+        """, (table_name,))
+        row = cur.fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def needs_ranges(self, cur, table_name: str) -> bool:
+        return self._table_stats(cur, table_name)[0] >= RANGE_SCAN_MIN_ROWS
+
+    def _integer_primary_key(self, cur, table_name: str) -> Optional[str]:
+        """The table's primary key column if it is a single integer column."""
+        cur.execute("""
+            SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+            WHERE i.indrelid = to_regclass(%s) AND i.indisprimary
+        """, (table_name,))
+        rows = cur.fetchall()
+        if len(rows) == 1 and rows[0][1] in INTEGER_TYPES:
+            return rows[0][0]
+        return None
+
+    def plan(self, cur, rule_id, version: int, table_name: str) -> str:
+        """
+        Return the running range scan for a rule, or create one with its ranges.
+        An unfinished scan of the same rule version is resumed, not re-planned.
+        """
+        cur.execute("""
+            SELECT scan_id, rule_version FROM range_scans
+            WHERE rule_id = %s AND status = 'running'
+            FOR UPDATE
+        """, (rule_id,))
+        existing = cur.fetchone()
+        if existing and existing[1] == version:
+            logger.info(f"Resuming range scan {existing[0]} for rule {rule_id}")
+            return existing[0]
+        if existing:
+            # Rule changed since the scan started; its checkpoints no longer apply
+            cur.execute("UPDATE range_scans SET status = 'failed', completed_at = NOW() WHERE scan_id = %s",
+                        (existing[0],))
+
+        rows, blocks = self._table_stats(cur, table_name)
+        count = max(1, math.ceil(rows / RANGE_SCAN_ROWS_PER_RANGE))
+        range_key = self._integer_primary_key(cur, table_name)
+        bounds = []
+
+        if range_key:
+            cur.execute(sql.SQL("SELECT MIN({0}), MAX({0}) FROM {1}").format(
+                identifier(range_key), identifier(table_name)
+            ))
+            low, high = cur.fetchone()
+            if low is not None:
+                width = max(1, math.ceil((high - low + 1) / count))
+                bounds = [(str(lo), str(min(lo + width - 1, high))) for lo in range(low, high + 1, width)]
+        else:
+            range_key = "ctid"
+            width = max(1, math.ceil(blocks / count))
+            starts = list(range(0, max(blocks, 1), width))
+            bounds = [
+                (f"({start},0)", f"({start + width},0)" if i < len(starts) - 1 else MAX_TID)
+                for i, start in enumerate(starts)
+            ]
+
+        cur.execute("""
+            INSERT INTO range_scans (rule_id, rule_version, table_name, range_key)
+            VALUES (%s, %s, %s, %s)
+            RETURNING scan_id
+        """, (rule_id, version, table_name, range_key))
+        scan_id = cur.fetchone()[0]
+        if bounds:
+            cur.executemany("""
+                INSERT INTO scan_ranges (scan_id, lower_bound, upper_bound) VALUES (%s, %s, %s)
+            """, [(scan_id, lo, hi) for lo, hi in bounds])
+        logger.info(f"Planned range scan {scan_id}: {len(bounds)} {range_key} ranges over ~{rows} rows")
+        return scan_id
+
+    def _claim(self, cur, scan_id: str, worker_id: str) -> Optional[Tuple[int, str, str]]:
+        # A range whose lease expired on its last attempt (e.g. it crashes every worker) is given up
+        cur.execute("""
+            UPDATE scan_ranges
+            SET status = 'failed', claimed_by = NULL
+            WHERE scan_id = %s AND status = 'claimed' AND attempts >= %s
+              AND claimed_at < NOW() - make_interval(secs => %s)
+        """, (scan_id, RANGE_SCAN_MAX_ATTEMPTS, RANGE_SCAN_LEASE_SECONDS))
+        cur.execute("""
+            UPDATE scan_ranges
+            SET status = 'claimed', claimed_by = %s, claimed_at = NOW(), attempts = attempts + 1
+            WHERE range_id = (
+                SELECT range_id FROM scan_ranges
+                WHERE scan_id = %s
+                  AND (status = 'pending'
+                       OR (status = 'claimed' AND claimed_at < NOW() - make_interval(secs => %s)))
+                ORDER BY range_id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING range_id, lower_bound, upper_bound
+        """, (worker_id, scan_id, RANGE_SCAN_LEASE_SECONDS))
+        return cur.fetchone()
+
+    def run_worker(self, scan_id: str, worker_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Claim and evaluate ranges of a scan until none are left, then finalize it.
+        Safe to run concurrently from any number of threads or processes.
+        """
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        conn = self.scanner.get_connection()
+        cur = conn.cursor()
+        prepared = set()
+        stats = {"ranges": 0, "new_violations": [], "failed_rows": 0}
+
+        try:
+            cur.execute("""
+                SELECT s.rule_id, s.rule_version, s.table_name, s.range_key, r.rule_name, r.rule_type,
+                       r.parameters, COALESCE(r.severity, 'high')
+                FROM range_scans s JOIN compliance_rules r ON r.rule_id = s.rule_id
+                WHERE s.scan_id = %s
+            """, (scan_id,))
+            row = cur.fetchone()
+            conn.commit()
+            if not row:
+                raise ValueError(f"Range scan {scan_id} not found")
+            rule_id, version, table_name, range_key, name, rule_type, parameters, severity = row
+            compiled = self.generator.generate_violation_query(
+                {"rule_id": rule_id, "version": version, "rule_type": rule_type, "parameters": parameters},
+                range_key=range_key
+            )
+            if not compiled:
+                raise ValueError(f"Could not generate query for rule {rule_id}")
+
+            while True:
+                claim = self._claim(cur, scan_id, worker_id)
+                conn.commit()
+                if not claim:
+                    break
+                range_id, lower, upper = claim
+                try:
+                    bounded = compiled._replace(params=compiled.params + (lower, upper))
+                    with span("scan.range", range_id=range_id, lower=lower, upper=upper):
+                        if bounded.name not in prepared:
+                            cur.execute(bounded.prepare_sql())
+                            prepared.add(bounded.name)
+                        cur.execute(bounded.execute_sql(), bounded.params)
+                        failed_rows = cur.fetchall()
+
+                    new_ids = self.scanner.record_violations(
+                        cur, rule_id, name, table_name, failed_rows, severity=severity, resolve_missing=False,
+                        column_names=[column.name for column in cur.description],
+                        evidence_columns=rule_columns(rule_type, parameters)
+                    )
+                    # Checkpoint in the same transaction as the upserts; a lost lease aborts both
+                    cur.execute("""
+                        UPDATE scan_ranges
+                        SET status = 'done', violations_found = %s, completed_at = NOW()
+                        WHERE range_id = %s AND claimed_by = %s AND status = 'claimed'
+                    """, (len(failed_rows), range_id, worker_id))
+                    if cur.rowcount == 0:
+                        conn.rollback()
+                        logger.warning(f"Lost lease on range {range_id}; another worker took it over")
+                        continue
+                    conn.commit()
+                    stats["ranges"] += 1
+                    stats["failed_rows"] += len(failed_rows)
+                    stats["new_violations"].extend({"id": vid, "rule": name} for vid in new_ids)
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Range {range_id} of scan {scan_id} failed: {e}")
+                    cur.execute("""
+                        UPDATE scan_ranges
+                        SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                            claimed_by = NULL
+                        WHERE range_id = %s AND claimed_by = %s
+                    """, (RANGE_SCAN_MAX_ATTEMPTS, range_id, worker_id))
+                    conn.commit()
+
+            self._finalize(cur, scan_id, rule_id, table_name)
+            conn.commit()
+            return stats
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    def _finalize(self, cur, scan_id: str, rule_id, table_name: str):
+        """
+        Close the scan once no range is pending or claimed. Only one worker wins
+        the update; it auto-resolves violations not seen since the scan started.
+        """
+        cur.execute("""
+            UPDATE range_scans s
+            SET status = CASE WHEN EXISTS (SELECT 1 FROM scan_ranges WHERE scan_id = s.scan_id AND status = 'failed')
+                              THEN 'failed' ELSE 'completed' END,
+                completed_at = NOW()
+            WHERE scan_id = %s AND status = 'running'
+              AND NOT EXISTS (SELECT 1 FROM scan_ranges
+                              WHERE scan_id = s.scan_id AND status IN ('pending', 'claimed'))
+            RETURNING status, started_at
+        """, (scan_id,))
+        row = cur.fetchone()
+        if not row:
+            return
+        status, started_at = row
+        if status == "completed":
+            resolved = self.scanner.resolve_missing(cur, rule_id, table_name, seen_since=started_at)
+            logger.info(f"Range scan {scan_id} completed; {resolved} violations auto-resolved")
+        else:
+            logger.warning(f"Range scan {scan_id} finished with failed ranges; skipping auto-resolve")
+
+    def scan_rule(self, rule_id, version: int, table_name: str, workers: int = RANGE_SCAN_WORKERS) -> Dict[str, Any]:
+        """Plan (or resume) a rule's range scan and run in-process workers until it finishes."""
+        conn = self.scanner.get_connection()
+        cur = conn.cursor()
+        try:
+            scan_id = self.plan(cur, rule_id, version, table_name)
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+        results: List[Dict[str, Any]] = []
+        errors: List[Exception] = []
+
+        def work():
+            try:
+                results.append(self.run_worker(scan_id))
+            except Exception as e:
+                errors.append(e)
+
+        # Workers continue the calling rule's trace
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(work,), name=f"range-worker-{i}")
+                   for i in range(max(1, workers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors and not results:
+            raise errors[0]
+
+        return {
+            "scan_id": scan_id,
+            # 'running' here means another process still holds a claimed range
+            "status": self.progress(scan_id)["status"],
+            "ranges": sum(r["ranges"] for r in results),
+            "failed_rows": sum(r["failed_rows"] for r in results),
+            "new_violations": [v for r in results for v in r["new_violations"]]
+        }
+
+    def progress(self, scan_id: str) -> Optional[Dict[str, Any]]:
+        """Range counts by status for a scan."""
+        conn = self.scanner.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT s.rule_id, s.table_name, s.range_key, s.status, s.started_at, s.completed_at,
+                       COUNT(r.range_id) FILTER (WHERE r.status = 'done'),
+                       COUNT(r.range_id) FILTER (WHERE r.status = 'claimed'),
+                       COUNT(r.range_id) FILTER (WHERE r.status = 'pending'),
+                       COUNT(r.range_id) FILTER (WHERE r.status = 'failed'),
+                       COALESCE(SUM(r.violations_found), 0)
+                FROM range_scans s LEFT JOIN scan_ranges r ON r.scan_id = s.scan_id
+                WHERE s.scan_id = %s
+                GROUP BY s.scan_id
+            """, (scan_id,))
+            row = cur.fetchone()
+            if not row:
+                return None
+            return {
+                "scan_id": scan_id,
+                "rule_id": row[0],
+                "table_name": row[1],
+                "range_key": row[2],
+                "status": row[3],
+                "started_at": row[4].isoformat(),
+                "completed_at": row[5].isoformat() if row[5] else None,
+                "ranges": {"done": row[6], "claimed": row[7], "pending": row[8], "failed": row[9]},
+                "violations_found": row[10]
+            }
+        finally:
+            cur.close()
+            conn.close()
+
+    def prune_history(self, days: int = RANGE_SCAN_RETENTION_DAYS) -> int:
+        """Delete finished range scans (and, by cascade, their ranges) older than `days`; returns the count."""
+        conn = self.scanner.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                DELETE FROM range_scans
+                WHERE status <> 'running' AND completed_at < NOW() - make_interval(days => %s)
+            """, (days,))
+            pruned = cur.rowcount
+            conn.commit()
+            logger.info(f"Pruned {pruned} range scans finished over {days} days ago")
+            return pruned
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    def unfinished_rules(self) -> List[str]:
+        """Rules with a range scan interrupted before completion."""
+        conn = self.scanner.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT rule_id FROM range_scans WHERE status = 'running'")
+            return [row[0] for row in cur.fetchall()]
+        finally:
+            cur.close()
+            conn.close()
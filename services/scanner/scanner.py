@@ -1,120 +1,638 @@
 import logging
-import psycopg2
-from typing import List, Dict, Any
-from query_generator import QueryGenerator
-import os
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+from typing import List, Dict, Any, Optional, Callable, Sequence
+from query_generator import QueryGenerator, CompiledQuery, JOIN_RULE_TYPES
+from range_scanner import RangeScanner
+from evidence import build_evidence, rule_columns
+from prometheus_client import Counter, Histogram
+from service_core.config import env_bool, env_int
+from service_core.db import connect_blocking
+from service_core.tracing import current_trace_id, span, traced
+from pathlib import Path
 import json
+import time
+import threading
+import functools
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database Info
-DB_HOST = os.getenv("DB_HOST", "postgres")
-DB_NAME = os.getenv("DB_NAME", "compliance")
-DB_USER = os.getenv("DB_USER", "admin")
-DB_PASS = os.getenv("DB_PASS", "admin123")
-DB_PORT = os.getenv("DB_PORT", "5432")
+# Capture EXPLAIN (ANALYZE, BUFFERS) for every rule (re-runs each query once more)
+SCAN_EXPLAIN_ANALYZE = env_bool("SCAN_EXPLAIN_ANALYZE")
+
+# Monthly partition retention for violations / audit_log (see maintain_partitions in init.sql)
+VIOLATION_RETENTION_MONTHS = env_int("VIOLATION_RETENTION_MONTHS", 24)
+AUDIT_RETENTION_MONTHS = env_int("AUDIT_RETENTION_MONTHS", 12)
+PARTITION_MONTHS_AHEAD = env_int("PARTITION_MONTHS_AHEAD", 3)
+# Move retired partitions to the archive schema instead of dropping them
+PARTITION_ARCHIVE = env_bool("PARTITION_ARCHIVE")
+
+RULE_SECONDS = Histogram("scanner_rule_duration_seconds", "Time to evaluate one rule against its table", ["status"],
+                         buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800))
+ROWS_SCANNED = Counter("scanner_rows_scanned_total", "Target table rows examined by rule evaluations")
+VIOLATIONS_WRITTEN = Counter("scanner_violations_written_total", "Violation rows inserted or refreshed", ["severity"])
+VIOLATIONS_OPENED = Counter("scanner_violations_opened_total", "New violations inserted", ["severity"])
+
+
+def summarize_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Condense EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) output into the figures
+    worth keeping per execution: cost, timings, buffers and scan nodes.
+    """
+    root = explain["Plan"]
+    scans = []
+    rows_examined = 0
+
+    def walk(node):
+        nonlocal rows_examined
+        if "Scan" in node.get("Node Type", ""):
+            loops = node.get("Actual Loops", 1)
+            examined = (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * loops
+            rows_examined += examined
+            scans.append({
+                "node_type": node["Node Type"],
+                "relation": node.get("Relation Name"),
+                "index": node.get("Index Name"),
+                "rows_examined": examined
+            })
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(root)
+    return {
+        "total_cost": root.get("Total Cost"),
+        "planning_time_ms": explain.get("Planning Time"),
+        "execution_time_ms": explain.get("Execution Time"),
+        "shared_hit_blocks": root.get("Shared Hit Blocks"),
+        "shared_read_blocks": root.get("Shared Read Blocks"),
+        "rows_examined": rows_examined,
+        "scans": scans
+    }
+
+
+def join_plan_warnings(explain: Dict[str, Any]) -> List[str]:
+    """
+    Check that a join rule's plan is set-based: a hash/merge join, or a nested
+    loop probing an index. A nested loop over a sequential scan means one
+    reference-table scan per row.
+    """
+    warnings = []
+
+    def walk(node):
+        if node.get("Node Type") == "Nested Loop":
+            inner = next((c for c in node.get("Plans", []) if c.get("Parent Relationship") == "Inner"), None)
+            if inner and inner.get("Node Type") == "Seq Scan":
+                warnings.append(
+                    f"Nested loop re-scans {inner.get('Relation Name')} sequentially per row; "
+                    f"index its join key(s)"
+                )
+        if node.get("Node Type") == "SubPlan" or node.get("Subplan Name"):
+            warnings.append(f"Correlated subplan {node.get('Subplan Name')} is evaluated per row")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(explain["Plan"])
+    return warnings
+
+
+def holds_scan_lock(method):
+    """Serialize use of the shared scan connection across threads."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._scan_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class ComplianceScanner:
     def __init__(self):
         self.generator = QueryGenerator()
-        
+        self._file_evaluator = None
+        self._file_evaluator_lock = threading.Lock()
+        self.range_scanner = RangeScanner(self)
+        # Long-lived scan connection so server-side prepared statements (and their
+        # plans) survive between scans; tracks which statements it has prepared,
+        # and the statement each rule last used
+        self._scan_conn = None
+        self._prepared = set()
+        self._rule_statements: Dict[str, str] = {}
+        self._scan_lock = threading.RLock()
+
+    @property
+    def file_evaluator(self):
+        """Arrow-based file evaluator, imported on first use (pyarrow is slow to import)"""
+        if self._file_evaluator is None:
+            with self._file_evaluator_lock:
+                if self._file_evaluator is None:
+                    from file_evaluator import FileRuleEvaluator
+                    self._file_evaluator = FileRuleEvaluator()
+        return self._file_evaluator
+
     def get_connection(self):
-        return psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASS,
-            port=DB_PORT
-        )
+        return connect_blocking()
+
+    def get_scan_connection(self):
+        if self._scan_conn is None or self._scan_conn.closed:
+            self._scan_conn = self.get_connection()
+            self._prepared = set()
+            self._rule_statements = {}
+        return self._scan_conn
+
+    def _deallocate(self, cur, name: str):
+        cur.execute(sql.SQL("DEALLOCATE {}").format(sql.Identifier(name)))
+        self._prepared.discard(name)
+
+    def _prepare(self, cur, compiled: CompiledQuery):
+        cur.execute(compiled.prepare_sql())
+        self._prepared.add(compiled.name)
+        if compiled.rule_type in JOIN_RULE_TYPES:
+            self.check_join_plan(cur, compiled)
+
+    def execute_compiled(self, cur, compiled: CompiledQuery, rule_id=None):
+        """
+        Run a violation query as a prepared statement, preparing it once per connection.
+        A statement that fails (e.g. "cached plan must not change result type" after
+        a column was added to or dropped from its table) is prepared again and retried once.
+        With `rule_id`, the statement of the rule's previous version is deallocated
+        (unless another rule with the same definition still uses it).
+        """
+        with span("scan.query", statement=compiled.name) as query_span:
+            if rule_id is not None:
+                previous = self._rule_statements.get(str(rule_id))
+                self._rule_statements[str(rule_id)] = compiled.name
+                if (previous and previous != compiled.name and previous in self._prepared
+                        and previous not in self._rule_statements.values()):
+                    self._deallocate(cur, previous)
+            if compiled.name not in self._prepared:
+                query_span.set_attribute("prepared", True)
+                self._prepare(cur, compiled)
+
+            # Savepoint commands go through their own cursor so `cur` keeps the query's rows
+            with cur.connection.cursor() as control:
+                control.execute("SAVEPOINT rule_execute")
+                try:
+                    cur.execute(compiled.execute_sql(), compiled.params)
+                except Exception as e:
+                    logger.warning(f"Re-preparing {compiled.name} after EXECUTE failed: {e}")
+                    query_span.set_attribute("reprepared", True)
+                    control.execute("ROLLBACK TO SAVEPOINT rule_execute")
+                    self._deallocate(cur, compiled.name)
+                    self._prepare(cur, compiled)
+                    cur.execute(compiled.execute_sql(), compiled.params)
+                control.execute("RELEASE SAVEPOINT rule_execute")
+
+    def check_join_plan(self, cur, compiled: CompiledQuery) -> List[str]:
+        """Log a warning if a join rule's plan is not set-based (see join_plan_warnings)."""
+        cur.execute(sql.SQL("EXPLAIN (FORMAT JSON) ") + compiled.execute_sql(), compiled.params)
+        result = cur.fetchone()[0]
+        if isinstance(result, str):
+            result = json.loads(result)
+        warnings = join_plan_warnings(result[0])
+        for warning in warnings:
+            logger.warning(f"Plan check for {compiled.name}: {warning}")
+        return warnings
+
+    def explain_compiled(self, cur, compiled: CompiledQuery) -> Optional[Dict[str, Any]]:
+        """
+        Re-run a violation query under EXPLAIN (ANALYZE, BUFFERS) and summarize the plan.
+        Returns None if EXPLAIN fails; the surrounding transaction is left intact.
+        """
+        cur.execute("SAVEPOINT rule_explain")
+        try:
+            cur.execute(sql.SQL("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ") + compiled.execute_sql(), compiled.params)
+            result = cur.fetchone()[0]
+            cur.execute("RELEASE SAVEPOINT rule_explain")
+            if isinstance(result, str):
+                result = json.loads(result)
+            return summarize_plan(result[0])
+        except Exception as e:
+            logger.warning(f"EXPLAIN failed for {compiled.name}: {e}")
+            cur.execute("ROLLBACK TO SAVEPOINT rule_explain")
+            return None
+
+    def estimate_table_rows(self, cur, table_name: str) -> int:
+        """Planner row estimate for a table (pg_class.reltuples), 0 if unknown."""
+        cur.execute("""
+            SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = to_regclass(%s)
+        """, (table_name,))
+        row = cur.fetchone()
+        return row[0] if row else 0
 
-    def scan_all_tables(self) -> List[Dict[str, Any]]:
+    def record_execution(self, cur, rule_id, started: float, records_scanned: int, violations_found: int,
+                         status: str, duration_ms: Optional[float] = None, error: Optional[str] = None,
+                         plan: Optional[Dict[str, Any]] = None):
+        """Insert one rule_executions row for a rule evaluated in this scan."""
+        if duration_ms is None:
+            duration_ms = (time.perf_counter() - started) * 1000
+        RULE_SECONDS.labels(status).observe(duration_ms / 1000)
+        ROWS_SCANNED.inc(records_scanned or 0)
+        cur.execute("""
+            INSERT INTO rule_executions (rule_id, records_scanned, violations_found, execution_duration_ms,
+                                         status, error_message, plan_summary, trace_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (rule_id, records_scanned, violations_found, int(round(duration_ms)), status, error,
+              json.dumps(plan) if plan else None, current_trace_id()))
+
+    def slowest_rules(self, limit: int = 10, days: int = 7) -> List[Dict[str, Any]]:
         """
-        Main logic: Check ALL active rules against their target tables.
-        Returns list of new violations.
+        Rules ranked by average execution time over the last `days` days,
+        with their latest plan summary when one was captured.
         """
         conn = self.get_connection()
         cur = conn.cursor()
-        violations_found = []
+        try:
+            cur.execute("""
+                SELECT r.rule_id, r.rule_name, r.rule_type, r.parameters->>'table',
+                       COUNT(*), AVG(re.execution_duration_ms), MAX(re.execution_duration_ms),
+                       percentile_cont(0.95) WITHIN GROUP (ORDER BY re.execution_duration_ms),
+                       AVG(re.records_scanned), AVG(re.violations_found), MAX(re.execution_time),
+                       (SELECT plan_summary FROM rule_executions p
+                        WHERE p.rule_id = r.rule_id AND p.plan_summary IS NOT NULL
+                        ORDER BY p.execution_time DESC LIMIT 1)
+                FROM rule_executions re
+                JOIN compliance_rules r ON r.rule_id = re.rule_id
+                WHERE re.execution_time >= NOW() - make_interval(days => %s)
+                  AND re.status = 'success'
+                GROUP BY r.rule_id, r.rule_name, r.rule_type
+                ORDER BY AVG(re.execution_duration_ms) DESC
+                LIMIT %s
+            """, (days, limit))
+            return [
+                {
+                    "rule_id": row[0],
+                    "rule_name": row[1],
+                    "rule_type": row[2],
+                    "table_name": row[3],
+                    "executions": row[4],
+                    "avg_duration_ms": float(row[5]),
+                    "max_duration_ms": row[6],
+                    "p95_duration_ms": float(row[7]),
+                    "avg_records_scanned": float(row[8]),
+                    "avg_violations_found": float(row[9]),
+                    "last_execution": row[10].isoformat(),
+                    "last_plan": row[11]
+                }
+                for row in cur.fetchall()
+            ]
+        finally:
+            cur.close()
+            conn.close()
 
+    def rule_schedules(self) -> List[tuple]:
+        """(rule_id, scan_schedule) for every scannable rule; schedule is None for the default cadence."""
+        conn = self.get_connection()
+        cur = conn.cursor()
         try:
-            # 1. Fetch ACTIVATE rules
-            logger.info("Fetching active rules...")
             cur.execute("""
-                SELECT rule_id, rule_name, rule_type, description, parameters 
-                FROM compliance_rules 
+                SELECT rule_id, scan_schedule FROM compliance_rules
                 WHERE status IN ('active', 'pending')
             """)
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    def maintain_partitions(self) -> Dict[str, Any]:
+        """
+        Create upcoming monthly partitions of violations and audit_log and
+        retire (drop or archive) those past retention.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("SET lock_timeout = '10s'")
+            cur.execute("SELECT maintain_partitions(%s, %s, %s, %s)", (
+                VIOLATION_RETENTION_MONTHS, AUDIT_RETENTION_MONTHS, PARTITION_MONTHS_AHEAD, PARTITION_ARCHIVE
+            ))
+            result = cur.fetchone()[0]
+            conn.commit()
+            logger.info(f"Partition maintenance: {result}")
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    def record_violations(self, cur, rule_id, rule_name: str, table_name: str, failed_rows: List[tuple],
+                          severity: str = 'high', resolve_missing: bool = True,
+                          column_names: Sequence[str] = (), evidence_columns: Sequence[str] = (),
+                          source: str = "table") -> List[str]:
+        """
+        Reconcile the failing rows of one rule with its stored violations.
+        Existing violations get last_seen refreshed (resolved ones are reopened),
+        new ones are inserted, and open ones whose record no longer fails are auto-resolved.
+        Pass resolve_missing=False when `failed_rows` covers only part of the table.
+        Evidence keeps only `evidence_columns` of each row (see evidence.build_evidence);
+        `column_names` names the columns of `failed_rows`.
+        Returns the IDs of newly inserted violations.
+        """
+        # Record ID is the first column (usually the primary key); dedupe so one
+        # upsert statement never touches the same row twice
+        records = {}
+        for row in failed_rows:
+            record_id = str(row[0]) if row else 'unknown'
+            if record_id not in records:
+                records[record_id] = build_evidence(column_names, row, evidence_columns, source=source)
+
+        new_ids = []
+        if records:
+            # violations is partitioned by detected_at, so (rule, table, record) cannot be a
+            # unique index; serialize writers per rule instead (held until commit) and
+            # refresh known records before inserting the rest
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"violations:{rule_id}:{table_name}",))
+
+            def literal(value):
+                # Inlined constants; '%' is doubled since execute_values formats the statement
+                return sql.SQL(sql.Literal(value).as_string(cur).replace("%", "%%"))
+
+            upsert = sql.SQL("""
+                WITH incoming (record_id, evidence) AS (VALUES %s),
+                refreshed AS (
+                    UPDATE violations v
+                    SET last_seen = NOW(),
+                        status = CASE WHEN v.status = 'resolved' THEN 'open' ELSE v.status END,
+                        resolved_at = CASE WHEN v.status = 'resolved' THEN NULL ELSE v.resolved_at END,
+                        resolved_by = CASE WHEN v.status = 'resolved' THEN NULL ELSE v.resolved_by END
+                    FROM incoming i
+                    WHERE v.rule_id = {rule_id} AND v.table_name = {table_name} AND v.record_id = i.record_id
+                    RETURNING v.record_id
+                )
+                INSERT INTO violations (rule_id, record_id, table_name, severity, status, evidence, explanation)
+                SELECT {rule_id}, i.record_id, {table_name}, {severity}, 'open', i.evidence::jsonb, {explanation}
+                FROM incoming i
+                WHERE i.record_id NOT IN (SELECT record_id FROM refreshed)
+                RETURNING violation_id
+            """).format(
+                rule_id=literal(str(rule_id)) + sql.SQL("::uuid"),
+                table_name=literal(table_name),
+                severity=literal(severity),
+                explanation=literal(f"Violation of rule: {rule_name}")
+            ).as_string(cur)
+            rows = execute_values(cur, upsert, [
+                (record_id, json.dumps(evidence)) for record_id, evidence in records.items()
+            ], fetch=True)
+            new_ids = [row[0] for row in rows]
+            VIOLATIONS_WRITTEN.labels(severity).inc(len(records))
+            VIOLATIONS_OPENED.labels(severity).inc(len(new_ids))
+
+        resolved = self.resolve_missing(cur, rule_id, table_name, seen_records=list(records)) if resolve_missing else 0
+
+        logger.info(f"Rule {rule_name}: {len(new_ids)} new, {len(records) - len(new_ids)} still open, "
+                    f"{resolved} auto-resolved")
+        return new_ids
+
+    def resolve_missing(self, cur, rule_id, table_name: str, seen_records: Optional[List[str]] = None,
+                        seen_since=None) -> int:
+        """
+        Auto-resolve open violations of a rule whose record no longer fails:
+        those not in `seen_records`, or (for scans split across transactions)
+        those whose last_seen predates `seen_since`. Returns the number resolved.
+        """
+        condition = sql.SQL("NOT (record_id = ANY(%s))") if seen_since is None else sql.SQL("last_seen < %s")
+        cur.execute(sql.SQL("""
+            UPDATE violations
+            SET status = 'resolved', resolved_at = NOW(), resolved_by = 'scanner',
+                resolution_notes = 'Auto-resolved: record no longer fails the rule'
+            WHERE rule_id = %s AND table_name = %s
+              AND status IN ('open', 'acknowledged')
+              AND {}
+        """).format(condition), (rule_id, table_name, seen_records if seen_since is None else seen_since))
+        return cur.rowcount
+
+    @holds_scan_lock
+    @traced("scan.all_tables")
+    def scan_all_tables(self, explain: Optional[bool] = None, rule_ids: Optional[List[str]] = None,
+                        progress: Optional[Callable[[int, int, int], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Main logic: Check ALL active rules (or just `rule_ids`) against their target tables.
+        Rules run most severe first, cheapest (by recent duration) first within a severity.
+        Each rule's run is recorded in rule_executions; with explain=True (or
+        SCAN_EXPLAIN_ANALYZE=true) an EXPLAIN (ANALYZE, BUFFERS) summary is stored too.
+        `progress(rules_done, rules_total, new_violations)` is called after each rule.
+        Returns list of newly opened violations (already-known ones are refreshed, not duplicated).
+        Raises if the scan itself fails (a single failing rule is recorded and skipped).
+        """
+        if explain is None:
+            explain = SCAN_EXPLAIN_ANALYZE
+        conn = self.get_scan_connection()
+        cur = conn.cursor()
+        violations_found = []
+
+        try:
+            # 1. Fetch ACTIVATE rules
+            logger.info("Fetching active rules...")
+            rules_query = """
+                SELECT r.rule_id, r.rule_name, r.rule_type, r.description, r.parameters, r.version,
+                       COALESCE(r.severity, 'high'), r.trace_id
+                FROM compliance_rules r
+                LEFT JOIN LATERAL (
+                    SELECT AVG(execution_duration_ms) AS avg_ms
+                    FROM (SELECT execution_duration_ms FROM rule_executions re
+                          WHERE re.rule_id = r.rule_id AND re.status = 'success'
+                          ORDER BY re.execution_time DESC LIMIT 5) recent
+                ) cost ON true
+                WHERE r.status IN ('active', 'pending')
+            """
+            rules_params = ()
+            if rule_ids is not None:
+                rules_query += " AND r.rule_id = ANY(%s::uuid[])"
+                rules_params = (list(rule_ids),)
+            rules_query += """
+                ORDER BY CASE COALESCE(r.severity, 'high')
+                    WHEN 'critical' THEN 1 WHEN 'high' THEN 2 WHEN 'medium' THEN 3 ELSE 4
+                END, cost.avg_ms NULLS FIRST
+            """
+            cur.execute(rules_query, rules_params)
             rules = cur.fetchall()
 
-            for rule in rules:
-                try:
-                    rule_id, name, logic_type, desc, params_json = rule
-                    
-                    # Parse JSON params
-                    if isinstance(params_json, str):
-                        params = json.loads(params_json)
-                    else:
-                        params = params_json if isinstance(params_json, dict) else {}
-                    
-                    logger.info(f"Rule: {name}, Params: {params}")
-                    
-                    rule_obj = {
-                        "rule_type": logic_type,
-                        "parameters": params
-                    }
-                    
-                    # 2. Generate SQL Query
-                    query = self.generator.generate_violation_query(rule_obj)
-                    
-                    if not query:
-                        logger.warning(f"Could not generate query for rule {rule_id}")
-                        continue
-
-                    logger.info(f"Checking rule: {name} ({logic_type})")
-                    
-                    # 3. Execute Query (Find Failing Rows)
-                    target_cur = conn.cursor() 
+            for done, rule in enumerate(rules):
+                if progress:
+                    progress(done, len(rules), len(violations_found))
+                rule_id, name, logic_type = rule[0], rule[1], rule[2]
+                # Each rule's evaluation joins the trace of the document it was extracted from
+                with span("scan.rule", trace_id=rule[7], **{"rule.id": rule_id, "rule.name": name,
+                                                             "rule.type": logic_type}):
+                    # All of a rule's database work happens under one savepoint, so a
+                    # failing rule is undone alone instead of aborting the whole scan
+                    cur.execute("SAVEPOINT rule_scan")
+                    started = time.perf_counter()
                     try:
-                        target_cur.execute(query)
-                        failed_rows = target_cur.fetchall()
-                    except Exception as sqle:
-                        logger.error(f"SQL Error for rule {name}: {sqle}")
-                        conn.rollback() # Fix broken transaction
-                        continue
-                    finally:
-                        target_cur.close()
-
-                    # 4. Log Violations
-                    if failed_rows:
-                        logger.info(f"Found {len(failed_rows)} violations for {name}")
-                        table_name = params.get('table', 'unknown')
-                        for row in failed_rows:
-                            # Extract record ID (first column, usually primary key)
-                            record_id = str(row[0]) if row else 'unknown'
-                            evidence = {"raw_data": str(row)}
-                            cur.execute("""
-                                INSERT INTO violations (rule_id, record_id, table_name, severity, status, evidence, explanation)
-                                VALUES (%s, %s, %s, 'high', 'open', %s, %s)
-                                RETURNING violation_id
-                            """, (rule_id, record_id, table_name, json.dumps(evidence), f"Violation of rule: {name}"))
-                            vid = cur.fetchone()[0]
-                            violations_found.append({"id": vid, "rule": name})
-                except Exception as rule_err:
-                    logger.error(f"Error processing rule {name}: {rule_err}")
-                    continue
-                    
+                        violations_found.extend(self._scan_rule(conn, cur, rule, explain))
+                        cur.execute("RELEASE SAVEPOINT rule_scan")
+                    except Exception as rule_err:
+                        logger.error(f"Error processing rule {name}: {rule_err}")
+                        cur.execute("ROLLBACK TO SAVEPOINT rule_scan")
+                        self.record_execution(cur, rule_id, started, 0, 0, 'failed', error=str(rule_err))
+                        cur.execute("RELEASE SAVEPOINT rule_scan")
+
             conn.commit()
+            if progress:
+                progress(len(rules), len(rules), len(violations_found))
             return violations_found
             
         except Exception as e:
             conn.rollback()
             logger.error(f"Scan error: {str(e)}")
+            # Propagate, so the scan job is recorded as failed rather than completed with nothing found
+            raise
+        finally:
+            cur.close()
+
+    def _scan_rule(self, conn, cur, rule: tuple, explain: bool) -> List[Dict[str, Any]]:
+        """
+        Evaluate one rule (a row of scan_all_tables' rule query) and reconcile its
+        violations, inside the caller's `rule_scan` savepoint.
+        Returns the newly opened violations.
+        """
+        rule_id, name, logic_type, desc, params_json, version, severity, _ = rule
+        # Parse JSON params
+        if isinstance(params_json, str):
+            params = json.loads(params_json)
+        else:
+            params = params_json if isinstance(params_json, dict) else {}
+
+        logger.info(f"Rule: {name}, Params: {params}")
+
+        rule_obj = {
+            "rule_id": rule_id,
+            "version": version,
+            "rule_type": logic_type,
+            "parameters": params
+        }
+
+        # 2. Generate SQL Query
+        query = self.generator.generate_violation_query(rule_obj)
+
+        if not query:
+            logger.warning(f"Could not generate query for rule {rule_id}")
+            return []
+
+        logger.info(f"Checking rule: {name} ({logic_type})")
+
+        table_name = params.get('table', 'unknown')
+
+        # Large tables: evaluate in checkpointed ranges on separate connections
+        if self.range_scanner.needs_ranges(cur, table_name):
+            # End this transaction first: the workers upsert violations this scan may
+            # hold locks on, and a long range scan must not pin an open transaction
+            conn.commit()
+            started = time.perf_counter()
+            try:
+                result = self.range_scanner.scan_rule(rule_id, version, table_name)
+            finally:
+                # The commit ended the rule's savepoint; take it again for the caller
+                cur.execute("SAVEPOINT rule_scan")
+            self.record_execution(cur, rule_id, started, self.estimate_table_rows(cur, table_name),
+                                  result["failed_rows"],
+                                  'success' if result["status"] == 'completed' else 'partial')
+            return result["new_violations"]
+
+        # 3. Execute Query (Find Failing Rows)
+        target_cur = conn.cursor()
+        started = time.perf_counter()
+        try:
+            self.execute_compiled(target_cur, query, rule_id=rule_id)
+            failed_rows = target_cur.fetchall()
+            column_names = [column.name for column in target_cur.description]
+        except Exception as sqle:
+            logger.error(f"SQL Error for rule {name}: {sqle}")
+            cur.execute("ROLLBACK TO SAVEPOINT rule_scan") # Fix broken transaction
+            self.record_execution(cur, rule_id, started, 0, 0, 'failed', error=str(sqle))
             return []
+        finally:
+            target_cur.close()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        # Rows examined: exact from EXPLAIN ANALYZE when enabled, else planner estimate
+        plan = self.explain_compiled(cur, query) if explain else None
+        if plan and plan.get("rows_examined") is not None:
+            records_scanned = plan["rows_examined"]
+        else:
+            records_scanned = self.estimate_table_rows(cur, table_name)
+
+        # 4. Log Violations (upsert by rule + record, auto-resolve the rest)
+        new_ids = self.record_violations(cur, rule_id, name, table_name, failed_rows,
+                                         severity=severity, column_names=column_names,
+                                         evidence_columns=rule_columns(logic_type, params))
+
+        self.record_execution(cur, rule_id, started, records_scanned, len(failed_rows), 'success',
+                              duration_ms=duration_ms, plan=plan)
+        return [{"id": vid, "rule": name} for vid in new_ids]
+
+    @holds_scan_lock
+    @traced("scan.file")
+    def scan_file(self, path: Path, table_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Evaluate active rules against a CSV/Parquet extract without loading it into Postgres.
+        The file stands in for `table_name` (default: the file name without extension);
+        violations are recorded exactly as for a table scan.
+        Returns list of newly opened violations.
+        """
+        path = Path(path)
+        table_name = table_name or path.name.split(".")[0]
+        conn = self.get_scan_connection()
+        cur = conn.cursor()
+        violations_found = []
+
+        try:
+            cur.execute("""
+                SELECT rule_id, rule_name, rule_type, parameters, COALESCE(severity, 'high')
+                FROM compliance_rules
+                WHERE status IN ('active', 'pending') AND parameters->>'table' = %s
+            """, (table_name,))
+            rules = [
+                {"rule_id": row[0], "rule_name": row[1], "rule_type": row[2],
+                 "parameters": json.loads(row[3]) if isinstance(row[3], str) else row[3],
+                 "severity": row[4]}
+                for row in cur.fetchall()
+            ]
+            logger.info(f"Scanning file {path.name} as table {table_name} against {len(rules)} rules")
+
+            started = time.perf_counter()
+            from file_evaluator import SUPPORTED_RULE_TYPES
+            # Violations are upserted batch by batch; those not seen in this transaction are resolved after
+            cur.execute("SELECT NOW()")
+            scan_started_at = cur.fetchone()[0]
+
+            def record_batch(i: int, rows: List[tuple], column_names: List[str]):
+                rule = rules[i]
+                new_ids = self.record_violations(cur, rule["rule_id"], rule["rule_name"], table_name, rows,
+                                                 severity=rule["severity"], resolve_missing=False,
+                                                 column_names=column_names,
+                                                 evidence_columns=rule_columns(rule["rule_type"], rule["parameters"]),
+                                                 source="file")
+                violations_found.extend({"id": vid, "rule": rule["rule_name"]} for vid in new_ids)
+
+            failed, rows_read, _, errors = self.file_evaluator.evaluate(path, rules, on_failed=record_batch)
+            duration_ms = (time.perf_counter() - started) * 1000
+
+            for i, rule in enumerate(rules):
+                if rule["rule_type"] not in SUPPORTED_RULE_TYPES:
+                    continue
+                if i in errors:
+                    # Rows seen before the error are a partial result: resolving what they
+                    # miss would auto-resolve every open violation the rule did not get to
+                    self.record_execution(cur, rule["rule_id"], started, rows_read, failed[i], 'failed',
+                                          duration_ms=duration_ms, error=errors[i])
+                    continue
+                self.resolve_missing(cur, rule["rule_id"], table_name, seen_since=scan_started_at)
+                # One pass serves every rule, so each shares the file's wall time
+                self.record_execution(cur, rule["rule_id"], started, rows_read, failed[i], 'success',
+                                      duration_ms=duration_ms)
+
+            conn.commit()
+            return violations_found
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"File scan error: {str(e)}")
+            raise
         finally:
             cur.close()
-            conn.close()
 
 if __name__ == "__main__":
     scanner = ComplianceScanner()
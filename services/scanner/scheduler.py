@@ -0,0 +1,285 @@
+"""
+Scan scheduler: runs compliance scans as background jobs.
+
+Requests to scan become jobs with an ID and progress instead of blocking the
+HTTP call. Overlapping requests are deduplicated against the running and queued
+jobs, and a minute ticker enqueues rules whose cron-style `scan_schedule` is due
+and runs partition maintenance on its own schedule.
+"""
+
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from prometheus_client import Counter, Gauge
+from service_core.tracing import current_span, span
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cadence for rules without their own scan_schedule (daily batch scan at 02:00)
+DEFAULT_SCAN_SCHEDULE = os.getenv("SCAN_DEFAULT_SCHEDULE", "0 2 * * *")
+
+# When to create upcoming partitions and apply retention (daily at 03:30)
+PARTITION_MAINTENANCE_SCHEDULE = os.getenv("PARTITION_MAINTENANCE_SCHEDULE", "30 3 * * *")
+
+# Finished jobs kept for status lookups
+JOB_HISTORY = int(os.getenv("SCAN_JOB_HISTORY", "100"))
+
+JOBS_QUEUED = Gauge("scanner_jobs_queued", "Scan jobs waiting for the worker")
+JOB_RUNNING = Gauge("scanner_job_running", "1 while a scan job is running")
+JOBS_FINISHED = Counter("scanner_jobs_total", "Finished scan jobs, by outcome", ["status"])
+
+CRON_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+# (min, max) for minute, hour, day of month, month, day of week
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+
+def _parse_cron_field(spec: str, low: int, high: int) -> Set[int]:
+    values = set()
+    for part in spec.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = int(step_str)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+        else:
+            start = end = int(part)
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def cron_matches(expression: str, moment: datetime) -> bool:
+    """
+    True if a 5-field cron expression (minute hour day month weekday) fires at `moment`.
+    Supports *, lists, ranges, steps and @hourly/@daily/@weekly/@monthly.
+    """
+    expression = CRON_ALIASES.get(expression.strip(), expression)
+    specs = expression.split()
+    if len(specs) != 5:
+        raise ValueError(f"Invalid cron expression: {expression}")
+
+    minutes, hours, days, months, weekdays = (
+        _parse_cron_field(spec, low, high) for spec, (low, high) in zip(specs, CRON_FIELDS)
+    )
+    weekdays = {0 if d == 7 else d for d in weekdays}
+    weekday = (moment.weekday() + 1) % 7  # cron: Sunday = 0
+
+    if moment.minute not in minutes or moment.hour not in hours or moment.month not in months:
+        return False
+    # Standard cron: if both day fields are restricted, either may match
+    if specs[2] != "*" and specs[4] != "*":
+        return moment.day in days or weekday in weekdays
+    return moment.day in days and weekday in weekdays
+
+
+@dataclass
+class ScanJob:
+    """A queued or running scan over a set of rules (None = all active rules)"""
+    job_id: str
+    rule_ids: Optional[Set[str]]
+    explain: bool = False
+    trigger: str = "manual"
+    status: str = "queued"
+    rules_total: int = 0
+    rules_done: int = 0
+    violations_found: int = 0
+    new_violations: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # (trace_id, span_id) of the request that queued the job; the scan continues its trace
+    trace_parent: Optional[Tuple[str, str]] = None
+
+    def covers(self, rule_ids: Optional[Set[str]], explain: bool) -> bool:
+        """True if this job already scans every rule in `rule_ids`."""
+        if explain and not self.explain:
+            return False
+        if self.rule_ids is None:
+            return True
+        return rule_ids is not None and rule_ids <= self.rule_ids
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "trigger": self.trigger,
+            "rule_ids": sorted(self.rule_ids) if self.rule_ids is not None else None,
+            "explain": self.explain,
+            "progress": {
+                "rules_done": self.rules_done,
+                "rules_total": self.rules_total,
+                "percent": round(100 * self.rules_done / self.rules_total, 1) if self.rules_total else 0.0
+            },
+            "violations_found": self.violations_found,
+            "new_violations": self.new_violations,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "trace_id": self.trace_parent[0] if self.trace_parent else None
+        }
+
+
+class ScanScheduler:
+    """Runs scan jobs one at a time on a worker thread and enqueues scheduled rules"""
+
+    def __init__(self, scanner, default_schedule: str = DEFAULT_SCAN_SCHEDULE):
+        self.scanner = scanner
+        self.default_schedule = default_schedule
+        self._lock = threading.Condition()
+        self._queue: List[ScanJob] = []
+        self._jobs: "OrderedDict[str, ScanJob]" = OrderedDict()
+        self._running: Optional[ScanJob] = None
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        JOBS_QUEUED.set_function(lambda: len(self._queue))
+        JOB_RUNNING.set_function(lambda: 1 if self._running else 0)
+
+    def start(self):
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._work, name="scan-worker", daemon=True),
+            threading.Thread(target=self._tick, name="scan-ticker", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Scan scheduler started (default schedule: {self.default_schedule})")
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._lock.notify_all()
+
+    def submit(self, rule_ids: Optional[List[str]] = None, explain: bool = False,
+               trigger: str = "manual", fresh: bool = False) -> Tuple[ScanJob, bool]:
+        """
+        Queue a scan, reusing an existing job where possible. With fresh=True the
+        running job is not reused, since it loaded its rules before they changed.
+
+        Returns:
+            The job that will cover the request, and whether it was deduplicated
+        """
+        wanted = set(rule_ids) if rule_ids else None
+        with self._lock:
+            if not fresh and self._running and self._running.covers(wanted, explain):
+                return self._running, True
+            for job in self._queue:
+                if job.covers(wanted, explain):
+                    return job, True
+            # Coalesce into a queued job rather than scanning the same tables twice
+            for job in self._queue:
+                if job.explain == explain:
+                    job.rule_ids = None if job.rule_ids is None or wanted is None else job.rule_ids | wanted
+                    return job, True
+
+            caller = current_span()
+            job = ScanJob(job_id=str(uuid.uuid4()), rule_ids=wanted, explain=explain, trigger=trigger,
+                          trace_parent=(caller.trace_id, caller.span_id) if caller else None)
+            self._queue.append(job)
+            self._remember(job)
+            self._lock.notify_all()
+            logger.info(f"Queued scan job {job.job_id} ({trigger}, {len(wanted) if wanted else 'all'} rules)")
+            return job, False
+
+    def get(self, job_id: str) -> Optional[ScanJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[ScanJob]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def _remember(self, job: ScanJob):
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > JOB_HISTORY:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status in ("queued", "running"):
+                break
+            del self._jobs[oldest_id]
+
+    def _work(self):
+        while not self._stop.is_set():
+            with self._lock:
+                while not self._queue and not self._stop.is_set():
+                    self._lock.wait()
+                if self._stop.is_set():
+                    return
+                job = self._running = self._queue.pop(0)
+                job.status = "running"
+                job.started_at = datetime.utcnow()
+
+            def progress(done: int, total: int, new_count: int):
+                job.rules_done, job.rules_total, job.violations_found = done, total, new_count
+
+            trace_id, parent_id = job.trace_parent or (None, None)
+            try:
+                rule_ids = sorted(job.rule_ids) if job.rule_ids is not None else None
+                with span("scan.job", trace_id=trace_id, parent_id=parent_id,
+                          **{"job.id": job.job_id, "job.trigger": job.trigger}):
+                    job.new_violations = self.scanner.scan_all_tables(
+                        explain=job.explain or None, rule_ids=rule_ids, progress=progress
+                    )
+                job.violations_found = len(job.new_violations)
+                job.status = "completed"
+            except Exception as e:
+                logger.error(f"Scan job {job.job_id} failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = datetime.utcnow()
+                JOBS_FINISHED.labels(job.status).inc()
+                with self._lock:
+                    self._running = None
+                logger.info(f"Scan job {job.job_id} {job.status}: {job.violations_found} new violations")
+
+    def _tick(self):
+        """Once a minute, enqueue the rules whose schedule fires this minute."""
+        last_minute = None
+        while not self._stop.wait(60 - datetime.now().second):
+            now = datetime.now().replace(second=0, microsecond=0)
+            if now == last_minute:
+                continue
+            last_minute = now
+            try:
+                due = [
+                    rule_id for rule_id, schedule in self.scanner.rule_schedules()
+                    if self._is_due(schedule or self.default_schedule, now)
+                ]
+            except Exception as e:
+                logger.error(f"Could not load rule schedules: {e}")
+                continue
+            if due:
+                self.submit(rule_ids=due, trigger="schedule")
+            if self._is_due(PARTITION_MAINTENANCE_SCHEDULE, now):
+                try:
+                    self.scanner.maintain_partitions()
+                except Exception as e:
+                    logger.error(f"Partition maintenance failed: {e}")
+                try:
+                    self.scanner.range_scanner.prune_history()
+                except Exception as e:
+                    logger.error(f"Range scan pruning failed: {e}")
+
+    def _is_due(self, schedule: str, now: datetime) -> bool:
+        try:
+            return cron_matches(schedule, now)
+        except ValueError as e:
+            logger.warning(str(e))
+            return False
@@ -0,0 +1,64 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from file_evaluator import FileRuleEvaluator
+
+RULES = [
+    {"rule_name": "adult", "rule_type": "threshold",
+     "parameters": {"table": "people", "column": "age", "operator": ">=", "value": 18}},
+    {"rule_name": "email", "rule_type": "not_null", "parameters": {"table": "people", "column": "email"}},
+    {"rule_name": "code", "rule_type": "pattern",
+     "parameters": {"table": "people", "column": "code", "regex_pattern": "^[A-Z]{3}$"}},
+]
+
+
+def evaluate(path, rules=RULES, batch_size=65536):
+    rows = {}
+
+    def on_failed(i, failed_rows, column_names):
+        rows.setdefault(i, []).extend(dict(zip(column_names, row)) for row in failed_rows)
+
+    counts, rows_read, column_names, errors = FileRuleEvaluator(batch_size).evaluate(path, rules, on_failed)
+    return counts, rows_read, column_names, errors, rows
+
+
+def test_csv_violations(tmp_path):
+    path = tmp_path / "people.csv"
+    path.write_text("id,age,email,code\n1,30,a@x.io,ABC\n2,12,,ABC\n3,,b@x.io,abc\n")
+    counts, rows_read, column_names, errors, rows = evaluate(path)
+    assert rows_read == 3 and column_names == ["id", "age", "email", "code"] and not errors
+    assert counts == {0: 1, 1: 1, 2: 1}
+    # A NULL comparison is not a violation; an empty string is NULL for a typed column
+    assert [row["id"] for row in rows[0]] == [2]
+    assert rows[0][0]["age"] == 12
+    assert [row["id"] for row in rows[1]] == [2]
+    assert [row["id"] for row in rows[2]] == [3]
+
+
+def test_parquet_violations_across_batches(tmp_path):
+    path = tmp_path / "people.parquet"
+    pq.write_table(pa.table({"id": list(range(10)), "age": [10, 20] * 5,
+                             "email": ["e"] * 10, "code": ["ABC"] * 10}), path)
+    counts, rows_read, _, errors, rows = evaluate(path, batch_size=3)
+    assert rows_read == 10 and not errors
+    assert counts[0] == 5 and [row["id"] for row in rows[0]] == [0, 2, 4, 6, 8]
+
+
+def test_late_value_of_another_type_fails_only_rules_reading_the_column(tmp_path):
+    path = tmp_path / "people.csv"
+    lines = ["id,age,email,code"] + [f"{i},{10 + i % 20},e{i}@x.io,ABC" for i in range(200000)]
+    lines.append("200000,unknown,,ABC")
+    path.write_text("\n".join(lines) + "\n")
+    counts, rows_read, _, errors, rows = evaluate(path)
+    assert rows_read == 200001
+    assert set(errors) == {0} and "age" in errors[0]
+    # The other rules still see the whole file
+    assert counts[1] == 1 and rows[1][0]["id"] == 200000
+    assert counts[2] == 0
+
+
+def test_unknown_column_fails_the_rule(tmp_path):
+    path = tmp_path / "people.csv"
+    path.write_text("id,email\n1,a@x.io\n")
+    counts, _, _, errors, _ = evaluate(path, RULES[:2])
+    assert set(errors) == {0} and counts[1] == 0